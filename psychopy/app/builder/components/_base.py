@@ -154,32 +154,37 @@ class BaseComponent(object):
         buff.writeIndentedLines(code % self.params)
 
     def writeStartTestCode(self, buff):
-        """Test whether we need to start
+        """Test whether we need to start. The test is only evaluated while
+        the component is in the routine's set of pending components, and
+        starting moves it to the set of active ones
         """
         if self.params['startType'].val == 'time (s)':
             # if startVal is an empty string then set to be 0.0
             if (isinstance(self.params['startVal'].val, basestring) and
                     not self.params['startVal'].val.strip()):
                 self.params['startVal'].val = '0.0'
-            code = ("if t >= %(startVal)s "
-                    "and %(name)s.status == NOT_STARTED:\n")
+            code = ("if %(name)s in %(routine)sPending "
+                    "and t >= %(startVal)s:\n")
         elif self.params['startType'].val == 'frame N':
-            code = ("if frameN >= %(startVal)s "
-                    "and %(name)s.status == NOT_STARTED:\n")
+            code = ("if %(name)s in %(routine)sPending "
+                    "and frameN >= %(startVal)s:\n")
         elif self.params['startType'].val == 'condition':
-            code = ("if (%(startVal)s) "
-                    "and %(name)s.status == NOT_STARTED:\n")
+            code = ("if %(name)s in %(routine)sPending "
+                    "and (%(startVal)s):\n")
         else:
             msg = "Not a known startType (%(startType)s) for %(name)s"
             raise CodeGenerationException(msg % self.params)
 
-        buff.writeIndented(code % self.params)
+        params = dict(self.params, routine=self.parentName)
+        buff.writeIndented(code % params)
 
         buff.setIndentLevel(+1, relative=True)
         code = ("# keep track of start time/frame for later\n"
                 "%(name)s.tStart = t\n"
-                "%(name)s.frameNStart = frameN  # exact frame index\n")
-        buff.writeIndentedLines(code % self.params)
+                "%(name)s.frameNStart = frameN  # exact frame index\n"
+                "%(routine)sPending.remove(%(name)s)\n"
+                "%(routine)sActive.add(%(name)s)\n")
+        buff.writeIndentedLines(code % params)
 
     def writeStartTestCodeJS(self, buff):
         """Test whether we need to start
@@ -209,38 +214,69 @@ class BaseComponent(object):
                 "%(name)s.frameNStart = frameN;  // exact frame index\n")
         buff.writeIndentedLines(code % self.params)
 
-    def writeStopTestCode(self, buff):
-        """Test whether we need to stop
+    def getStopTimeCode(self):
+        """The stop time (s) as code, if it is a constant (numeric stop
+        time, or numeric start time and duration), else None
         """
+        if 'stopType' not in self.params:
+            return None
+        if not canBeNumeric(self.params['stopVal'].val):
+            return None
         if self.params['stopType'].val == 'time (s)':
-            code = ("frameRemains = %(stopVal)s "
-                    "- win.monitorFramePeriod * 0.75"
-                    "  # most of one frame period left\n"
-                    "if %(name)s.status == STARTED and t >= frameRemains:\n")
+            return "%(stopVal)s" % self.params
+        elif (self.params['stopType'].val == 'duration (s)' and
+                self.params['startType'].val == 'time (s)' and
+                canBeNumeric(self.params['startVal'].val)):
+            return "%(startVal)s + %(stopVal)s" % self.params
+        return None
+
+    def writeStopTimeCode(self, buff):
+        """Write the stop time of a constant-duration component once, at
+        the start of the routine, so that the stop test on each frame is
+        a single comparison. It goes in a variable of the script (named
+        `<name>StopDue`) rather than an attribute of the component's object,
+        which may be a stimulus that the user also sees
+        """
+        stopTime = self.getStopTimeCode()
+        if stopTime is not None:
+            code = ("%sStopDue = %s - win.monitorFramePeriod * 0.75"
+                    "  # most of one frame period left\n")
+            buff.writeIndented(code % (self.params['name'], stopTime))
+
+    def writeStopTestCode(self, buff):
+        """Test whether we need to stop. The test is only evaluated while
+        the component is in the routine's set of active components
+        """
+        if self.getStopTimeCode() is not None:
+            # computed by writeStopTimeCode()
+            code = "t >= %(name)sStopDue:\n"
+        elif self.params['stopType'].val == 'time (s)':
+            code = ("t >= %(stopVal)s - win.monitorFramePeriod * 0.75:"
+                    "  # most of one frame period left\n")
         # duration in time (s)
         elif (self.params['stopType'].val == 'duration (s)' and
                 self.params['startType'].val == 'time (s)'):
-            code = ("frameRemains = %(startVal)s + %(stopVal)s"
-                    "- win.monitorFramePeriod * 0.75"
-                    "  # most of one frame period left\n"
-                    "if %(name)s.status == STARTED and t >= frameRemains:\n")
+            code = ("t >= %(startVal)s + %(stopVal)s"
+                    "- win.monitorFramePeriod * 0.75:"
+                    "  # most of one frame period left\n")
         # start at frame and end with duratio (need to use approximate)
         elif self.params['stopType'].val == 'duration (s)':
-            code = ("if %(name)s.status == STARTED and t >= (%(name)s.tStart "
-                    "+ %(stopVal)s):\n")
+            code = "t >= (%(name)s.tStart + %(stopVal)s):\n"
         elif self.params['stopType'].val == 'duration (frames)':
-            code = ("if %(name)s.status == STARTED and frameN >= "
-                    "(%(name)s.frameNStart + %(stopVal)s):\n")
+            code = "frameN >= (%(name)s.frameNStart + %(stopVal)s):\n"
         elif self.params['stopType'].val == 'frame N':
-            code = "if %(name)s.status == STARTED and frameN >= %(stopVal)s:\n"
+            code = "frameN >= %(stopVal)s:\n"
         elif self.params['stopType'].val == 'condition':
-            code = "if %(name)s.status == STARTED and bool(%(stopVal)s):\n"
+            code = "bool(%(stopVal)s):\n"
         else:
             msg = ("Didn't write any stop line for startType=%(startType)s, "
                    "stopType=%(stopType)s")
             raise CodeGenerationException(msg % self.params)
 
-        buff.writeIndentedLines(code % self.params)
+        code = ("if %(name)s in %(routine)sActive and "
+                "%(name)s.status == STARTED and " + code)
+        buff.writeIndentedLines(code % dict(self.params,
+                                            routine=self.parentName))
         buff.setIndentLevel(+1, relative=True)
 
     def writeStopTestCodeJS(self, buff):
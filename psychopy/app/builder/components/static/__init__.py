@@ -113,12 +113,16 @@ class StaticComponent(BaseComponent):
         vals = (self.params['name'], durationSecsStr)
         buff.writeIndented("%s.start(%s)\n" % vals)
 
+    def writeStopTimeCode(self, buff):
+        pass  # the clock.StaticPeriod class handles its own stopping
+
     def writeStopTestCode(self, buff):
         """Test whether we need to stop
         """
-        code = ("elif %(name)s.status == STARTED:  # one frame should "
+        code = ("elif %(name)s in %(routine)sActive and "
+                "%(name)s.status == STARTED:  # one frame should "
                 "pass before updating params and completing\n")
-        buff.writeIndented(code % self.params)
+        buff.writeIndented(code % dict(self.params, routine=self.parentName))
         buff.setIndentLevel(+1, relative=True)  # entered an if statement
         self.writeParamUpdates(buff)
         code = "%(name)s.complete()  # finish the static period\n"
@@ -62,6 +62,9 @@ class UnknownComponent(BaseComponent):
     def writeStartTestCode(self, buff):
         pass
 
+    def writeStopTimeCode(self, buff):
+        pass
+
     def writeStopTestCode(self, buff):
         pass
 
@@ -25,7 +25,7 @@ import keyword
 
 from .components import getInitVals, getComponents, getAllComponents
 import psychopy
-from psychopy import data, __version__, logging, constants
+from psychopy import data, core, __version__, logging, constants
 from psychopy.constants import FOREVER
 
 from ..localization import _translate
@@ -126,6 +126,7 @@ class Experiment(object):
         super(Experiment, self).__init__()
         self.name = ''
         self.filename = ''  # update during load/save xml
+        self.resourceIndex = None  # created by getResourceFiles()
         self.flow = Flow(exp=self)  # every exp has exactly one flow
         self.routines = {}
         # get prefs (from app if poss or from cfg files)
@@ -662,83 +663,195 @@ class Experiment(object):
     def getResourceFiles(self):
         """Returns a list of known files needed for the experiment
         Interrogates each loop looking for conditions files and each
+        component looking for params that are valid file paths.
 
+        Each file is listed once, as a dict of 'abs' and 'rel' paths. The
+        files referenced by conditions files are remembered (in
+        self.resourceIndex) until the conditions file is modified, and
+        components are only checked again when their params change.
         """
-        join = os.path.join
-        abspath = os.path.abspath
         srcRoot = os.path.split(self.filename)[0]
+        if self.resourceIndex is None:
+            self.resourceIndex = ResourceIndex()
+        return self.resourceIndex.update(self.flow, srcRoot)
 
-        def getPaths(filePath):
-            """Helper to return absolute and relative paths (or None)
 
-            :param filePath: str to a potential file path (rel or abs)
-            :return: dict of 'asb' and 'rel' paths or None
-            """
-            thisFile={}
-            if filePath[0] == "/" or filePath[1]==":":
-                thisFile['abs'] = filePath
-                thisFile['rel'] = os.path.relpath(filePath, srcRoot)
-            else:
-                thisFile['rel'] = filePath
-                thisFile['abs'] = os.path.normpath(join(srcRoot, filePath))
-            if os.path.isfile(thisFile['abs']):
-                return thisFile
-            else:
-                return None
+class ResourceIndex(object):
+    """Finds the files needed by an experiment, for
+    :meth:`Experiment.getResourceFiles`, remembering what it found so that
+    the next search only repeats the work for what has changed:
 
-        def findPathsInFile(filePath):
-            """Recursively search a conditions file (xlsx or csv)
-             extracting valid file paths in any param/cond
+        - the file paths in each conditions file, keyed on its path and
+          modification time (and size)
+        - the candidate file paths of each component, until the values of
+          its params change
 
-            :param filePath: str to a potential file path (rel or abs)
-            :return: list of dicts{'rel','abs'} of valid file paths
-            """
-            paths = []
-            # does it look at all like an excel file?
-            if (not isinstance(filePath, basestring)
-                    or filePath[-4:] not in ['.csv', 'xlsx']):
-                return paths
-            thisFile = getPaths(filePath)
-            # does it exist?
-            if not thisFile:
-                return paths
-            # this file itself is valid so add to resources if not already
-            if thisFile not in (paths):
-                paths.append(thisFile)
-            conds = data.importConditions(thisFile['abs'])  # load the abs path
-            for thisCond in conds:  # thisCond is a dict
-                for param, val in thisCond.items():
-                    if isinstance(val, basestring):
-                        thisFile = getPaths(val)
-                    if thisFile:
-                        paths.append(thisFile)
-                        # if it's a possible condidtions file then recursive
-                        if thisFile['abs'][-4:] in ["xlsx", ".csv"]:
-                            contained = findPathsInFile(thisFile['abs'])
-                            paths.extend(contained)
-            return paths
+    After each update, `timing` holds the time spent ('conditions',
+    'components', 'total'; in secs) and the number of conditions files
+    ('conditionsParsed', 'conditionsCached') and components
+    ('componentsChecked', 'componentsCached') that needed work or not.
+    """
+
+    def __init__(self):
+        super(ResourceIndex, self).__init__()
+        self._conditions = {}  # abs path: ((mtime, size), [str vals])
+        self._components = {}  # id: (component, key, [candidate paths])
+        self.timing = {}
 
+    def __deepcopy__(self, memo):
+        """Copies (e.g. of the experiment, for undo) share the conditions
+        files cache, but not the components (which are copied too)
+        """
+        other = ResourceIndex()
+        other._conditions = self._conditions
+        return other
+
+    @staticmethod
+    def _getPaths(filePath, srcRoot):
+        """Return a dict of 'abs' and 'rel' paths for a string that could
+        be a file path (rel to srcRoot or abs), or None if it isn't a file
+        """
+        if len(filePath) < 2:
+            return None
+        if filePath[0] == "/" or filePath[1] == ":":
+            thisFile = {'abs': filePath,
+                        'rel': os.path.relpath(filePath, srcRoot)}
+        else:
+            thisFile = {'rel': filePath,
+                        'abs': os.path.normpath(os.path.join(srcRoot,
+                                                             filePath))}
+        return thisFile
+
+    @staticmethod
+    def _isFile(filePath):
+        try:
+            return os.path.isfile(filePath)
+        except UnicodeError:
+            # not a path the file system could have (e.g. a text param)
+            return False
+
+    @staticmethod
+    def _isConditionsFile(filePath):
+        return filePath[-4:] in ['.csv', 'xlsx']
+
+    def _conditionsValues(self, absPath):
+        """The string values of all conditions in a conditions file, only
+        importing it again if it has changed
+        """
+        stat = os.stat(absPath)
+        key = (stat.st_mtime, stat.st_size)
+        cached = self._conditions.get(absPath)
+        if cached and cached[0] == key:
+            self.timing['conditionsCached'] += 1
+            return cached[1]
+        values = []
+        for thisCond in data.importConditions(absPath):
+            for val in thisCond.values():
+                if isinstance(val, basestring) and val not in values:
+                    values.append(val)
+        self._conditions[absPath] = (key, values)
+        self.timing['conditionsParsed'] += 1
+        return values
+
+    def _findPathsInFile(self, filePath, srcRoot, resources, searched):
+        """Add a conditions file (xlsx or csv) to resources if it exists,
+        then the valid file paths in any of its conditions, recursively
+        """
+        if (not isinstance(filePath, basestring)
+                or not self._isConditionsFile(filePath)):
+            return
+        thisFile = self._getPaths(filePath, srcRoot)
+        if not thisFile or not self._isFile(thisFile['abs']):
+            return
+        resources.append(thisFile)
+        if thisFile['abs'] in searched:
+            return
+        searched.add(thisFile['abs'])
+        for val in self._conditionsValues(thisFile['abs']):
+            valFile = self._getPaths(val, srcRoot)
+            if not valFile or not self._isFile(valFile['abs']):
+                continue
+            if self._isConditionsFile(valFile['abs']):
+                # if it's a possible conditions file then recursive
+                self._findPathsInFile(valFile['abs'], srcRoot, resources,
+                                      searched)
+            else:
+                resources.append(valFile)
+
+    def _componentPaths(self, component, srcRoot, seen):
+        """The candidate file paths for the params of a component (only
+        worked out again if their values have changed)
+        """
+        vals = []
+        for thisParam in component.params.values():
+            if isinstance(thisParam, basestring):
+                vals.append(thisParam)
+            elif isinstance(thisParam.val, basestring):
+                vals.append(thisParam.val)
+        key = (srcRoot, tuple(vals))
+        seen.add(id(component))
+        cached = self._components.get(id(component))
+        if cached and cached[1] == key:
+            self.timing['componentsCached'] += 1
+            return cached[2]
+        candidates = [self._getPaths(val, srcRoot) for val in vals]
+        candidates = [thisFile for thisFile in candidates if thisFile]
+        # keeps a ref to the component, so its id can't be reused
+        self._components[id(component)] = (component, key, candidates)
+        self.timing['componentsChecked'] += 1
+        return candidates
+
+    def update(self, flow, srcRoot):
+        """Search the flow (loops and routines) for the files it needs,
+        returning a list of dicts with 'abs' and 'rel' paths
+        """
+        self.timing = dict.fromkeys(['conditionsParsed', 'conditionsCached',
+                                     'componentsChecked',
+                                     'componentsCached'], 0)
+        t0 = core.getTime()
+        conditionsTime = 0
         resources = []
-        for thisEntry in self.flow:
+        searched = set()
+        seen = set()
+        isFile = {}
+        for thisEntry in flow:
             if thisEntry.getType() == 'LoopInitiator':
                 # find all loops and check for conditions filename
                 params = thisEntry.loop.params
                 if 'conditionsFile' in params:
-                    condsPaths = findPathsInFile(params['conditionsFile'].val)
-                    resources.extend(condsPaths)
+                    tLoop = core.getTime()
+                    self._findPathsInFile(params['conditionsFile'].val,
+                                          srcRoot, resources, searched)
+                    conditionsTime += core.getTime() - tLoop
             elif thisEntry.getType() == 'Routine':
                 # find all params of all compons and check if valid filename
                 for thisComp in thisEntry:
-                    for thisParam in thisComp.params:
-                        filePath = ''
-                        if isinstance(thisParam, basestring):
-                            thisFile = getPaths(thisParam)
-                        elif isinstance(thisParam.val, basestring):
-                            thisFile = getPaths(thisParam.val)
-                        # then check if it's a valid path
-                        if thisFile:
+                    for thisFile in self._componentPaths(thisComp, srcRoot,
+                                                         seen):
+                        absPath = thisFile['abs']
+                        if absPath not in isFile:
+                            isFile[absPath] = self._isFile(absPath)
+                        if isFile[absPath]:
                             resources.append(thisFile)
-        return resources
+        # forget components that have been removed from the experiment
+        for compId in set(self._components) - seen:
+            del self._components[compId]
+        t1 = core.getTime()
+
+        # each file only once, in the order found
+        unique = []
+        found = set()
+        for thisFile in resources:
+            if thisFile['abs'] not in found:
+                found.add(thisFile['abs'])
+                unique.append(thisFile)
+        self.timing.update(conditions=conditionsTime,
+                           components=t1 - t0 - conditionsTime,
+                           total=core.getTime() - t0)
+        logging.debug("Found %i resource files in %.3fs: %s" %
+                      (len(unique), self.timing['total'], self.timing))
+        return unique
+
 
 class Param(object):
     """Defines parameters for Experiment Components
@@ -1954,17 +2067,27 @@ class Routine(list):
         # This is the beginning of the routine, before the loop starts
         for event in self:
             event.writeRoutineStartCode(buff)
+        # stop times that are the same on every frame
+        for event in self:
+            if hasattr(event, 'writeStopTimeCode'):
+                event.writeStopTimeCode(buff)
 
         code = '# keep track of which components have finished\n'
         buff.writeIndentedLines(code)
         compStr = ', '.join([c.params['name'].val for c in self
                              if 'startType' in c.params])
         buff.writeIndented('%sComponents = [%s]\n' % (self.name, compStr))
-        code = ("for thisComponent in %sComponents:\n"
+        code = ("for thisComponent in %(name)sComponents:\n"
                 "    if hasattr(thisComponent, 'status'):\n"
                 "        thisComponent.status = NOT_STARTED\n"
-                '\n# -------Start Routine "%s"-------\n')
-        buff.writeIndentedLines(code % (self.name, self.name))
+                "# components waiting to start, and those started but not yet "
+                "finished\n"
+                "%(name)sPending = set(thisComponent for thisComponent in "
+                "%(name)sComponents\n"
+                "    if hasattr(thisComponent, 'status'))\n"
+                "%(name)sActive = set()\n"
+                '\n# -------Start Routine "%(name)s"-------\n')
+        buff.writeIndentedLines(code % {'name': self.name})
         if useNonSlip:
             code = 'while continueRoutine and routineTimer.getTime() > 0:\n'
         else:
@@ -1996,14 +2119,21 @@ class Routine(list):
             'if not continueRoutine:  # a component has requested a '
             'forced-end of Routine\n'
             '    break\n'
-            'continueRoutine = False  # will revert to True if at least '
-            'one component still running\n'
-            'for thisComponent in %sComponents:\n'
-            '    if hasattr(thisComponent, "status") and '
-            'thisComponent.status != FINISHED:\n'
-            '        continueRoutine = True\n'
-            '        break  # at least one component has not yet finished\n')
-        buff.writeIndentedLines(code % self.name)
+            '# (components can also start or finish by themselves, e.g. a '
+            'movie)\n'
+            'for thisComponent in [thisComponent for thisComponent in '
+            '%(name)sPending\n'
+            '        if thisComponent.status != NOT_STARTED]:\n'
+            '    %(name)sPending.remove(thisComponent)\n'
+            '    if thisComponent.status == STARTED:\n'
+            '        %(name)sActive.add(thisComponent)\n'
+            'for thisComponent in [thisComponent for thisComponent in '
+            '%(name)sActive\n'
+            '        if thisComponent.status == FINISHED]:\n'
+            '    %(name)sActive.remove(thisComponent)\n'
+            'continueRoutine = bool(%(name)sPending or %(name)sActive)  '
+            '# True if at least one component still running\n')
+        buff.writeIndentedLines(code % {'name': self.name})
 
         # allow subject to quit via Esc key?
         if self.exp.settings.params['Enable Escape'].val:
@@ -13,8 +13,10 @@ Clock logic.
 @author: Jon
 """
 from __future__ import division
+import os
 import time
 import sys
+import select
 
 try:
     import pyglet
@@ -169,18 +171,151 @@ class CountdownTimer(Clock):
             Clock.reset(self, t)
 
 
-def wait(secs, hogCPUperiod=0.2):
+# How late time.sleep() may wake up on this machine, as measured by
+# calibrateSleep(). wait() only polls the clock for this final period.
+sleepMargin = None
+# The shortest wait() that calibrates the sleep margin: long enough for the
+# calibration (about 0.3 s on Windows) to fit before its final 0.2 s
+_calibrateDuringWait = 0.6
+
+# A pipe that wake() writes to, so that waitForEvents() can be woken
+# by emulated events or other threads. select() can't wait on pipes on
+# Windows, so waitForEvents() sleeps in short slices there instead.
+if sys.platform == 'win32':
+    _wakePipe = None
+else:
+    import fcntl
+    _wakePipe = os.pipe()
+    for _fd in _wakePipe:
+        fcntl.fcntl(_fd, fcntl.F_SETFL,
+                    fcntl.fcntl(_fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+
+def calibrateSleep(nSamples=20, duration=0.001, percentile=95,
+                   deadline=None):
+    """Measure how late time.sleep() wakes up on this machine.
+
+    Sleeps nSamples times for `duration` secs, then stores the given
+    percentile of the overshoot, plus 0.5 ms, as `sleepMargin` and returns
+    it. :func:`wait` calls this during the first wait that has time for
+    it, so the calibration comes out of that wait period.
+
+    If `deadline` (a time from :func:`getTime`) is given, the calibration
+    stops, returning None and leaving `sleepMargin` unchanged, as soon as
+    another sample might end after it. A sleep of 1 ms can take a whole
+    timer tick (about 15.6 ms) on Windows.
+    """
+    global sleepMargin
+    overshoots = []
+    for i in range(nSamples):
+        t0 = getTime()
+        if deadline is not None:
+            # assume a sample takes as long as the slowest so far
+            worst = max(overshoots) if overshoots else 0.02
+            if t0 + duration + worst > deadline:
+                return None
+        time.sleep(duration)
+        overshoots.append(getTime() - t0 - duration)
+    overshoots.sort()
+    index = int(round((nSamples - 1) * percentile / 100.0))
+    sleepMargin = min(max(overshoots[index], 0) + 0.0005, 0.2)
+    return sleepMargin
+
+
+def wake():
+    """Wake up a thread that is blocked in :func:`waitForEvents`, e.g.
+    after an emulated event has been added from another thread.
+    """
+    if _wakePipe is not None:
+        try:
+            os.write(_wakePipe[1], b'.')
+        except OSError:
+            pass  # the pipe is full, so a wake-up is pending anyway
+
+
+def waitForEvents(timeout=None, fds=()):
+    """Block, without using the CPU, until one of the file descriptors in
+    `fds` (e.g. a pyglet display connection) has data to read, until
+    :func:`wake` is called, or until `timeout` secs have passed.
+
+    Returns True if woken before the timeout. This may also return early
+    without an event (always after at most 1 ms on Windows), so callers
+    should check for their events and their deadline, and call it again.
+    """
+    if timeout is not None and timeout <= 0:
+        return False
+    if _wakePipe is None:
+        time.sleep(0.001 if timeout is None else min(timeout, 0.001))
+        return False
+    try:
+        readable = select.select([_wakePipe[0]] + list(fds), [], [],
+                                 timeout)[0]
+    except (select.error, OSError, IOError):
+        return True  # interrupted
+    if _wakePipe[0] in readable:
+        try:
+            while os.read(_wakePipe[0], 4096):
+                pass
+        except OSError:
+            pass
+    return len(readable) > 0
+
+
+def _pygletWindows(core):
+    windows = []
+    for winWeakRef in core.openWindows:
+        win = winWeakRef()
+        if (win is not None and win.winType == "pyglet" and
+                hasattr(win.winHandle, "dispatch_events")):
+            windows.append(win.winHandle)
+    return windows
+
+
+def _pygletDisplayFds(windows):
+    """The file descriptors that have data when the given pyglet windows
+    have events to dispatch, or None if some window can't be waited on
+    """
+    fds = set()
+    for win in windows:
+        try:
+            fds.add(win.display.fileno())
+        except Exception:
+            return None
+    return list(fds)
+
+
+def _dispatchPygletEvents(windows):
+    try:
+        # this takes focus away from command line terminal window:
+        if pyglet.version < '1.2':
+            # events for sounds/video should run independently of wait()
+            pyglet.media.dispatch_events()
+    except AttributeError:
+        # see http://www.pyglet.org/doc/api/pyglet.media-module.html#dispatch_events
+        # Deprecated: Since pyglet 1.1, Player objects schedule themselves
+        # on the default clock automatically. Applications should not call
+        # pyglet.media.dispatch_events().
+        pass
+    for win in windows:
+        win.dispatch_events()  # pump events
+
+
+def wait(secs, hogCPUperiod=None):
     """Wait for a given time period.
 
-    If secs=10 and hogCPU=0.2 then for 9.8s python's time.sleep function
-    will be used, which is not especially precise, but allows the cpu to
-    perform housekeeping. In the final hogCPUperiod the more precise
-    method of constantly polling the clock is used for greater precision.
+    Python's time.sleep function is used for most of the period, which
+    allows the cpu to perform housekeeping but is not especially precise.
+    In the final hogCPUperiod the more precise method of constantly polling
+    the clock is used. By default hogCPUperiod is the measured sleep
+    overshoot of this machine (see :func:`calibrateSleep`); with
+    hogCPUperiod=0.2, the default before PsychoPy 1.85, a wait of 10 s
+    sleeps for 9.8 s and then polls the clock for 0.2 s.
 
-    If you want to obtain key-presses during the wait, be sure to use
-    pyglet and to hogCPU for the entire time, and then call
-    :func:`psychopy.event.getKeys()` after calling
-    :func:`~.psychopy.core.wait()`
+    Pyglet window events are dispatched as they arrive during the whole
+    wait (where the windowing system allows waiting for them, and
+    otherwise while polling the clock), so key-presses made during the
+    wait get accurate times. Call :func:`psychopy.event.getKeys()` after
+    calling :func:`~.psychopy.core.wait()` to obtain them.
 
     If you want to suppress checking for pyglet events during the wait,
     do this once::
@@ -190,36 +325,41 @@ def wait(secs, hogCPUperiod=0.2):
         core.wait(sec)
 
     This will preserve terminal-window focus during command line usage.
+
+    Returns how late the wait ended: the achieved minus the requested wake
+    time, in secs.
     """
     from . import core
 
-    # initial relaxed period, using sleep (better for system resources etc)
-    if secs > hogCPUperiod:
-        time.sleep(secs - hogCPUperiod)
-        secs = hogCPUperiod  # only this much is now left
+    wakeTime = getTime() + secs
+    if hogCPUperiod is None:
+        if sleepMargin is None and secs > _calibrateDuringWait:
+            # only while the rest of the wait would have slept anyway
+            calibrateSleep(deadline=wakeTime - 0.2)
+        hogCPUperiod = 0.2 if sleepMargin is None else sleepMargin
+
+    windows = []
+    if core.havePyglet and core.checkPygletDuringWait:
+        windows = _pygletWindows(core)
+    fds = _pygletDisplayFds(windows)
+
+    # relaxed period, sleeping or blocking until a window has events
+    sleepUntil = wakeTime - hogCPUperiod
+    now = getTime()
+    while now < sleepUntil:
+        if windows and fds is not None:
+            if waitForEvents(sleepUntil - now, fds):
+                _dispatchPygletEvents(windows)
+        else:
+            time.sleep(sleepUntil - now)
+        now = getTime()
 
     # hog the cpu, checking time
-    t0 = getTime()
-    while (getTime() - t0) < secs:
-        if not (core.havePyglet and core.checkPygletDuringWait):
-            continue
-        # let's see if pyglet collected any event in meantime
-        try:
-            # this takes focus away from command line terminal window:
-            if pyglet.version < '1.2':
-                # events for sounds/video should run independently of wait()
-                pyglet.media.dispatch_events()
-        except AttributeError:
-            # see http://www.pyglet.org/doc/api/pyglet.media-module.html#dispatch_events
-            # Deprecated: Since pyglet 1.1, Player objects schedule themselves
-            # on the default clock automatically. Applications should not call
-            # pyglet.media.dispatch_events().
-            pass
-        for winWeakRef in core.openWindows:
-            win = winWeakRef()
-            if (win.winType == "pyglet" and
-                    hasattr(win.winHandle, "dispatch_events")):
-                win.winHandle.dispatch_events()  # pump events
+    while now < wakeTime:
+        if windows:
+            _dispatchPygletEvents(windows)
+        now = getTime()
+    return now - wakeTime
 
 
 def getAbsTime():
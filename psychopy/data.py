@@ -22,6 +22,9 @@ import weakref
 import re
 import warnings
 import collections
+import itertools
+import ast
+import hashlib
 from distutils.version import StrictVersion
 
 try:
@@ -259,6 +262,19 @@ class ExperimentHandler(object):
             value = copy.deepcopy(value)
         self.thisEntry[name] = value
 
+    def addDataItems(self, items):
+        """Add several name, value pairs of data to the current experiment
+        entry at once, as if each were given to :meth:`addData` in turn.
+
+        Used by loops to send the data for each trial in one call.
+
+        e.g.::
+
+            exp.addDataItems([('resp.rt', 0.8), ('resp.key', 'k')])
+        """
+        for name, value in items:
+            self.addData(name, value)
+
     def nextEntry(self):
         """Calling nextEntry indicates to the ExperimentHandler that the
         current trial has ended and so further addData() calls correspond
@@ -727,6 +743,41 @@ class _BaseTrialHandler(object):
         return originPath, origin
 
 
+def _sequenceRandom(seed):
+    """The random number source for the trial sequence of a handler.
+
+    An int seeds the global numpy random state, as earlier versions of
+    PsychoPy did (so code that draws random numbers after creating the
+    handler is reproducible too); a numpy.random.RandomState is used as it
+    is, leaving the global state alone; None uses the global state.
+    """
+    if seed is None:
+        return numpy.random
+    if isinstance(seed, numpy.random.RandomState):
+        return seed
+    numpy.random.seed(seed)
+    return numpy.random
+
+
+def _shuffledRepeats(indices, nReps, rand):
+    """An array of nReps independent shuffles of `indices` (one per column),
+    drawing the random numbers for all repeats at once in the same order
+    as shuffling each repeat in turn with shuffleArray
+    """
+    indices = numpy.asarray(indices).ravel()
+    order = numpy.argsort(rand.random_sample((nReps, len(indices))), -1)
+    return indices[order].T
+
+
+def _fullyShuffled(indices, nReps, rand):
+    """All nReps repeats of `indices` shuffled together, in the shape of
+    numpy.repeat(indices, nReps, 1) (as shuffleArray did)
+    """
+    sequential = numpy.repeat(indices, nReps, 1)
+    order = numpy.argsort(rand.random_sample(sequential.size), -1)
+    return numpy.reshape(sequential.ravel()[order], sequential.shape)
+
+
 class TrialHandler(_BaseTrialHandler):
     """Class to handle trial sequencing and data storage.
 
@@ -786,6 +837,9 @@ class TrialHandler(_BaseTrialHandler):
             seed: an integer
                 If provided then this fixes the random number generator to
                 use the same pattern of trials, by seeding its startpoint
+                (this seeds numpy.random). Can also be a
+                numpy.random.RandomState, which gives the same pattern as
+                its seed without changing the state of numpy.random
 
             originPath: a string describing the location of the
                 script / experiment file path. The psydat file format will
@@ -943,22 +997,17 @@ class TrialHandler(_BaseTrialHandler):
         # create indices for a single rep
         indices = numpy.asarray(self._makeIndices(self.trialList), dtype=int)
 
+        # the seed is only used once, for the whole sequence, which is
+        # the same as earlier versions gave for that seed
         if self.method == 'random':
-            sequenceIndices = []
-            seed = self.seed
-            for thisRep in range(self.nReps):
-                thisRepSeq = shuffleArray(indices.flat, seed=seed).tolist()
-                seed = None  # so that we only seed the first pass through!
-                sequenceIndices.append(thisRepSeq)
-            sequenceIndices = numpy.transpose(sequenceIndices)
+            sequenceIndices = _shuffledRepeats(
+                indices, self.nReps, _sequenceRandom(self.seed))
         elif self.method == 'sequential':
             sequenceIndices = numpy.repeat(indices, self.nReps, 1)
         elif self.method == 'fullRandom':
-            # indices*nReps, flatten, shuffle, unflatten; only use seed once
-            sequential = numpy.repeat(indices, self.nReps, 1)  # = sequential
-            randomFlat = shuffleArray(sequential.flat, seed=self.seed)
-            sequenceIndices = numpy.reshape(
-                randomFlat, (len(indices), self.nReps))
+            # indices*nReps, flatten, shuffle, unflatten
+            sequenceIndices = _fullyShuffled(indices, self.nReps,
+                                             _sequenceRandom(self.seed))
         if self.autoLog:
             msg = 'Created sequence: %s, trialTypes=%d, nReps=%i, seed=%s'
             vals = (self.method, len(indices), self.nReps, str(self.seed))
@@ -969,6 +1018,7 @@ class TrialHandler(_BaseTrialHandler):
         """
         Creates an array of tuples the same shape as the input array
         where each tuple contains the indices to itself in the array.
+        (The tuples are the last axis of the returned int array.)
 
         Useful for shuffling and then using as a reference.
         """
@@ -977,24 +1027,12 @@ class TrialHandler(_BaseTrialHandler):
         # get some simple variables for later
         dims = inputArray.shape
         dimsProd = numpy.product(dims)
-        dimsN = len(dims)
-        dimsList = range(dimsN)
-        listOfLists = []
-        # this creates space for an array of any objects
-        arrayOfTuples = numpy.ones(dimsProd, 'O')
-
         # for each dimension create list of its indices (using modulo)
-        for thisDim in dimsList:
-            prevDimsProd = numpy.product(dims[:thisDim])
-            # NB this means modulus in python
-            thisDimVals = numpy.arange(dimsProd) / prevDimsProd % dims[thisDim]
-            listOfLists.append(thisDimVals)
-
-        # convert to array
-        indexArr = numpy.asarray(listOfLists)
-        for n in range(dimsProd):
-            arrayOfTuples[n] = tuple((indexArr[:, n]))
-        return (numpy.reshape(arrayOfTuples, dims)).tolist()
+        prevDimsProd = numpy.cumprod((1,) + dims[:-1])
+        indexArr = (numpy.arange(dimsProd)[:, numpy.newaxis] //
+                    prevDimsProd % dims)
+        # an int array, with the tuple for each entry along the last axis
+        return numpy.reshape(indexArr, dims + (len(dims),))
 
     def next(self):
         """Advances to next trial and returns it.
@@ -1882,7 +1920,8 @@ class TrialHandlerExt(TrialHandler):
             seed: an integer
                 If provided then this fixes the random number generator
                 to use the same pattern
-                of trials, by seeding its startpoint
+                of trials, by seeding its startpoint (or a
+                numpy.random.RandomState, as for TrialHandler)
 
             originPath: a string describing the location of the script /
                 experiment file path. The psydat file format will store a
@@ -2024,39 +2063,18 @@ class TrialHandlerExt(TrialHandler):
         indices = numpy.asarray(self._makeIndices(self.trialList), dtype=int)
 
         repeat = numpy.repeat
-        reshape = numpy.reshape
+        if self.trialWeights is not None:
+            indices = repeat(indices, self.trialWeights, 0)
+        # the seed is only used once, for the whole sequence
         if self.method == 'random':
-            seqIndices = []
-            seed = self.seed
-            for thisRep in range(self.nReps):
-                if self.trialWeights is None:
-                    idx = indices.flat
-                else:
-                    idx = repeat(indices, self.trialWeights)
-                thisRepSeq = shuffleArray(idx, seed=seed).tolist()
-                seed = None  # so that we only seed the first pass through!
-                seqIndices.append(thisRepSeq)
-            seqIndices = numpy.transpose(seqIndices)
+            seqIndices = _shuffledRepeats(indices, self.nReps,
+                                          _sequenceRandom(self.seed))
         elif self.method == 'sequential':
-            if self.trialWeights is None:
-                seqIndices = repeat(indices, self.nReps, 1)
-            else:
-                _base = repeat(indices, self.trialWeights, 0)
-                seqIndices = repeat(_base, self.nReps, 1)
+            seqIndices = repeat(indices, self.nReps, 1)
         elif self.method == 'fullRandom':
-            if self.trialWeights is None:
-                # indices * nReps, flatten, shuffle, unflatten;
-                # only use seed once
-                sequential = repeat(indices, self.nReps, 1)
-                randomFlat = shuffleArray(sequential.flat, seed=self.seed)
-                seqIndices = reshape(randomFlat,
-                                     (len(indices), self.nReps))
-            else:
-                _base = repeat(indices, self.trialWeights, 0)
-                sequential = repeat(_base, self.nReps, 1)
-                randomFlat = shuffleArray(sequential.flat, seed=self.seed)
-                seqIndices = reshape(randomFlat,
-                                     (sum(self.trialWeights), self.nReps))
+            # indices * nReps, flatten, shuffle, unflatten
+            seqIndices = _fullyShuffled(indices, self.nReps,
+                                        _sequenceRandom(self.seed))
 
         if self.autoLog:
             # Change
@@ -2563,7 +2581,133 @@ def indicesFromString(indsString):
         pass
 
 
-def importConditions(fileName, returnFieldNames=False, selection=""):
+# bump this when the output of importConditions changes
+_conditionsCacheVersion = 1
+
+
+def _conditionsCachePath(fileName):
+    """Where the parsed version of a conditions file is cached
+    """
+    from psychopy import prefs
+    path = os.path.abspath(fileName)
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    return os.path.join(prefs.paths['userPrefsDir'], 'conditionsCache',
+                        hashlib.sha1(path).hexdigest() + '.pickle')
+
+
+def _conditionsCacheKey(fileName, reader):
+    stat = os.stat(fileName)
+    return (_conditionsCacheVersion, os.path.abspath(fileName),
+            stat.st_mtime, stat.st_size, reader)
+
+
+def _packConditionsColumn(values):
+    """Store a column of numpy numbers (e.g. from pandas) as an array,
+    which pickles much faster than a list of numpy scalars
+    """
+    types = set(type(val) for val in values if val is not None)
+    if len(types) == 1:
+        valType = types.pop()
+        if (issubclass(valType, numpy.generic) and
+                numpy.dtype(valType).kind in 'biuf'):
+            noneInds = [n for n, val in enumerate(values) if val is None]
+            if noneInds:
+                values = list(values)
+                for n in noneInds:
+                    values[n] = 0
+            return numpy.array(values, dtype=valType), noneInds
+    return values
+
+
+def _unpackConditionsColumn(column):
+    if isinstance(column, tuple):
+        values, noneInds = column
+        column = list(values)  # gives back the numpy scalars
+        for n in noneInds:
+            column[n] = None
+    return column
+
+
+def _loadConditionsCache(fileName, reader):
+    """Return (trialList, fieldNames) if the file was parsed before and
+    hasn't changed since, else None
+    """
+    try:
+        with open(_conditionsCachePath(fileName), 'rb') as f:
+            key, fieldNames, nTrials, columns = cPickle.load(f)
+        if key == _conditionsCacheKey(fileName, reader):
+            columns = [_unpackConditionsColumn(col) for col in columns]
+            # build the dicts as the parser does, so keys are in the
+            # same order as for a freshly parsed file
+            if not columns:
+                return [{} for trialN in range(nTrials)], fieldNames
+            trialList = [dict(zip(fieldNames, row)) for row in zip(*columns)]
+            return trialList, fieldNames
+    except Exception:
+        # missing, stale or unreadable; just parse the file again
+        pass
+    return None
+
+
+def _saveConditionsCache(fileName, reader, trialList, fieldNames):
+    cachePath = _conditionsCachePath(fileName)
+    tmpPath = '%s.%i.tmp' % (cachePath, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(cachePath)):
+            os.makedirs(os.path.dirname(cachePath))
+        columns = [_packConditionsColumn([trial[name] for trial in trialList])
+                   for name in fieldNames]
+        with open(tmpPath, 'wb') as f:
+            cPickle.dump((_conditionsCacheKey(fileName, reader), fieldNames,
+                          len(trialList), columns), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        if sys.platform == 'win32' and os.path.isfile(cachePath):
+            os.remove(cachePath)
+        os.rename(tmpPath, cachePath)
+    except Exception as err:
+        logging.debug("Could not cache conditions for %s: %s" %
+                      (fileName, err))
+        if os.path.isfile(tmpPath):
+            os.remove(tmpPath)
+
+
+def _parseConditionsLiteral(val, fileName):
+    """Convert a cell that looks like a list (or tuple) into one, using
+    a literal parser rather than eval (so no code in the file gets run)
+    """
+    try:
+        return ast.literal_eval(val)
+    except (ValueError, SyntaxError):
+        logging.warning("Conditions file %s: could not parse %s as a list; "
+                        "it will be used as a string" % (fileName, val))
+        return val
+
+
+def _conditionsColumn(values, fileName):
+    """Convert one column (a numpy array) of a pandas conditions table
+    into a list of values for the trial dicts
+    """
+    column = list(values)
+    if values.dtype.kind == 'f':
+        # numpy.nan (empty cells) is converted to None
+        for n in numpy.flatnonzero(numpy.isnan(values)):
+            column[n] = None
+    elif values.dtype.kind == 'O':
+        for n, val in enumerate(column):
+            if type(val) == numpy.string_:
+                val = column[n] = unicode(val.decode('utf-8'))
+            if isinstance(val, basestring):
+                # if it looks like a list, convert it:
+                if val.startswith('[') and val.endswith(']'):
+                    column[n] = _parseConditionsLiteral(val, fileName)
+            elif isinstance(val, float) and numpy.isnan(val):
+                column[n] = None
+    return column
+
+
+def importConditions(fileName, returnFieldNames=False, selection="",
+                     useCache=True):
     """Imports a list of conditions from an .xlsx, .csv, or .pkl file
 
     The output is suitable as an input to :class:`TrialHandler`
@@ -2598,6 +2742,13 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
         - slice(-10, 2, None)  # the same as above
         - random(5) * 8  # five random vals 0-8
 
+    Cells that look like lists (e.g. "[1, 2]") are converted to lists
+    using a literal parser, so they may only contain literal values.
+
+    Parsed .csv and .xlsx files are cached on disk (in the user prefs
+    folder) and the cache is reused until the file is modified. Set
+    `useCache=False` to always parse the file.
+
     """
 
     def _assertValidVarNames(fieldNames, fileName):
@@ -2628,49 +2779,47 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
         """Convert a pandas dataframe to a list of dicts.
         This helper function is used by csv or excel imports via pandas
         """
-        # convert the resulting dataframe to a numpy recarray
-        trialsArr = dataframe.to_records(index=False)
-        if trialsArr.shape == ():
-            # convert 0-D to 1-D with one element:
-            trialsArr = trialsArr[numpy.newaxis]
-        fieldNames = trialsArr.dtype.names
+        # use the names that a record array would give the columns
+        fieldNames = dataframe.iloc[:0].to_records(index=False).dtype.names
         _assertValidVarNames(fieldNames, fileName)
-        # convert the record array into a list of dicts
-        trialList = []
-        for trialN, trialType in enumerate(trialsArr):
-            thisTrial = {}
-            for fieldN, fieldName in enumerate(fieldNames):
-                val = trialsArr[trialN][fieldN]
-
-                if type(val) in [unicode, str]:
-                    if val.startswith('[') and val.endswith(']'):
-                        # val = eval('%s' %unicode(val.decode('utf8')))
-                        val = eval(val)
-                elif type(val) == numpy.string_:
-                    val = unicode(val.decode('utf-8'))
-                    # if it looks like a list, convert it:
-                    if val.startswith('[') and val.endswith(']'):
-                        # val = eval('%s' %unicode(val.decode('utf8')))
-                        val = eval(val)
-                elif numpy.isnan(val):  # if it is a numpy.nan, convert to None
-                    val = None
-                thisTrial[fieldName] = val
-            trialList.append(thisTrial)
+        # convert a column at a time then assemble the dicts
+        columns = [_conditionsColumn(dataframe.iloc[:, fieldN].values,
+                                     fileName)
+                   for fieldN in range(len(fieldNames))]
+        if not columns:
+            return [{} for rowN in range(len(dataframe))], fieldNames
+        trialList = [dict(zip(fieldNames, row)) for row in zip(*columns)]
         return trialList, fieldNames
 
     if fileName.endswith('.csv'):
+        reader = 'csv'
+    elif fileName.endswith(('.xlsx', '.xls')) and haveXlrd:
+        reader = 'xlrd'
+    elif fileName.endswith('.xlsx'):
+        reader = 'openpyxl'
+    else:
+        reader = None
+    cached = None
+    if useCache and reader:
+        cached = _loadConditionsCache(fileName, reader)
+
+    if cached:
+        trialList, fieldNames = cached
+        logging.debug("Read cached conditions for: {}".format(fileName))
+
+    elif reader == 'csv':
         with open(fileName, 'rU') as fileUniv:
             # use pandas reader, which can handle commas in fields, etc
             trialsArr = pandas.read_csv(fileUniv, encoding='utf-8')
             logging.debug("Read csv file with pandas: {}".format(fileName))
             trialList, fieldNames = pandasToDictList(trialsArr)
 
-    elif fileName.endswith(('.xlsx','.xls')) and haveXlrd:
+    elif reader == 'xlrd':
         trialsArr = pandas.read_excel(fileName)
         logging.debug("Read excel file with pandas: {}".format(fileName))
         trialList, fieldNames = pandasToDictList(trialsArr)
 
-    elif fileName.endswith('.xlsx'):
+    elif reader == 'openpyxl':
         if not haveOpenpyxl:
             raise ImportError('openpyxl or xlrd is required for loading excel '
                               'files, but neither was found.')
@@ -2689,27 +2838,29 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
             nCols = ws.get_highest_column()
             nRows = ws.get_highest_row()
 
+        try:
+            # fetch whole rows rather than looking up each cell by name
+            rows = [[cell.value for cell in row] for row in
+                    ws.iter_rows(min_row=1, max_row=nRows, max_col=nCols)]
+        except (AttributeError, TypeError):
+            # older openpyxl has no min_row/max_row arguments
+            rows = [[ws.cell(_getExcelCellName(col=colN, row=rowN)).value
+                     for colN in range(nCols)] for rowN in range(nRows)]
+
         # get parameter names from the first row header
-        fieldNames = []
-        for colN in range(nCols):
-            fieldName = ws.cell(_getExcelCellName(col=colN, row=0)).value
-            fieldNames.append(fieldName)
+        fieldNames = rows[0] if rows else []
         _assertValidVarNames(fieldNames, fileName)
 
         # loop trialTypes
         trialList = []
-        for rowN in range(1, nRows):  # skip header first row
-            thisTrial = {}
-            for colN in range(nCols):
-                val = ws.cell(_getExcelCellName(col=colN, row=rowN)).value
+        for row in rows[1:]:  # skip header first row
+            for colN, val in enumerate(row):
                 # if it looks like a list or tuple, convert it
                 if (type(val) in (unicode, str) and
                         (val.startswith('[') and val.endswith(']') or
                          val.startswith('(') and val.endswith(')'))):
-                    val = eval(val)
-                fieldName = fieldNames[colN]
-                thisTrial[fieldName] = val
-            trialList.append(thisTrial)
+                    row[colN] = _parseConditionsLiteral(val, fileName)
+            trialList.append(dict(zip(fieldNames, row)))
 
     elif fileName.endswith('.pkl'):
         f = open(fileName, 'rU')  # is U needed?
@@ -2731,6 +2882,9 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
         raise IOError('Your conditions file should be an '
                       'xlsx, csv or pkl file')
 
+    if useCache and reader and not cached:
+        _saveConditionsCache(fileName, reader, trialList, fieldNames)
+
     # if we have a selection then try to parse it
     if isinstance(selection, basestring) and len(selection) > 0:
         selection = indicesFromString(selection)
@@ -2782,34 +2936,12 @@ def createFactorialTrialList(factors):
         mytrials = createFactorialTrialList(factors)
     """
 
-    # the first step is to place all the factorial combinations in a list of
-    # lists
-    tempListOfLists = [[]]
-    for key in factors:
-        # this takes the levels of each factor as a set of values
-        # (a list) at a time
-        alist = factors[key]
-        tempList = []
-        for value in alist:
-            # now we loop over the values in a given list,
-            # and add each value of the other lists
-            for iterList in tempListOfLists:
-                tempList.append(iterList + [key, value])
-        tempListOfLists = tempList
-
-    # this second step is so we can return a list in the format of trialList
-    trialList = []
-    for atrial in tempListOfLists:
-        keys = atrial[0::2]  # the even elements are keys
-        values = atrial[1::2]  # the odd elements are values
-        atrialDict = {}
-        for i in range(len(keys)):
-            # this combines the key with the value
-            atrialDict[keys[i]] = values[i]
-        # append one trial at a time to the final trialList
-        trialList.append(atrialDict)
-
-    return trialList
+    # the combinations are generated lazily, varying the first factor
+    # fastest (and the last slowest), then each is made into a trial dict
+    keys = list(factors)[::-1]
+    levels = [factors[key] for key in keys]
+    return [dict(zip(keys, values))
+            for values in itertools.product(*levels)]
 
 
 class StairHandler(_BaseTrialHandler):
@@ -4111,7 +4243,8 @@ class MultiStairHandler(_BaseTrialHandler):
         # create staircases
         self.staircases = []  # all staircases
         self.runningStaircases = []  # staircases that haven't finished yet
-        self.thisPassRemaining = []  # staircases to run this pass
+        # staircases to run this pass
+        self.thisPassRemaining = collections.deque()
         self._createStairs()
 
         # fetch first staircase/value (without altering/advancing it)
@@ -4178,6 +4311,9 @@ class MultiStairHandler(_BaseTrialHandler):
 
             # This isn't normally part of handler.
             thisStair.condition = condition
+            # nor is this: the (first) index of its condition, for the
+            # data file (found once, rather than on every trial)
+            thisStair.conditionIndex = self.conditions.index(condition)
 
             # And finally, add it to the list.
             self.staircases.append(thisStair)
@@ -4214,10 +4350,13 @@ class MultiStairHandler(_BaseTrialHandler):
             else:
                 self.finished = True
                 raise StopIteration
+        elif type(self.thisPassRemaining) is list:
+            # from a handler pickled by an earlier version
+            self.thisPassRemaining = collections.deque(self.thisPassRemaining)
 
         # fetch next staircase/value
-        self.currentStaircase = self.thisPassRemaining.pop(
-            0)  # take the first and remove it
+        # take the first and remove it
+        self.currentStaircase = self.thisPassRemaining.popleft()
         # if staircase.next() not called, staircaseHandler would not
         # save the first intensity,
         # Error: miss align intensities and responses
@@ -4228,32 +4367,56 @@ class MultiStairHandler(_BaseTrialHandler):
         if not self.finished:
             # inform experiment of the condition (but not intensity,
             # that might be overridden by user)
-            if self.getExp() != None:
-                exp = self.getExp()
+            exp = self.getExp()
+            if exp != None:
                 stair = self.currentStaircase
-                for key, value in stair.condition.items():
-                    exp.addData("%s.%s" % (self.name, key), value)
-                exp.addData(self.name + '.thisIndex',
-                            self.conditions.index(stair.condition))
-                exp.addData(self.name + '.thisRepN', stair.thisTrialN + 1)
-                exp.addData(self.name + '.thisN', self.totalTrials)
-                exp.addData(self.name + '.direction', stair.currentDirection)
-                exp.addData(self.name + '.stepSize', stair.stepSizeCurrent)
-                exp.addData(self.name + '.stepType', stair.stepType)
-                exp.addData(self.name + '.intensity', self._nextIntensity)
+                keys, names = self._getDataNames(stair)
+                condition = stair.condition
+                values = [condition[key] for key in keys]
+                values.extend([self._getConditionIndex(stair),
+                               stair.thisTrialN + 1, self.totalTrials,
+                               stair.currentDirection, stair.stepSizeCurrent,
+                               stair.stepType, self._nextIntensity])
+                exp.addDataItems(zip(names, values))
             return self._nextIntensity, self.currentStaircase.condition
         else:
             raise StopIteration
 
+    def _getDataNames(self, stair):
+        """The condition keys of this staircase and the names of the data
+        that next() sends to the experiment for it, which are made once
+        (for the current name of the handler) and then reused
+        """
+        cached = getattr(stair, '_dataNames', None)
+        condition = stair.condition
+        # (remade if the name or the keys of the condition change)
+        if (cached is None or cached[0] != self.name or
+                condition.viewkeys() != cached[1]):
+            keys = condition.keys()
+            names = ["%s.%s" % (self.name, key) for key in keys]
+            names.extend(self.name + suffix for suffix in
+                         ['.thisIndex', '.thisRepN', '.thisN', '.direction',
+                          '.stepSize', '.stepType', '.intensity'])
+            cached = stair._dataNames = (self.name, frozenset(keys), keys,
+                                         names)
+        return cached[2], cached[3]
+
+    def _getConditionIndex(self, stair):
+        if not hasattr(stair, 'conditionIndex'):
+            # from a handler pickled by an earlier version
+            stair.conditionIndex = self.conditions.index(stair.condition)
+        return stair.conditionIndex
+
     def _startNewPass(self):
         """Create a new iteration of the running staircases for this pass.
 
         This is not normally needed by the user - it gets called at __init__
         and every time that next() runs out of trials for this pass.
         """
-        self.thisPassRemaining = copy.copy(self.runningStaircases)
+        thisPass = copy.copy(self.runningStaircases)
         if self.method == 'random':
-            numpy.random.shuffle(self.thisPassRemaining)
+            numpy.random.shuffle(thisPass)
+        self.thisPassRemaining = collections.deque(thisPass)
 
     def addResponse(self, result, intensity=None):
         """Add a 1 or 0 to signify a correct / detected or
@@ -4568,7 +4731,10 @@ class _baseFunctionFit(object):
     your own functions
 
     Derived classes must have _eval and _inverse methods with @staticmethods
+    and can give a _jacobian @staticmethod (the derivatives of _eval with
+    respect to each parameter) for use by :meth:`fitBatch`
     """
+    _jacobian = None
 
     def __init__(self, xx, yy, sems=1.0, guess=None, display=1,
                  expectedMin=0.5):
@@ -4630,6 +4796,85 @@ class _baseFunctionFit(object):
         xx = self._inverse(yy, *params)
         return xx
 
+    @classmethod
+    def fitBatch(cls, xx, yy, sems=1.0, guess=None, expectedMin=0.5,
+                 nProcesses=1):
+        """Fit the model to many datasets at once, e.g. to each of a set of
+        bootstrapped resamples or to each participant
+
+        Usage:
+            ``params, covars = FitWeibull.fitBatch(xx, yy, expectedMin=0.5)``
+
+        Where:
+            xx
+                the x values, either 1D (the same for every dataset) or
+                one row per dataset
+            yy
+                one row of y values per dataset (or a 1D array for one)
+            sems
+                a value, a row or one row per dataset, as for a single fit
+            guess
+                starting params for a fit to all of the data pooled
+                together, whose result is then the starting point for each
+                dataset. Default is all ones, as for a single fit
+            nProcesses
+                number of worker processes to share the datasets across
+
+            params
+                an array of shape (datasets, parameters)
+            covars
+                the estimated covariance of each set of params, an array of
+                shape (datasets, parameters, parameters)
+
+        The datasets are fitted together (Levenberg-Marquardt, as used by
+        ``scipy.optimize.curve_fit``) with the model and its derivatives
+        evaluated as whole arrays, so the results match those of fitting
+        each dataset with the class itself. Any dataset that can't be
+        fitted has params of nan.
+        """
+        global _chance
+        _chance = expectedMin
+        yy = numpy.asarray(yy, dtype=float)
+        oneD = len(yy.shape) == 1
+        if oneD:
+            yy = numpy.array([yy])
+        # every dataset gets its own row of x values and sems
+        xx = numpy.asarray(xx, dtype=float) + numpy.zeros(yy.shape)
+        sems = numpy.asarray(sems, dtype=float) + numpy.zeros(yy.shape)
+        if guess is None:
+            nParams = len(inspect.getargspec(cls._eval).args) - 1
+            guess = numpy.ones(nParams)
+        guess = numpy.array([guess], dtype=float)
+
+        # the fit to the pooled data is the starting point for each dataset
+        pooled = _fitBatchLM(cls, xx.reshape([1, -1]), yy.reshape([1, -1]),
+                             sems.reshape([1, -1]), guess)[0]
+        if numpy.isfinite(pooled).all():
+            start = numpy.repeat(pooled, len(yy), axis=0)
+        else:
+            start = numpy.repeat(guess, len(yy), axis=0)
+
+        jobs = [(cls, xx[rows], yy[rows], sems[rows], start[rows], guess,
+                 expectedMin)
+                for rows in numpy.array_split(numpy.arange(len(yy)),
+                                              max(1, nProcesses))
+                if len(rows)]
+        if nProcesses > 1 and len(jobs) > 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(len(jobs))
+            try:
+                chunks = pool.map(_fitBatchChunk, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            chunks = [_fitBatchChunk(job) for job in jobs]
+        params = numpy.concatenate([chunk[0] for chunk in chunks])
+        covars = numpy.concatenate([chunk[1] for chunk in chunks])
+        if oneD:
+            return params[0], covars[0]
+        return params, covars
+
 
 class FitWeibull(_baseFunctionFit):
     """Fit a Weibull function (either 2AFC or YN)
@@ -4661,6 +4906,16 @@ class FitWeibull(_baseFunctionFit):
         xx = alpha * (-numpy.log((1.0 - yy) / (1 - _chance))) ** (1.0 / beta)
         return xx
 
+    @staticmethod
+    def _jacobian(xx, alpha, beta):
+        global _chance
+        xx = numpy.asarray(xx)
+        power = (xx / alpha)**beta
+        scale = (1.0 - _chance) * numpy.exp(-power) * power
+        # log(xx/alpha) is only needed (and only finite) where power > 0
+        logX = numpy.log(numpy.where(power > 0, xx / alpha, 1.0))
+        return [-scale * beta / alpha, scale * logX]
+
 
 class FitNakaRushton(_baseFunctionFit):
     """Fit a Naka-Rushton function
@@ -4681,17 +4936,28 @@ class FitNakaRushton(_baseFunctionFit):
     @staticmethod
     def _eval(xx, c50, n, rMin, rMax):
         xx = numpy.asarray(xx)
-        if c50 <= 0:
-            c50 = 0.001
-        if n <= 0:
-            n = 0.001
-        if rMax <= 0:
-            n = 0.001
-        if rMin <= 0:
-            n = 0.001
+        # (written with where() so that params can be arrays, for fitBatch)
+        c50 = numpy.where(c50 <= 0, 0.001, c50)
+        n = numpy.where((n <= 0) | (rMax <= 0) | (rMin <= 0), 0.001, n)
         yy = rMin + (rMax - rMin) * (xx**n / (xx**n + c50**n))
         return yy
 
+    @staticmethod
+    def _jacobian(xx, c50, n, rMin, rMax):
+        xx = numpy.asarray(xx)
+        c50Fixed = c50 <= 0
+        nFixed = (n <= 0) | (rMax <= 0) | (rMin <= 0)
+        c50 = numpy.where(c50Fixed, 0.001, c50)
+        n = numpy.where(nFixed, 0.001, n)
+        frac = xx**n / (xx**n + c50**n)
+        slope = (rMax - rMin) * frac * (1 - frac)
+        logX = numpy.log(numpy.where(frac > 0, xx, 1.0))
+        dC50 = numpy.where(c50Fixed, 0.0, -slope * n / c50)
+        dN = numpy.where(nFixed, 0.0,
+                         numpy.where(frac > 0, slope * (logX - numpy.log(c50)),
+                                     0.0))
+        return [dC50, dN, 1 - frac, frac]
+
     @staticmethod
     def _inverse(yy, c50, n, rMin, rMax):
         yScaled = (yy - rMin) / (rMax - rMin)  # remove baseline and scale
@@ -4733,6 +4999,14 @@ class FitLogistic(_baseFunctionFit):
         xx = PSE - numpy.log((1 - _chance) / (yy - _chance) - 1) / JND
         return xx
 
+    @staticmethod
+    def _jacobian(xx, PSE, JND):
+        global _chance
+        xx = numpy.asarray(xx)
+        frac = 1 / (1 + numpy.exp((PSE - xx) * JND))
+        slope = (1 - _chance) * frac * (1 - frac)
+        return [-slope * JND, -slope * (PSE - xx)]
+
 
 class FitCumNormal(_baseFunctionFit):
     """Fit a Cumulative Normal function (aka error function or erf)
@@ -4778,16 +5052,180 @@ class FitCumNormal(_baseFunctionFit):
               special.erfinv(((yy - _chance) / (1 - _chance) - 0.5) * 2))
         return xx
 
+    @staticmethod
+    def _jacobian(xx, xShift, sd):
+        global _chance
+        xx = numpy.asarray(xx)
+        z = (xx - xShift) / sd
+        slope = ((1 - _chance) * numpy.exp(-z**2 / 2) /
+                 (numpy.sqrt(2 * numpy.pi) * sd))
+        return [-slope, -slope * z]
+
 ######################### End psychopy.data classes #########################
 
 
-def bootStraps(dat, n=1):
-    """Create a list of n bootstrapped resamples of the data
+def _fitBatchJacobian(fitClass, xx, params):
+    """The derivatives of the model for each row of params with respect to
+    each parameter, with shape (datasets, points, parameters)
+    """
+    columns = list(params.T[:, :, None])
+    if fitClass._jacobian is not None:
+        derivs = fitClass._jacobian(xx, *columns)
+    else:
+        # forward differences, for fit classes without a _jacobian
+        yy = fitClass._eval(xx, *columns)
+        derivs = []
+        for paramN, col in enumerate(columns):
+            step = 1.49012e-8 * numpy.maximum(numpy.abs(col), 1.0)
+            moved = list(columns)
+            moved[paramN] = col + step
+            derivs.append((fitClass._eval(xx, *moved) - yy) / step)
+    jac = numpy.empty(xx.shape + (len(columns),))
+    for paramN, deriv in enumerate(derivs):
+        jac[:, :, paramN] = deriv
+    return jac
+
+
+def _fitBatchLM(fitClass, xx, yy, sems, start, maxIter=None,
+                tol=1.49012e-8):
+    """Levenberg-Marquardt least-squares fits of the model to each row of
+    yy at once, from the matching row of start. Returns the params and the
+    (weighted) sum of squared residuals of each fit
+    """
+    def getResiduals(rows, params):
+        resid = (fitClass._eval(xx[rows], *params.T[:, :, None]) -
+                 yy[rows]) / sems[rows]
+        return resid, (resid**2).sum(axis=1)
+
+    params = numpy.array(start, dtype=float)
+    nSets, nParams = params.shape
+    if maxIter is None:
+        maxIter = 200 * (nParams + 1)
+    allRows = numpy.arange(nSets)
+    # steps that overflow or leave the model undefined are just rejected
+    with numpy.errstate(all='ignore'):
+        resid, cost = getResiduals(allRows, params)
+        damping = numpy.ones(nSets) * 1e-3
+        active = numpy.isfinite(cost)
+        for iteration in range(maxIter):
+            rows = allRows[active]
+            if not len(rows):
+                break
+            jac = _fitBatchJacobian(fitClass, xx[rows], params[rows]) / \
+                sems[rows][:, :, None]
+            jtj = numpy.einsum('ijk,ijl->ikl', jac, jac)
+            grad = numpy.einsum('ijk,ij->ik', jac, resid[rows])
+            diag = jtj.diagonal(axis1=1, axis2=2)
+            usable = numpy.isfinite(jtj).all(axis=(1, 2)) & \
+                numpy.isfinite(grad).all(axis=1)
+            diag = numpy.where(usable[:, None], diag, 1.0)
+            # Marquardt's scaling, with a floor for params that don't
+            # change the model
+            floor = 1e-12 * diag.max(axis=1)[:, None] + 1e-300
+            diag = numpy.maximum(diag, floor)
+            jtj[~usable] = 0
+            grad[~usable] = 0
+            damped = jtj + (damping[rows, None] * diag)[:, :, None] * \
+                numpy.eye(nParams)
+            step = -numpy.linalg.solve(damped, grad[:, :, None])[:, :, 0]
+            newParams = params[rows] + step
+            newResid, newCost = getResiduals(rows, newParams)
+            better = (newCost < cost[rows]) & usable
+            accepted = rows[better]
+            done = better & (
+                (cost[rows] - newCost <= tol * cost[rows]) |
+                (numpy.sqrt((step**2).sum(axis=1)) <=
+                 tol * (numpy.sqrt((newParams**2).sum(axis=1)) + tol)))
+            params[accepted] = newParams[better]
+            resid[accepted] = newResid[better]
+            cost[accepted] = newCost[better]
+            damping[rows] = numpy.where(better, damping[rows] / 10,
+                                        damping[rows] * 10)
+            # stop when converged, or when no step reduces the error
+            done |= ~usable | (damping[rows] > 1e16)
+            active[rows[done]] = False
+    return params, cost
+
+
+def _fitBatchChunk(args):
+    """Fit some of the datasets for fitBatch (module level so that it can
+    be sent to worker processes)
+    """
+    fitClass, xx, yy, sems, start, guess, expectedMin = args
+    global _chance
+    _chance = expectedMin
+    params, cost = _fitBatchLM(fitClass, xx, yy, sems, start)
+    failed = ~numpy.isfinite(cost)
+    if failed.any() and not (start[failed] == guess).all():
+        # try again from the original guess rather than the pooled fit
+        retried, retriedCost = _fitBatchLM(
+            fitClass, xx[failed], yy[failed], sems[failed],
+            numpy.repeat(guess, failed.sum(), axis=0))
+        params[failed] = retried
+        cost[failed] = retriedCost
+        failed = ~numpy.isfinite(cost)
+    params[failed] = numpy.nan
+
+    # the covariance as given by curve_fit: inv(J'J) scaled by the
+    # residual variance
+    nSets, nPoints = yy.shape
+    nParams = params.shape[1]
+    covars = numpy.empty((nSets, nParams, nParams))
+    covars.fill(numpy.inf)
+    if nPoints > nParams:
+        jac = _fitBatchJacobian(fitClass, xx, params) / sems[:, :, None]
+        jtj = numpy.einsum('ijk,ijl->ikl', jac, jac)
+        usable = numpy.isfinite(jtj).all(axis=(1, 2))
+        try:
+            covars[usable] = numpy.linalg.inv(jtj[usable])
+        except numpy.linalg.LinAlgError:
+            # one or more are singular so go through them one at a time
+            for setN in numpy.flatnonzero(usable):
+                try:
+                    covars[setN] = numpy.linalg.inv(jtj[setN])
+                except numpy.linalg.LinAlgError:
+                    usable[setN] = False
+        covars[usable] *= (cost[usable] /
+                           (nPoints - nParams))[:, None, None]
+    covars[failed] = numpy.nan
+    return params, covars
+
+
+def _bootStrapRandom(seed):
+    """The random number source for a (possibly None) seed
+    """
+    if seed is None:
+        return numpy.random
+    return numpy.random.RandomState(seed)
+
+
+def _bootStrapGather(dat, rand, n):
+    """Resample each row of the 2D array `dat` n times, drawing the indices
+    from `rand`. Returns an array of shape (conditions, n, trials)
+    """
+    nConds, nTrials = dat.shape
+    indices = (nTrials * rand.random_sample((nConds, n, nTrials))).astype('i')
+    return dat[numpy.arange(nConds)[:, None, None], indices]
 
-    SLOW IMPLEMENTATION (Python for-loop)
+
+def bootStrapIndices(nTrials, n=1, seed=None):
+    """Draw the trial indices for n bootstrapped resamples in one call
 
     Usage:
-        ``out = bootStraps(dat, n=1)``
+        ``indices = bootStrapIndices(nTrials, n=1000, seed=None)``
+
+    Returns an int array of shape (n, nTrials) so that ``dat[indices]``
+    gives all n resamples of a 1D array of data.
+    """
+    rand = _bootStrapRandom(seed)
+    return (nTrials * rand.random_sample((n, nTrials))).astype('i')
+
+
+def bootStraps(dat, n=1, seed=None):
+    """Create a list of n bootstrapped resamples of the data
+
+    Usage:
+        ``out = bootStraps(dat, n=1, seed=None)``
 
     Where:
         dat
@@ -4795,28 +5233,102 @@ def bootStraps(dat, n=1):
             column is a different trial)
         n
             number of bootstrapped resamples to create
+        seed
+            seed for the resampling. If None the global numpy random state
+            is used, which gives the same resamples (for a given
+            numpy.random.seed) as earlier versions of PsychoPy
 
         out
             - dim[0]=conditions
             - dim[1]=trials
             - dim[2]=resamples
+
+    To compute a statistic over many resamples without holding all of
+    them in memory use :func:`bootStrapStatistic` instead.
     """
     dat = numpy.asarray(dat)
     if len(dat.shape) == 1:
         # have presumably been given a series of data for one stimulus
         # adds a dimension (arraynow has shape (1,Ntrials))
         dat = numpy.array([dat])
+    resamples = _bootStrapGather(dat, _bootStrapRandom(seed), n)
+    return resamples.transpose(0, 2, 1)
+
+
+def _bootStrapChunk(args):
+    """Compute the statistic for one chunk of resamples (module level so
+    that it can be sent to worker processes)
+    """
+    dat, statistic, n, seed = args
+    resamples = _bootStrapGather(dat, numpy.random.RandomState(seed), n)
+    nConds, nTrials = dat.shape
+    stats = statistic(resamples.reshape([nConds * n, nTrials]))
+    return numpy.reshape(stats, [nConds, n])
+
 
-    nTrials = dat.shape[1]
-    # initialise a matrix to store output
-    resamples = numpy.zeros(dat.shape + (n,), dat.dtype)
-    rand = numpy.random.rand
-    for stimulusN in range(dat.shape[0]):
-        thisStim = dat[stimulusN, :]  # fetch data for this stimulus
-        for sampleN in range(n):
-            indices = numpy.floor(nTrials * rand(nTrials)).astype('i')
-            resamples[stimulusN, :, sampleN] = numpy.take(thisStim, indices)
-    return resamples
+def _bootStrapMean(resamples):
+    return resamples.mean(axis=1)
+
+
+def bootStrapStatistic(dat, statistic=None, n=1000, seed=None,
+                       chunkSize=1000, nProcesses=1):
+    """Compute a statistic over n bootstrapped resamples of the data
+    without creating all of the resamples at once
+
+    Usage:
+        ``stats = bootStrapStatistic(dat, statistic=None, n=1000)``
+
+    Where:
+        dat
+            an NxM or 1xN array (each row is a different condition, each
+            column is a different trial)
+        statistic
+            a function taking a (resamples x trials) array and returning
+            one value per resample, e.g.
+            ``lambda x: numpy.median(x, axis=1)``. Default is the mean.
+            Must be a module-level function if nProcesses > 1
+        n
+            number of bootstrapped resamples
+        seed
+            the resamples are drawn in chunks of `chunkSize`, each seeded
+            from this value, so a given seed and chunkSize give the same
+            result whatever the number of processes. If None a seed is
+            taken from the global numpy random state
+        nProcesses
+            number of worker processes to spread the chunks across
+
+        stats
+            an array of shape (conditions, n), or (n,) for 1D data
+
+    e.g. a 95% confidence interval of the mean is given by
+    ``numpy.percentile(bootStrapStatistic(dat, n=5000), [2.5, 97.5])``
+    """
+    dat = numpy.asarray(dat)
+    oneD = len(dat.shape) == 1
+    if oneD:
+        dat = numpy.array([dat])
+    if statistic is None:
+        statistic = _bootStrapMean
+    chunkSize = max(1, int(chunkSize))
+    # one seed per chunk, fixed before any work is handed out
+    seeds = _bootStrapRandom(seed).randint(0, 2**31 - 1,
+                                           size=-(-n // chunkSize))
+    jobs = [(dat, statistic, min(chunkSize, n - i * chunkSize), chunkSeed)
+            for i, chunkSeed in enumerate(seeds)]
+    if nProcesses > 1 and len(jobs) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(nProcesses, len(jobs)))
+        try:
+            chunks = pool.map(_bootStrapChunk, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        chunks = [_bootStrapChunk(job) for job in jobs]
+    stats = numpy.concatenate(chunks, axis=1)
+    if oneD:
+        return stats[0]
+    return stats
 
 
 def functionFromStaircase(intensities, responses, bins=10):
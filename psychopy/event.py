@@ -138,6 +138,10 @@ def _onPygletKey(symbol, modifiers, emulated=False):
         keySource = 'Keypress'
     _keyBuffer.append((thisKey, modifiers, keyTime))  # tuple
     logging.data("%s: %s" % (keySource, thisKey))
+    if emulated:
+        # emulated keys may come from another thread, e.g. a SyncGenerator,
+        # while waitKeys() is blocked waiting for window events
+        psychopy.clock.wake()
 
 
 def _onPygletMousePress(x, y, button, modifiers, emulated=False):
@@ -345,6 +349,23 @@ def getKeys(keyList=None, modifiers=False, timeStamped=False):
         return relTuple
 
 
+# the longest waitKeys() blocks before checking the windows again
+_maxWaitKeysBlock = 0.05
+
+
+def _windowEventFds():
+    """The file descriptors that have data when the open windows have
+    events to dispatch, or None if some window can't be waited on that way
+    (e.g. pygame windows, or pyglet windows on Windows and OS X)
+    """
+    if havePygame and display.get_init():
+        return None
+    if not havePyglet:
+        return []
+    defDisplay = pyglet.window.get_platform().get_default_display()
+    return psychopy.clock._pygletDisplayFds(defDisplay.get_windows())
+
+
 def waitKeys(maxWait=float('inf'), keyList=None, modifiers=False, timeStamped=False):
     """Same as `~psychopy.event.getKeys`, but halts everything
     (including drawing) while awaiting input from keyboard. Implicitly
@@ -363,24 +384,32 @@ def waitKeys(maxWait=float('inf'), keyList=None, modifiers=False, timeStamped=Fa
     Returns None if times out.
     """
 
-    # NB pygame.event does have a wait() function that will
-    # do this and maybe leave more cpu idle time?
-    key = None
     clearEvents('keyboard')  # So that we only take presses from here onwards.
 
-    # Check for keypresses until maxWait is exceeded
+    # Check for keypresses until maxWait is exceeded, blocking in between
+    # until a window has events to dispatch (or a key is emulated)
     timer = psychopy.core.Clock()
-    while key is None and timer.getTime() < maxWait:
-        # Pump events on pyglet windows if they exist
-        if havePyglet:
-            defDisplay = pyglet.window.get_platform().get_default_display()
-            for win in defDisplay.get_windows():
-                win.dispatch_events()
-
-        # Get keypresses and return if anything is pressed
+    while timer.getTime() < maxWait:
+        # Get keypresses (pumping pyglet window events) and return if
+        # anything is pressed
         keys = getKeys(keyList=keyList, modifiers=modifiers, timeStamped=timeStamped)
         if len(keys):
             return keys
+        remaining = maxWait - timer.getTime()
+        fds = _windowEventFds()
+        if fds is None:
+            if sys.platform == 'win32':
+                # a 1 ms sleep can last a whole timer tick (about 15.6 ms)
+                # on Windows, which would quantise the key times, so keep
+                # spinning there
+                continue
+            # these windows can't be waited on, so poll them each ms
+            timeout = 0.001
+        else:
+            # wake regularly anyway, in case events were queued by the
+            # windowing library without more data arriving on its connection
+            timeout = _maxWaitKeysBlock
+        psychopy.clock.waitForEvents(min(remaining, timeout), fds or ())
 
     # If maxWait is exceeded (exits while-loop), return None
     logging.data("No keypress (maxWait exceeded)")
@@ -13,6 +13,7 @@ pyxid package instead (bundled with Standalone PsychoPy)::
 # Distributed under the terms of the GNU General Public License (GPL).
 
 from psychopy import core, logging
+from psychopy.hardware.serialdevice import SerialReader, FrameParser
 import struct
 import sys
 
@@ -22,6 +23,35 @@ except ImportError:
     serial = False
 
 
+class XidParser(FrameParser):
+    """Splits the bytes received from a Cedrus box in XID mode into the
+    6-byte key event packets ("k"<info><rt>) and any other bytes (e.g.
+    replies to commands) in between, keeping a partly received packet for
+    the next call.
+    """
+
+    def feed(self, data, t):
+        buf = self.buffer + data
+        nBytes = len(buf)
+        frames = []
+        pos = 0
+        while pos < nBytes:
+            start = buf.find('k', pos)
+            if start < 0:
+                frames.append((t, buf[pos:]))
+                pos = nBytes
+            else:
+                if start > pos:
+                    frames.append((t, buf[pos:start]))
+                pos = start
+                if nBytes - start < 6:
+                    break  # wait for the rest of the packet
+                frames.append((t, buf[start:start + 6]))
+                pos = start + 6
+        self.buffer = buf[pos:]
+        return frames
+
+
 class RB730(object):
     """Class to control/read a Cedrus RB-series response box
     """
@@ -29,11 +59,12 @@ class RB730(object):
         """Info about a keypress from Cedrus keypad XID string
         """
 
-        def __init__(self, XID):
+        def __init__(self, XID, time=None):
             """XID should contain a "k"<info><rt> where info is a byte
-            and rt is 4 bytes (=int)
+            and rt is 4 bytes (=int). time is when it was received.
             """
-            super(KeyEvent, self).__init__()
+            super(RB730.KeyEvent, self).__init__()
+            self.time = time
             if len(XID) != 6:
                 # log.error("The XID string %s is %i bytes long and should
                 #   be 6 bytes" %(str([XID]),len(XID)))
@@ -54,7 +85,12 @@ class RB730(object):
                 # what was RT?
                 self.rt = struct.unpack('i', XID[2:])[0]  # integer in ms
 
-    def __init__(self, port, baudrate=115200, mode='XID'):
+    def __init__(self, port, baudrate=115200, mode='XID',
+                 backgroundReader=True):
+        """If backgroundReader is True the port is read on a background
+        thread, so key events are time-stamped (as keyEvt.time) when they
+        arrive rather than when getKeyEvents() is called.
+        """
         super(RB730, self).__init__()
 
         if not serial:
@@ -78,8 +114,12 @@ class RB730(object):
                                   timeout=0.0001)
         if not self.port.isOpen():
             self.port.open()
-        # self.buffer = ''  # our own buffer (in addition to the serial port
-        # buffer)
+        self._parser = XidParser()
+        self._reader = None
+        self._chunks = None
+        if backgroundReader:
+            self._reader = SerialReader.forPort(self.port)
+            self._chunks = self._reader.addBuffer()
         self.clearBuffer()
 
     def sendMessage(self, message):
@@ -95,6 +135,19 @@ class RB730(object):
         any keypresses that haven't yet been handled.
         """
         self.port.flushInput()
+        if self._chunks is not None:
+            self._chunks.clear()
+        self._parser.reset()
+
+    def _readFrames(self):
+        """The XID packets and other messages received since the last call
+        """
+        if self._chunks is not None:
+            return self._parser.parseChunks(self._chunks)
+        inputStr = self.port.read(self.port.inWaiting())
+        if not inputStr:
+            return []
+        return self._parser.feed(inputStr, core.getTime())
 
     def getKeyEvents(self, allowedKeys=(1, 2, 3, 4, 5, 6, 7), downOnly=True):
         """Return a list of keyEvents
@@ -106,30 +159,22 @@ class RB730(object):
             keyEvt.direction is the direction the button was going
             ('up' or 'down')
 
+            keyEvt.time is when the key event was received (by the
+            background reader, if used)
+
         allowedKeys will limit the set of keys that are returned
         (WARNING: info about other keys is discarded)
         downOnly limits the function to report only the downward
         stroke of the key
+
+        A key event that has only partly been received is returned by a
+        later call, once complete. Other messages are discarded.
         """
-        # get the raw string
-        nToGet = self.port.inWaiting()
-        # self.buffer += self.port.read(nToGet)  # extend our own buffer (then
-        # remove the bits we use)
-        # extend our own buffer (then remove the bits we use)
-        inputStr = self.port.read(nToGet)
         keys = []
-
-        # loop through messages for keys
-        nKeys = inputStr.count('k')  # find the "k"s
-        for keyN in range(nKeys):
-            start = inputStr.find('k')  # find the next key
-            stop = start + 6
-            # check we have that many characters(in case we read the buffer
-            # partway through output)
-            if len(inputStr) < stop:
-                inputStr += self.port.read(stop - len(inputStr))
-            keyString = inputStr[start:stop]
-            keyEvt = self.KeyEvent(XID=keyString)
+        for t, frame in self._readFrames():
+            if len(frame) != 6 or frame[0] != 'k':
+                continue  # not a key event
+            keyEvt = self.KeyEvent(XID=frame, time=t)
             if keyEvt.key not in allowedKeys:
                 continue  # ignore this keyEvt and move on
             if (downOnly == True and keyEvt.direction == 'up'):
@@ -137,8 +182,6 @@ class RB730(object):
 
             # we found a valid keyEvt
             keys.append(keyEvt)
-            # remove the (1st occurence of) string from the buffer
-            inputStr = inputStr.replace(keyString, '', 1)
 
         return keys
 
@@ -146,8 +189,15 @@ class RB730(object):
         """Read and return an unformatted string from the device
         (and delete this from the buffer)
         """
-        nToGet = self.port.inWaiting()
-        return self.port.read(nToGet)
+        # including any partly received key event
+        msg = self._parser.buffer
+        self._parser.reset()
+        if self._chunks is None:
+            nToGet = self.port.inWaiting()
+            return msg + self.port.read(nToGet)
+        while self._chunks:
+            msg += self._chunks.popleft()[1]
+        return msg
 
     def measureRoundTrip(self):
         # round trip
@@ -175,8 +225,19 @@ class RB730(object):
                 allowedKeys=allowedKeys, downOnly=downOnly)
             if len(keys) > 0:
                 noKeyYet = False
+            elif self._chunks is not None:
+                # the keys are time-stamped by the reader thread
+                core.wait(0.001, hogCPUperiod=0)
         return keys
 
+    def close(self):
+        """Stop the background reader (if any) and close the port
+        """
+        if self._chunks is not None:
+            self._reader.removeBuffer(self._chunks)
+            self._chunks = None
+        self.port.close()
+
     def resetTrialTimer(self):
         self.sendMessage('e5')
 
@@ -13,7 +13,8 @@ E.g., use a Keyboard component, and typically listen for Allowed keys
 
 # Jeremy Gray and Dan Grupe developed the asKeys and baud parameters
 
-from psychopy import logging, event
+from psychopy import logging, event, core
+from psychopy.hardware.serialdevice import SerialReader, FrameParser
 import sys
 from collections import defaultdict
 
@@ -36,6 +37,15 @@ BUTTON_MAP = [
     (0x10, BUTTON_TRIGGER)]
 
 
+class ButtonCodeParser(FrameParser):
+    """Each byte the fORP sends is a frame: a code with a bit set for every
+    button currently pressed
+    """
+
+    def feed(self, data, t):
+        return [(t, ord(thisChr)) for thisChr in data]
+
+
 class ButtonBox(object):
     """Serial line interface to the fORP MRI response box.
 
@@ -46,18 +56,22 @@ class ButtonBox(object):
     cable and use fORP to emulate a keyboard.
 
     fORP sends characters at 800Hz, so you should check the buffer
-    frequently. Also note that the trigger event numpy the fORP is
-    typically extremely short (occurs for a single 800Hz epoch).
+    frequently (or use the background reader). Also note that the trigger
+    event numpy the fORP is typically extremely short (occurs for a single
+    800Hz epoch).
     """
 
-    def __init__(self, serialPort=1, baudrate=19200):
+    def __init__(self, serialPort=1, baudrate=19200, backgroundReader=True):
         """
         :Parameters:
 
             `serialPort` :
-                should be a number (where 1=COM1, ...)
+                should be a number (where 1=COM1, ...), or a port name
             `baud` :
                 the communication rate (baud), eg, 57600
+            `backgroundReader` :
+                read the port on a background thread, so that events are
+                time-stamped when they arrive (see `rawEvtTimes`)
         """
         super(ButtonBox, self).__init__()
         if not serial:
@@ -65,7 +79,11 @@ class ButtonBox(object):
                               "fORP. On most systems this can be installed "
                               "with\n\t easy_install pyserial")
 
-        self.port = serial.Serial(serialPort - 1, baudrate=baudrate,
+        if isinstance(serialPort, basestring):
+            portName = serialPort
+        else:
+            portName = serialPort - 1
+        self.port = serial.Serial(portName, baudrate=baudrate,
                                   bytesize=8, parity='N', stopbits=1,
                                   timeout=0.001)
         if not self.port.isOpen():
@@ -73,11 +91,27 @@ class ButtonBox(object):
 
         self.buttonStatus = defaultdict(bool)  # Defaults to False
         self.rawEvts = []
+        self.rawEvtTimes = []
         self.pressEvents = []
+        self._parser = ButtonCodeParser()
+        self._reader = None
+        self._chunks = None
+        if backgroundReader:
+            self._reader = SerialReader.forPort(self.port)
+            self._chunks = self._reader.addBuffer()
 
     def clearBuffer(self):
         """Empty the input buffer of all characters"""
         self.port.flushInput()
+        if self._chunks is not None:
+            self._chunks.clear()
+
+    def close(self):
+        """Stop the background reader (if any) and close the port"""
+        if self._chunks is not None:
+            self._reader.removeBuffer(self._chunks)
+            self._chunks = None
+        self.port.close()
 
     def clearStatus(self):
         """ Resets the pressed statuses, so getEvents will return pressed
@@ -89,7 +123,8 @@ class ButtonBox(object):
     def getEvents(self, returnRaw=False, asKeys=False, allowRepeats=False):
         """Returns a list of unique events (one event per button pressed)
         and also stores a copy of the full list of events since last
-        getEvents() (stored as ForpBox.rawEvts)
+        getEvents() (stored as ForpBox.rawEvts, with the times they were
+        received in ForpBox.rawEvtTimes)
 
         `returnRaw` :
             return (not just store) the full event list
@@ -109,17 +144,21 @@ class ButtonBox(object):
             This option might be useful if you think your participant may be
             holding the button down before you start checking for presses.
         """
-        nToGet = self.port.inWaiting()
-        evtStr = self.port.read(nToGet)
+        if self._chunks is not None:
+            codes = self._parser.parseChunks(self._chunks)
+        else:
+            nToGet = self.port.inWaiting()
+            codes = self._parser.feed(self.port.read(nToGet), core.getTime())
         self.rawEvts = []
+        self.rawEvtTimes = []
         self.pressEvents = []
         if allowRepeats:
             self.clearStatus()
-        # for each character convert to an ordinal int value (numpy the ascii
-        # chr)
-        for thisChr in evtStr:
-            pressCode = ord(thisChr)
+        # each character has been converted to an ordinal int value (numpy
+        # the ascii chr)
+        for t, pressCode in codes:
             self.rawEvts.append(pressCode)
+            self.rawEvtTimes.append(t)
             decodedEvents = self._generateEvents(pressCode)
             self.pressEvents += decodedEvents
             if asKeys:
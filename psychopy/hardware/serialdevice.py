@@ -1,5 +1,6 @@
 """Base class for serial devices. Includes some convenience methods to open
-ports and check for the expected device
+ports and check for the expected device, and a background reader and
+incremental parsers for the bytes received
 """
 # Part of the PsychoPy library
 # Copyright (C) 2015 Jonathan Peirce
@@ -7,14 +8,153 @@ ports and check for the expected device
 
 import sys
 import time
+import threading
+from collections import deque
 
-from psychopy import logging
+from psychopy import logging, core
 try:
     import serial
 except ImportError:
     serial = False
 
 
+class SerialReader(object):
+    """Reads a serial port on a background thread, so that bytes are
+    time-stamped when they arrive rather than when the port is next polled.
+
+    There is one reader per port, shared by everything reading that port
+    (see :meth:`forPort`). Each reading object gets its own ring buffer
+    from :meth:`addBuffer`: a bounded deque of (time, bytes) chunks that the
+    reader thread appends to and the polling thread pops from, without
+    locking. Pass the buffer to :meth:`FrameParser.parseChunks` to decode
+    the chunks received since the last poll.
+    """
+    _readers = {}
+    _readersLock = threading.Lock()
+
+    def __init__(self, com, timeout=0.05):
+        self.com = com
+        self.timeout = timeout  # the longest the thread blocks in read()
+        self.buffers = []
+        self.running = False
+        self._thread = None
+
+    @classmethod
+    def forPort(cls, com):
+        """Return the reader for the (open) serial.Serial port `com`
+        """
+        with cls._readersLock:
+            reader = cls._readers.get(com)
+            if reader is None:
+                reader = cls._readers[com] = cls(com)
+            return reader
+
+    def addBuffer(self, maxChunks=4096):
+        """Return a new ring buffer that every chunk received from now on
+        will be added to (as a (time, bytes) tuple), starting the reader
+        thread if needed. The oldest chunks are dropped from a full buffer.
+        """
+        chunks = deque(maxlen=maxChunks)
+        # replaced rather than changed in place, for the reader thread
+        self.buffers = self.buffers + [chunks]
+        self.start()
+        return chunks
+
+    def removeBuffer(self, chunks):
+        """Stop adding chunks to the given buffer, stopping the reader
+        thread if no buffers are left
+        """
+        self.buffers = [b for b in self.buffers if b is not chunks]
+        if not self.buffers:
+            self.stop()
+
+    def start(self):
+        if self.running:
+            return
+        self.com.timeout = self.timeout
+        self.running = True
+        self._thread = threading.Thread(target=self._run,
+                                        name='SerialReader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if (self._thread is not None and
+                self._thread is not threading.current_thread()):
+            self._thread.join()
+        self._thread = None
+        with self._readersLock:
+            if self._readers.get(self.com) is self:
+                del self._readers[self.com]
+
+    def _run(self):
+        com = self.com
+        while self.running:
+            try:
+                # block for the first byte, then take all that are waiting
+                data = com.read(max(1, com.inWaiting()))
+            except Exception:
+                if self.running:
+                    logging.error('Stopped reading from serial port %s' %
+                                  com.port)
+                break
+            if data:
+                chunk = (core.getTime(), data)
+                for chunks in self.buffers:
+                    chunks.append(chunk)
+        self.running = False
+
+
+class FrameParser(object):
+    """Base class for incremental parsers of the bytes received from a
+    serial device. Sub-classes implement :meth:`feed` for a protocol.
+
+    Bytes that don't yet make a complete frame are kept in self.buffer for
+    the next call, so frames split across reads are decoded once complete,
+    and each call only parses the bytes received since the last one.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+
+    def reset(self):
+        """Discard any partly received frame
+        """
+        self.buffer = ''
+
+    def feed(self, data, t):
+        """Add the bytes `data`, received at time `t`, and return a list
+        of (t, frame) tuples for each frame completed
+        """
+        raise NotImplementedError
+
+    def parseChunks(self, chunks):
+        """Feed all the (time, bytes) chunks waiting in the deque `chunks`
+        (a :class:`SerialReader` buffer) and return the completed frames
+        """
+        frames = []
+        while chunks:
+            t, data = chunks.popleft()
+            frames.extend(self.feed(data, t))
+        return frames
+
+
+class LineParser(FrameParser):
+    """Splits the received bytes into lines ending in `eol` (which is
+    kept, as with serial.Serial.readline())
+    """
+
+    def __init__(self, eol="\n"):
+        super(LineParser, self).__init__()
+        self.eol = eol
+
+    def feed(self, data, t):
+        lines = (self.buffer + data).split(self.eol)
+        self.buffer = lines.pop()
+        return [(t, line + self.eol) for line in lines]
+
+
 class SerialDevice(object):
     """A base class for serial devices, to be sub-classed by specific devices
 
@@ -54,6 +194,10 @@ class SerialDevice(object):
         self.maxAttempts = maxAttempts
         self.eol = eol
         self.type = self.name  # for backwards compatibility
+        self._reader = None
+        self._parser = None
+        self._chunks = None
+        self._frames = []  # received frames not yet returned
 
         # try to open the port
         for portString in ports:
@@ -139,11 +283,50 @@ class SerialDevice(object):
         """
         time.sleep(self.pauseDuration)
 
+    def startReader(self, parser=None):
+        """Read the port on a background thread from now on, so replies are
+        time-stamped as they arrive and already split into frames when
+        :meth:`getResponse` or :meth:`getFrames` is called.
+
+        `parser` is a :class:`FrameParser` for the device's protocol; by
+        default replies are split into lines ending in self.eol.
+        """
+        if self._chunks is not None:
+            self.stopReader()
+        self._parser = parser or LineParser(self.eol)
+        self._reader = SerialReader.forPort(self.com)
+        self._chunks = self._reader.addBuffer()
+
+    def stopReader(self):
+        """Stop reading the port on a background thread
+        """
+        if self._chunks is not None:
+            self._reader.removeBuffer(self._chunks)
+            self._reader = None
+            self._chunks = None
+            self._parser = None
+            self._frames = []
+
+    def getFrames(self):
+        """Return the (time, frame) tuples received by the background
+        reader (see :meth:`startReader`) since the last call
+        """
+        frames = self._frames + self._parser.parseChunks(self._chunks)
+        self._frames = []
+        return frames
+
     def sendMessage(self, message, autoLog=True):
         """Send a command to the device (does not wait for a reply or sleep())
         """
-        if self.com.inWaiting():
+        if self._chunks is not None:
+            inStr = ''.join(frame for t, frame in self.getFrames())
+            inStr += self._parser.buffer
+            self._parser.reset()
+        elif self.com.inWaiting():
             inStr = self.com.read(self.com.inWaiting())
+        else:
+            inStr = ''
+        if inStr:
             msg = "Sending '%s' to %s but found '%s' on the input buffer"
             logging.warning(msg % (message, self.name, inStr))
         if not message.endswith(self.eol):
@@ -166,7 +349,12 @@ class SerialDevice(object):
            2: a multiline reply (use readlines() which *requires* timeout)
            -1: may not be any EOL character; just read whatever chars are
                 there
+
+        If a background reader was started (see :meth:`startReader`) the
+        replies are taken from the frames it has received.
         """
+        if self._chunks is not None:
+            return self._getReaderResponse(length, timeout)
         # get reply (within timeout limit)
         self.com.timeout = timeout
         if length == 1:
@@ -174,9 +362,35 @@ class SerialDevice(object):
         elif length > 1:
             retVal = self.com.readlines()
         else:  # was -1?
-            retVal = self.com.read(self.com.inWaiting)
+            retVal = self.com.read(self.com.inWaiting())
         return retVal
 
+    def _getReaderResponse(self, length, timeout):
+        deadline = core.getTime() + timeout
+        frames = self.getFrames()
+        if length == 1:
+            while not frames and core.getTime() < deadline:
+                time.sleep(0.001)
+                frames = self.getFrames()
+            if not frames:
+                # like readline(), return what arrived before the timeout
+                retVal = self._parser.buffer
+                self._parser.reset()
+                return retVal
+            # keep the rest for the next call
+            self._frames = frames[1:]
+            return frames[0][1]
+        elif length > 1:
+            # like readlines(), wait for the whole timeout
+            while core.getTime() < deadline:
+                time.sleep(0.001)
+            return [f for t, f in frames + self.getFrames()]
+        else:
+            retVal = ''.join(f for t, f in frames) + self._parser.buffer
+            self._parser.reset()
+            return retVal
+
     def __del__(self):
+        self.stopReader()
         if self.com is not None:
             self.com.close()
@@ -29,10 +29,11 @@ import hashlib
 import wx
 import locale
 import subprocess
+import threading
+import json
 import psutil
 
-from psychopy import visual, logging, core, data, web
-from psychopy.core import shellCall
+from psychopy import visual, logging, core, data, web, prefs
 from psychopy.platform_specific import rush
 from psychopy import __version__ as psychopyVersion
 
@@ -55,7 +56,7 @@ class RunTimeInfo(dict):
 
     def __init__(self, author=None, version=None, win=None,
                  refreshTest='grating', userProcsDetailed=False,
-                 verbose=False):
+                 verbose=False, probeTimeout=5.0, cacheProbes=True):
         """
         :Parameters:
 
@@ -85,6 +86,17 @@ class RunTimeInfo(dict):
                 get details about concurrent user's processses
                 (command, process-ID)
 
+            probeTimeout : *5.0*
+                seconds to wait for each of the system commands that are
+                queried (e.g. `ps`, `openssl version`); they run
+                concurrently
+
+            cacheProbes : *True*, False
+                re-use the saved output of the system commands that only
+                change when the computer is restarted or the program is
+                updated (e.g. `R --version`). The output is saved in the
+                user prefs folder, as runtimeInfoProbes.json
+
         :Returns:
             a flat dict (but with several groups based on key names):
 
@@ -97,8 +109,9 @@ class RunTimeInfo(dict):
                 experimentAuthor, experimentVersion, ...
 
             system : hostname, platform, user login, count of users,
-                user process info (count, cmd + pid), flagged processes
-                systemHostname, systemPlatform, ...
+                user process info (count, cmd + pid), flagged processes,
+                time taken by each system command queried
+                systemHostname, systemPlatform, systemProbe.ps_sec, ...
 
             window : (see output; many details about the refresh rate, window,
                 and monitor; units are noted)
@@ -118,17 +131,28 @@ class RunTimeInfo(dict):
         # a dict
         dict.__init__(self)
 
+        # start all the system commands queried below at once
+        cacheFile = None
+        if cacheProbes:
+            cacheFile = os.path.join(prefs.paths['userPrefsDir'],
+                                     'runtimeInfoProbes.json')
+        self._probes = _ProbeRunner(timeout=probeTimeout,
+                                    cacheFile=cacheFile)
+        d = os.path.abspath(os.path.dirname(__file__))
+        self._startProbes(d)
+
         self['psychopyVersion'] = psychopyVersion
         # NB: this looks weird, but avoids setting high-priority incidentally
         self['psychopyHaveExtRush'] = rush(False)
-        d = os.path.abspath(os.path.dirname(__file__))
-        githash = _getHashGitHead(d)  # should be .../psychopy/psychopy/
+        # should be .../psychopy/psychopy/
+        githash = _getHashGitHead(d, self._probes)
         if githash:
             self['psychopyGitHead'] = githash
 
         self._setExperimentInfo(author, version, verbose)
         self._setSystemInfo()  # current user, locale, other software
         self._setCurrentProcessInfo(verbose, userProcsDetailed)
+        self._setProbeInfo()
 
         # need a window for frame-timing, and some openGL drivers want
         # a window open
@@ -158,6 +182,44 @@ class RunTimeInfo(dict):
         elif win != False:
             win.autoLog = self.winautoLog  # restore
 
+    def _startProbes(self, psychopyDir):
+        """Start the system commands whose output is used by the
+        _set*Info methods
+        """
+        probes = self._probes
+        probes.start('gitHead', ['git', 'rev-parse', '--verify', 'HEAD'],
+                     cwd=psychopyDir)
+        probes.start('gitBranch', ['git', 'branch'], cwd=psychopyDir)
+        if sys.platform == 'win32':
+            probes.start('systeminfo', ['systeminfo'], cache=True)
+            probes.start('tasklist', ['tasklist'])
+            probes.start('flac', ['C:\\Program Files\\FLAC\\flac.exe',
+                                  '--version'], cache=True)
+        else:
+            probes.start('whoUsers', ['who', '-q'])
+            probes.start('whoBoot', ['who', '-b'], cache=True)
+            if os.environ.get('USER'):
+                # ps = process status, -c to avoid full path (potentially
+                # having spaces) & args, -U for user
+                probes.start('ps', ['ps', '-c', '-U', os.environ['USER']])
+            probes.start('flac', ['flac', '--version'], cache=True)
+        probes.start('R', ['R', '--version'], cache=True)
+        probes.start('openssl', ['openssl', 'version'], cache=True)
+        probes.start('gpg', ['gpg', '--version'], cache=True)
+
+    def _setProbeInfo(self):
+        """How long each system command took (0 if its output was cached)
+        """
+        probes = self._probes
+        probes.close()
+        for name, secs in probes.times.items():
+            self['systemProbe.%s_sec' % name] = secs
+        self['systemProbesCached'] = ' '.join(sorted(probes.cached))
+        self['systemProbesMissing'] = ' '.join(sorted(probes.missing))
+        if probes.timedOut:
+            self['systemProbesTimedOut'] = ' '.join(sorted(probes.timedOut))
+        del self._probes
+
     def _setExperimentInfo(self, author, version, verbose):
         """Auto-detect __author__ and __version__ in sys.argv[0] (= the
         # users's script)
@@ -203,7 +265,8 @@ class RunTimeInfo(dict):
         self[key] = _getSha1hexDigest(scriptPath, isfile=True)
         # subversion revision?
         try:
-            svnrev, last, url = _getSvnVersion(scriptPath)  # svn revision
+            # svn revision
+            svnrev, last, url = _getSvnVersion(scriptPath, self._probes)
             if svnrev:  # or verbose:
                 self['experimentScript.svnRevision'] = svnrev
                 self['experimentScript.svnRevLast'] = last
@@ -212,7 +275,7 @@ class RunTimeInfo(dict):
             pass
         # mercurical revision?
         try:
-            hgChangeSet = _getHgVersion(scriptPath)
+            hgChangeSet = _getHgVersion(scriptPath, self._probes)
             if hgChangeSet:  # or verbose:
                 self['experimentScript.hgChangeSet'] = hgChangeSet
         except Exception:
@@ -262,18 +325,22 @@ class RunTimeInfo(dict):
         # count all unique people (user IDs logged in), and find current user
         # name & UID
         self['systemUser'], self['systemUserID'] = _getUserNameUID()
+        probes = self._probes
         try:
-            users = shellCall("who -q").splitlines()[0].split()
+            users = probes.result('whoUsers')[0].splitlines()[0].split()
             self['systemUsersCount'] = len(set(users))
         except Exception:
             self['systemUsersCount'] = False
 
         # when last rebooted?
         try:
-            lastboot = shellCall("who -b").split()
+            lastboot = probes.result('whoBoot')[0].split()
             self['systemRebooted'] = ' '.join(lastboot[2:])
         except Exception:  # windows
-            sysInfo = shellCall('systeminfo').splitlines()
+            try:
+                sysInfo = probes.result('systeminfo')[0].splitlines()
+            except Exception:
+                sysInfo = []
             lastboot = [line for line in sysInfo if line.startswith(
                 "System Up Time") or line.startswith("System Boot Time")]
             lastboot += ['[?]']  # put something in the list just in case
@@ -281,7 +348,7 @@ class RunTimeInfo(dict):
 
         # R (and r2py) for stats:
         try:
-            Rver = shellCall(["R", "--version"])
+            Rver = probes.result('R')[0]
             Rversion = Rver.splitlines()[0]
             if Rversion.startswith('R version'):
                 self['systemRavailable'] = Rversion.strip()
@@ -295,7 +362,7 @@ class RunTimeInfo(dict):
 
         # encryption / security tools:
         try:
-            vers, se = shellCall('openssl version', stderr=True)
+            vers, se = probes.result('openssl')
             if se:
                 vers = str(vers) + se.replace('\n', ' ')[:80]
             if vers.strip():
@@ -303,7 +370,7 @@ class RunTimeInfo(dict):
         except Exception:
             pass
         try:
-            so = shellCall(['gpg', '--version'])
+            so = probes.result('gpg')[0]
             if so.find('GnuPG') > -1:
                 self['systemSec.GPGVersion'] = so.splitlines()[0]
                 _home = [line.replace('Home:', '').lstrip()
@@ -341,17 +408,9 @@ class RunTimeInfo(dict):
             pass
 
         # flac (free lossless audio codec) for google-speech:
-        flacv = ''
-        if sys.platform == 'win32':
-            flacexe = 'C:\\Program Files\\FLAC\\flac.exe'
-            if os.path.exists(flacexe):
-                flacv = core.shellCall(flacexe + ' --version')
-        else:
-            flac, se = core.shellCall('which flac', stderr=True)
-            if not se and flac and not flac.find('Command not found') > -1:
-                flacv = core.shellCall('flac --version')
-        if flacv:
-            self['systemFlacVersion'] = flacv
+        flacv = probes.result('flac')
+        if flacv and flacv[0]:
+            self['systemFlacVersion'] = flacv[0]
 
         # detect internet access or fail quickly:
         # web.setupProxy() & web.testProxy(web.proxies)  # can be slow
@@ -383,13 +442,12 @@ class RunTimeInfo(dict):
 
         # assess concurrently active processes owner by the current user:
         try:
-            # ps = process status, -c to avoid full path (potentially having
-            # spaces) & args, -U for user
+            # (see _startProbes for the commands used)
             if sys.platform not in ['win32']:
-                proc = shellCall("ps -c -U " + os.environ['USER'])
+                proc = self._probes.result('ps')[0]
             else:
                 # "tasklist /m" gives modules as well
-                proc, err = shellCall("tasklist", stderr=True)
+                proc, err = self._probes.result('tasklist')
                 if err:
                     logging.error('tasklist error:', err)
                     # raise
@@ -618,16 +676,18 @@ class RunTimeInfo(dict):
         return info
 
 
-def _getHashGitHead(gdir='.'):
+def _getHashGitHead(gdir='.', probes=None):
     if not os.path.isdir(gdir):
         raise OSError('not a directory')
-    try:
-        git_hash = subprocess.check_output('git rev-parse --verify HEAD',
-                                           cwd=gdir,
-                                           shell=True, stderr=subprocess.PIPE)
-    except subprocess.CalledProcessError:
+    if probes is None:
+        probes = _ProbeRunner()
+    probes.start('gitBranch', ['git', 'branch'], cwd=gdir)
+    git_hash = probes.run('gitHead', ['git', 'rev-parse', '--verify', 'HEAD'],
+                          cwd=gdir)
+    if not git_hash or not git_hash[0]:
         return None  # no git
-    git_branches = subprocess.check_output('git branch', cwd=gdir, shell=True)
+    git_hash = git_hash[0]
+    git_branches = (probes.result('gitBranch') or [''])[0]
     git_branch = [line.split()[1] for line in git_branches.splitlines()
                   if line.startswith('*')]
     if len(git_branch):
@@ -636,7 +696,7 @@ def _getHashGitHead(gdir='.'):
         return '(unknown branch)'
 
 
-def _getSvnVersion(filename):
+def _getSvnVersion(filename, probes=None):
     """Tries to discover the svn version (revision #) for a file.
 
     Not thoroughly tested; untested on Windows Vista, Win 7, FreeBSD
@@ -648,13 +708,13 @@ def _getSvnVersion(filename):
             os.path.isdir(os.path.join(os.path.dirname(filename), '.svn'))):
         return None, None, None
     svnRev, svnLastChangedRev, svnUrl = None, None, None
+    if probes is None:
+        probes = _ProbeRunner()
     if (sys.platform in ('darwin', 'freebsd') or
             sys.platform.startswith('linux')):
-        try:
-            # expects a filename, not dir
-            svninfo = shellCall(['svn', 'info', filename])
-        except Exception:
-            svninfo = ''
+        # expects a filename, not dir
+        svninfo = (probes.run('svnInfo', ['svn', 'info', filename]) or
+                   [''])[0]
         for line in svninfo.splitlines():
             if line.startswith('URL:'):
                 svnUrl = line.split()[1]
@@ -664,10 +724,7 @@ def _getSvnVersion(filename):
                 svnLastChangedRev = line.split()[3]
     else:
         # worked for me on Win XP sp2 with TortoiseSVN (SubWCRev.exe)
-        try:
-            stdout = shellCall(['subwcrev', filename])
-        except Exception:
-            stdout = ''
+        stdout = (probes.run('subwcrev', ['subwcrev', filename]) or [''])[0]
         for line in stdout.splitlines():
             if line.startswith('Last committed at revision'):
                 svnRev = line.split()[4]
@@ -676,7 +733,7 @@ def _getSvnVersion(filename):
     return svnRev, svnLastChangedRev, svnUrl
 
 
-def _getHgVersion(filename):
+def _getHgVersion(filename, probes=None):
     """Tries to discover the mercurial (hg) parent and id of a file.
 
     Not thoroughly tested; untested on Windows Vista, Win 7, FreeBSD
@@ -688,18 +745,16 @@ def _getHgVersion(filename):
     if (not os.path.exists(filename) or
             not os.path.isdir(os.path.join(dirname(filename), '.hg'))):
         return None
+    if probes is None:
+        probes = _ProbeRunner()
+    probes.start('hgParents', ['hg', 'parents', filename])
+    probes.start('hgId', ['hg', 'id', '-nibt', dirname(filename)])
     try:
-        hgParentLines, err = shellCall(['hg', 'parents', filename],
-                                       stderr=True)
+        hgParentLines = probes.result('hgParents')[0]
         changeset = hgParentLines.splitlines()[0].split()[-1]
     except Exception:
         changeset = ''
-    try:
-        hgID, err = shellCall(['hg', 'id', '-nibt', dirname(filename)],
-                              stderr=True)
-    except Exception:
-        if err:
-            hgID = ''
+    hgID = (probes.result('hgId') or [''])[0]
 
     if len(hgID) or len(changeset):
         return hgID.strip() + ' | parent: ' + changeset.strip()
@@ -722,7 +777,7 @@ def _getUserNameUID():
         return 'undefined', '-1'
 
     if sys.platform not in ['win32']:
-        uid = shellCall('id -u')
+        uid = os.getuid()
     else:
         uid = '1000'
         if haveCtypes and ctypes.windll.shell32.IsUserAnAdmin():
@@ -730,6 +785,181 @@ def _getUserNameUID():
     return str(user), int(uid)
 
 
+def _getBootTime():
+    try:
+        return psutil.boot_time()
+    except Exception:
+        return None
+
+
+def _findExecutable(name):
+    """Return the path of the named program (searching the PATH if no
+    directory is given), or None if it isn't installed, so that missing
+    programs are skipped without starting a process
+    """
+    if os.path.dirname(name):
+        return name if os.path.isfile(name) else None
+    exts = ['']
+    if sys.platform == 'win32':
+        exts += os.environ.get('PATHEXT', '.EXE').lower().split(os.pathsep)
+    for pathDir in os.environ.get('PATH', '').split(os.pathsep):
+        for ext in exts:
+            path = os.path.join(pathDir.strip('"'), name + ext)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+    return None
+
+
+class _Probe(object):
+    """A system command run on its own thread"""
+
+    def __init__(self, cmd, cwd=None, cacheKey=None):
+        self.cmd = cmd
+        self.cwd = cwd
+        self.cacheKey = cacheKey
+        self.proc = None
+        self.output = None
+        self.returncode = None
+        self.duration = None
+        self.startTime = core.getTime()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.proc = subprocess.Popen(self.cmd, cwd=self.cwd,
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+            stdoutData, stderrData = self.proc.communicate('')
+            self.output = stdoutData.strip(), stderrData.strip()
+            self.returncode = self.proc.returncode
+        except (OSError, ValueError):
+            pass
+        self.duration = core.getTime() - self.startTime
+
+    def kill(self):
+        try:
+            self.proc.kill()
+        except (AttributeError, OSError):
+            pass
+
+
+class _ProbeRunner(object):
+    """Runs the system commands queried by RunTimeInfo concurrently, each
+    with a timeout.
+
+    The output of commands started with cache=True, which should only
+    change when the computer is restarted or the program is replaced, is
+    saved in cacheFile and re-used for as long as the boot time and the
+    modification time of the program stay the same.
+    """
+
+    def __init__(self, timeout=5.0, cacheFile=None):
+        self.timeout = timeout
+        self.cacheFile = cacheFile
+        self.bootTime = _getBootTime()
+        self.times = {}  # secs taken by each probe, 0 for cached output
+        self.cached = []
+        self.missing = []
+        self.timedOut = []
+        self._probes = {}
+        self._results = {}
+        self._cache = self._loadCache()
+        self._cacheChanged = False
+
+    def _loadCache(self):
+        if not self.cacheFile or self.bootTime is None:
+            return {}
+        try:
+            with open(self.cacheFile, 'r') as f:
+                cache = json.load(f)
+            # allow for the boot time being reported slightly differently
+            if abs(cache['bootTime'] - self.bootTime) < 2:
+                return cache['probes']
+        except Exception:
+            pass
+        return {}
+
+    def start(self, name, cmd, cwd=None, cache=False):
+        """Start running the command (a list of program and args) as
+        the named probe, unless it has already been started
+        """
+        if name in self._probes or name in self._results:
+            return
+        exe = _findExecutable(cmd[0])
+        if exe is None:
+            self.missing.append(name)
+            self._results[name] = None
+            return
+        cmd = [exe] + list(cmd[1:])
+        cacheKey = None
+        if cache and self.cacheFile and self.bootTime is not None:
+            cacheKey = [cmd, os.path.getmtime(exe)]
+            entry = self._cache.get(name)
+            if entry and entry['key'] == cacheKey:
+                # output is stored as latin-1 text so any bytes round-trip
+                self._results[name] = tuple(text.encode('latin-1')
+                                            for text in entry['output'])
+                self.times[name] = 0.0
+                self.cached.append(name)
+                return
+        self._probes[name] = _Probe(cmd, cwd, cacheKey)
+
+    def result(self, name):
+        """Return (stdout, stderr) of the named probe, stripped as by
+        core.shellCall(), or None if the program isn't installed, couldn't
+        be started or timed out
+        """
+        if name in self._results:
+            return self._results[name]
+        probe = self._probes.pop(name, None)
+        if probe is None:
+            return None
+        probe.thread.join(max(probe.startTime + self.timeout -
+                              core.getTime(), 0))
+        if probe.thread.is_alive():
+            probe.kill()
+            self.timedOut.append(name)
+            self.times[name] = core.getTime() - probe.startTime
+            logging.warning('RunTimeInfo: %s timed out' % ' '.join(probe.cmd))
+            output = None
+        else:
+            self.times[name] = probe.duration
+            output = probe.output
+            if (output is not None and probe.returncode == 0 and
+                    probe.cacheKey is not None):
+                self._cache[name] = {
+                    'key': probe.cacheKey,
+                    'output': [text.decode('latin-1') for text in output]}
+                self._cacheChanged = True
+        self._results[name] = output
+        return output
+
+    def run(self, name, cmd, cwd=None, cache=False):
+        """Start the named probe (if not already started) and return
+        its result
+        """
+        self.start(name, cmd, cwd, cache)
+        return self.result(name)
+
+    def close(self):
+        """Wait for any probes still running and save the cache
+        """
+        for name in list(self._probes):
+            self.result(name)
+        if self._cacheChanged:
+            try:
+                with open(self.cacheFile, 'w') as f:
+                    json.dump({'bootTime': self.bootTime,
+                               'probes': self._cache}, f)
+                self._cacheChanged = False
+            except (IOError, OSError):
+                logging.warning('RunTimeInfo: could not save ' +
+                                self.cacheFile)
+
+
 def _getSha1hexDigest(thing, isfile=False):
     """Returns base64 / hex encoded sha1 digest of str(thing), or
     of a file contents. Return None if a file is requested but no such
@@ -13,6 +13,7 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 
 import os,sys
 import time
+import select
 import subprocess
 from collections import deque
 import json
@@ -209,6 +210,70 @@ class ioHubDevices(object):
     def __init__(self,hubClient):
         self.hubClient=hubClient
 
+class ioHubRequestTicket(object):
+    """
+    ioHubRequestTicket is returned for a request sent to the ioHub Process
+    while the ioHubConnection is in async mode (see
+    ioHubConnection.enableAsyncRequests()). It is a future for the reply:
+    the experiment script can carry on and collect the reply later using
+    result(), or check for it without blocking using done().
+
+    If the reply has not been received within the timeout given to
+    enableAsyncRequests() (for example because the UDP packet was lost), the
+    ticket expires: it is done, and result() raises an ioHubError.
+
+    A user script never creates an instance of this class directly.
+    """
+    def __init__(self,hubClient,ticket_id,forget=False,convert=None,deadline=None):
+        self.ticket_id=ticket_id
+        self._hubClient=hubClient
+        self._forget=forget
+        self._convert=convert
+        self._deadline=deadline
+        self._done=False
+        self._reply=None
+        self._expired=False
+
+    def done(self):
+        """
+        Returns True if the reply to the request has been received. Any
+        replies already waiting to be read are read, but done() never blocks.
+        """
+        if not self._done:
+            self._hubClient._pollTicketReplies()
+        return self._done
+
+    def result(self):
+        """
+        Returns the reply to the request, blocking until it has been
+        received. If the ioHub Process replied with an error, it is raised.
+        """
+        while not self._done:
+            self._hubClient._receiveTicketReply()
+        if self._expired:
+            raise ioHubError("ioHub request ticket {0} timed out waiting for a reply.".format(self.ticket_id))
+        errorReply=self._hubClient._isErrorReply(self._reply)
+        if errorReply:
+            raise Exception(errorReply)
+        if self._convert:
+            return self._convert(self._reply)
+        return self._reply
+
+    def _setReply(self,reply):
+        self._reply=reply
+        self._done=True
+        if self._forget:
+            # nobody will ask for the result, so report errors here
+            errorReply=self._hubClient._isErrorReply(reply)
+            if errorReply:
+                print2err("ioHub request ticket {0} failed: {1}".format(self.ticket_id,errorReply))
+
+    def _expire(self):
+        self._expired=True
+        self._done=True
+        if self._forget:
+            print2err("ioHub request ticket {0} timed out waiting for a reply.".format(self.ticket_id))
+
 class ioHubConnection(object):
     """
     ioHubConnection is responsible for creating,
@@ -281,6 +346,13 @@ class ioHubConnection(object):
         self._sessionMetaData=None
         self._iohub_server_config=None
 
+        # async request state. _async_window is the maximum number of
+        # requests waiting for a reply; None when async mode is not enabled.
+        self._async_window=None
+        self._async_timeout=None
+        self._async_tickets=dict()
+        self._async_ticket_id=0
+
         self._shutdown_attempted=False
         self.iohub_status = self._startServer(ioHubConfig, ioHubConfigAbsPath)
         if self.iohub_status != "OK":
@@ -354,18 +426,45 @@ class ioHubConnection(object):
             tuple: A tuple of event objects, where the event object type is defined by the 'as_type' parameter.
         """
 
-        r=None
         if device_label is None:
             events = self._sendToHubServer(('GET_EVENTS',))[1]
-            if events is None:
-                r=self.allEvents
-            else:
-                self.allEvents.extend(events)
-                r=self.allEvents
-            self.allEvents=[]
+            r=self._takeGlobalEvents(events)
         else:
             r=self.deviceByLabel[device_label].getEvents()
 
+        return self._convertEvents(r,as_type)
+
+    def getEventsAsync(self, as_type ='namedtuple'):
+        """
+        Request the events from all monitored devices, like getEvents(),
+        without waiting for the reply from the ioHub Process. The reply
+        can be collected later in the frame, so the round trip to the ioHub
+        Process overlaps with the rest of the experiment script's work.
+
+        Async mode must have been enabled with enableAsyncRequests().
+
+        Args:
+            as_type (str): Indicates how events should be represented when they are returned, as for getEvents(). Default: 'namedtuple'.
+
+        Returns:
+            ioHubRequestTicket: the result() of which is the list of events.
+        """
+        if self._async_window is None:
+            raise ioHubError("getEventsAsync() requires async mode; call enableAsyncRequests() first.")
+        ticket=self._sendToHubServerAsync(('GET_EVENTS',))
+        ticket._convert=lambda reply: self._convertEvents(self._takeGlobalEvents(reply[1]),as_type)
+        return ticket
+
+    def _takeGlobalEvents(self,events):
+        if events is None:
+            r=self.allEvents
+        else:
+            self.allEvents.extend(events)
+            r=self.allEvents
+        self.allEvents=[]
+        return r
+
+    def _convertEvents(self,r,as_type):
         if r:
             if as_type == 'list':
                 return r
@@ -436,10 +535,17 @@ class ioHubConnection(object):
 
             sec_time (float): The time stamp to use for the message in sec.msec format. If not provided, or None, then the MessageEvent is time stamped when this method is called using the global timer.
 
+        In async mode (see enableAsyncRequests()) the message is sent without
+        waiting for the ioHub Process to reply.
+
         Returns:
             bool: True
         """
-        self._sendToHubServer(('EXP_DEVICE','EVENT_TX',[MessageEvent._createAsList(text,category=category,msg_offset=offset,sec_time=sec_time),]))
+        request=('EXP_DEVICE','EVENT_TX',[MessageEvent._createAsList(text,category=category,msg_offset=offset,sec_time=sec_time),])
+        if self._async_window is None:
+            self._sendToHubServer(request)
+        else:
+            self._sendToHubServerAsync(request,forget=True)
         return True
 
     def getHubServerConfig(self):
@@ -654,13 +760,20 @@ class ioHubConnection(object):
         Args:
             data: A Condition Variable Set object, as received from the ExperimentVariableProvider.getNextConditionSet() method. ANy changes to the values of the condition variables within the object are reflected in the data saved to the ioDataStore.
 
+        In async mode (see enableAsyncRequests()) the row is sent without
+        waiting for the ioHub Process to reply, and None is returned.
+
         Returns:
             None
         """
         for i,d in enumerate(data):
             if isinstance(d,unicode):
                 data[i]=d.encode('utf-8')
-        r=self._sendToHubServer(('RPC','addRowToConditionVariableTable',(self.experimentID,self.experimentSessionID,data)))
+        request=('RPC','addRowToConditionVariableTable',(self.experimentID,self.experimentSessionID,data))
+        if self._async_window is not None:
+            self._sendToHubServerAsync(request,forget=True)
+            return None
+        r=self._sendToHubServer(request)
         return r[2]
 
     def registerPygletWindowHandles(self,*winHandles):
@@ -686,6 +799,44 @@ class ioHubConnection(object):
         """
         return self._sendToHubServer(('RPC','getTime'))[2]
 
+    def enableAsyncRequests(self, max_outstanding=32, timeout=5.0):
+        """
+        Switch the connection to async mode. Each request sent to the
+        ioHub Process is then tagged with a ticket id, and the reply is
+        matched to its request by that ticket, so several requests can be
+        waiting for a reply at once.
+
+        In async mode sendMessageEvent() and addRowToConditionVariableTable()
+        do not wait for the reply, getEventsAsync() returns an
+        ioHubRequestTicket for the events, and all other methods still
+        block until their own reply arrives.
+
+        Args:
+            max_outstanding (int): The maximum number of requests that can be waiting for a reply. When it is reached, sending another request first waits for the oldest reply. Default: 32.
+
+            timeout (float): Seconds to wait for the reply to a request that does not block (sendMessageEvent(), addRowToConditionVariableTable() and getEventsAsync()) before its ticket expires, so that a lost reply does not hold a place in the window forever. None never expires them. Methods that block wait for their reply as they do outside of async mode. Default: 5.0.
+
+        Returns:
+            None
+        """
+        if max_outstanding < 1:
+            raise ValueError("max_outstanding must be at least 1, not %s"%(max_outstanding))
+        self._async_window=int(max_outstanding)
+        self._async_timeout=timeout
+
+    def disableAsyncRequests(self):
+        """
+        Wait for the replies to all outstanding async requests, then switch
+        the connection back to sending a request and blocking until its
+        reply is received.
+
+        Returns:
+            None
+        """
+        while self._async_tickets:
+            self._receiveTicketReply()
+        self._async_window=None
+
     def setPriority(self, level='normal', disable_gc=False):
         """
         See Computer.setPriority documentation, where current process will be
@@ -701,6 +852,23 @@ class ioHubConnection(object):
         """
         return self._sendToHubServer(('RPC','getPriority'))[2]
 
+    def getDevicePollStatistics(self):
+        """
+        Returns a list of dicts, one for each device being polled by the
+        ioHub Process, giving the number of polls made so far, the time spent
+        in the device's _poll method (busy_time), and how late each poll was
+        relative to when it was scheduled (latency), all in sec.msec format.
+        The mode key is 'fd' for devices woken when their file descriptor has
+        data, and 'timer' for devices polled every device_timer interval.
+
+        Args:
+            None
+
+        Returns:
+            list: Poll statistics dicts for each polled device.
+        """
+        return self._sendToHubServer(('RPC','getDevicePollStatistics'))[2]
+
     def enableHighPriority(self,disable_gc=False):
         """
         **Deprecated Method:** Use setPriority('high', disable_gc) instead.
@@ -1130,28 +1298,21 @@ class ioHubConnection(object):
         the PsychoPy Process to the ioHub Process, and then wait for the reply
         from the ioHub Process before returning.
 
-        The ioHubConnection currently blocks until the request is fulfilled and
-        and a response is received from the ioHub server.
-
-        TODO: An aysnc. version could be added if desired.
-
-        Instead of using callbacks, I prefer the idea of the client sending a
-        request and getting a request ticket # back from the ioHub server
-        right away, indicating that the job has been submitted for processing.
-        The ioHubConnection can then ask the ioHub Server for the status of the
-        job ticket based on ticket number.
-
-        When the ticket number result is ready, it is sent back as the reply to
-        the status request. This **aysnc. mode will be necessary** when the
-        worker process is added to the ioHub framework to handle long running
-        job requests from the PsychoPy process; for example to load an image
-        into a shared memory space, perform long running computations, etc.
+        The ioHubConnection blocks until the request is fulfilled and
+        and a response is received from the ioHub server. In async mode (see
+        enableAsyncRequests()) the request is sent with
+        _sendToHubServerAsync(), and this waits for its ticket's reply.
 
         Args:
             messageList (tuple): ioHub Server Message to send.
 
         Return (object): the message response from the ioHub Server process.
         """
+        if self._async_window is not None:
+            # replies to earlier async requests may arrive first, so this
+            # request needs a ticket too.
+            return self._sendToHubServerAsync(ioHubMessage,expires=False).result()
+
         try:
             # send request to host, return is # bytes sent.
             bytes_sent = self.udp_client.sendTo(ioHubMessage)
@@ -1183,6 +1344,93 @@ class ioHubConnection(object):
         #Otherwise return the result
         return result
 
+    def _sendToHubServerAsync(self,ioHubMessage,forget=False,expires=True):
+        """
+        Send a message to the ioHub Process tagged with a new ticket id,
+        without waiting for the reply. If max_outstanding requests are
+        already waiting for a reply, the oldest replies are read first.
+
+        Args:
+            ioHubMessage (tuple): ioHub Server Message to send.
+
+            forget (bool): If True, nobody will ask for the reply. It is still read when it arrives, to keep the number of outstanding requests bounded, and is reported if it is an error.
+
+            expires (bool): If True, the ticket expires if no reply has been received within the timeout given to enableAsyncRequests().
+
+        Return (ioHubRequestTicket): the future for the reply.
+        """
+        while len(self._async_tickets) >= self._async_window:
+            self._receiveTicketReply()
+
+        deadline=None
+        if expires and self._async_timeout is not None:
+            deadline=Computer.getTime()+self._async_timeout
+        self._async_ticket_id+=1
+        ticket=ioHubRequestTicket(self,self._async_ticket_id,forget,deadline=deadline)
+        self._async_tickets[ticket.ticket_id]=ticket
+        try:
+            self.udp_client.sendTo(('TICKET_REQ',ticket.ticket_id)+tuple(ioHubMessage))
+        except Exception, e:
+            import traceback
+            traceback.print_exc()
+            self.shutdown()
+            raise e
+
+        if forget:
+            # read any replies that are already waiting, without blocking
+            self._pollTicketReplies()
+        return ticket
+
+    def _receiveTicketReply(self):
+        """
+        Block until the next reply to an async request is received, and
+        give it to the ticket of the request, or until the first outstanding
+        ticket deadline, when the tickets that have timed out are expired.
+        """
+        deadlines=[t._deadline for t in self._async_tickets.itervalues()
+                   if t._deadline is not None]
+        if deadlines:
+            wait=max(0.0,min(deadlines)-Computer.getTime())
+            if not select.select([self.udp_client.sock],[],[],wait)[0]:
+                self._expireTickets()
+                return
+        try:
+            result = self.udp_client.receive()
+            if result:
+                result, address = result
+        except Exception, e:
+            import traceback
+            traceback.print_exc()
+            self.shutdown()
+            raise e
+
+        if not (isIterable(result) and len(result)==3 and result[0]=='TICKET_REPLY'):
+            raise Exception("Invalid Response Received from ioHub Server", result)
+
+        ticket=self._async_tickets.pop(result[1],None)
+        if ticket is not None:
+            ticket._setReply(result[2])
+
+    def _expireTickets(self):
+        """
+        Expire the outstanding tickets whose deadline has passed. A reply
+        that arrives for one later is ignored.
+        """
+        now=Computer.getTime()
+        for ticket_id,ticket in self._async_tickets.items():
+            if ticket._deadline is not None and ticket._deadline <= now:
+                del self._async_tickets[ticket_id]
+                ticket._expire()
+
+    def _pollTicketReplies(self):
+        """
+        Read the replies to async requests that have already been received,
+        without blocking.
+        """
+        sock=self.udp_client.sock
+        while self._async_tickets and select.select([sock],[],[],0)[0]:
+            self._receiveTicketReply()
+
 #    @classmethod
 #    def _addResponseToHistory(cls,result,bytes_sent,address):
 #        """
@@ -1327,8 +1575,14 @@ class ioHubConnection(object):
 
     def _isErrorReply(self,data):
         """
-
+        Returns the reply if it is an error sent by the ioHub Server, a
+        description if it is not a valid reply, or False otherwise.
         """
+        if isinstance(data,(str,unicode)):
+            # the server replies to failed requests with a bare error name
+            if data.find('ERROR') >= 0:
+                return data
+            return False
         if isIterable(data) and len(data)>0:
             if isIterable(data[0]):
                 return False
@@ -13,12 +13,22 @@ Distributed under the terms of the GNU General Public License
                   Pierce Edmiston <pierce.edmiston@gmail.com>
 """
 
+from fractions import Fraction
+import numpy as np
 import shapely
 import shapely.geometry
 import shapely.affinity
 import shapely as spy
 from weakref import proxy
 
+# relative error bound of the float cross product (Shewchuk's orient2d)
+_CROSS_ERROR=3.3306690738754716e-16
+
+def _exactCrossSign(x0,y0,x1,y1,x,y):
+    x0,y0,x1,y1,x,y=[Fraction(float(v)) for v in (x0,y0,x1,y1,x,y)]
+    cross=(x1-x0)*(y-y0)-(y1-y0)*(x-x0)
+    return (cross>0)-(cross<0)
+
 class Polygon(shapely.geometry.Polygon):
     _next_id=1
     def __init__(self,name,points):
@@ -28,6 +38,7 @@ class Polygon(shapely.geometry.Polygon):
         if name is None:
             self.name=self.__class__.__name__+'_'+str(self._ia_id)
         self._last_target_df=None
+        self._edges=None
         shapely.geometry.Polygon.__init__(self,points)
 
     @property
@@ -40,29 +51,144 @@ class Polygon(shapely.geometry.Polygon):
 
     def contains(self,v):
         return shapely.geometry.Polygon.contains(self,spy.geometry.Point(v[0],v[1]))
-            
+
+    def contains_points(self,x,y):
+        """
+        Vectorized version of contains() for arrays of x and y positions.
+        Returns a bool array that matches calling contains() on each point;
+        points on the boundary of the area are not contained.
+        """
+        x=np.asarray(x,dtype=np.float64)
+        y=np.asarray(y,dtype=np.float64)
+        result=np.zeros(x.shape,dtype=bool)
+        minx,miny,maxx,maxy=self.bounds
+        with np.errstate(invalid='ignore'):
+            # NaN positions fail these comparisons too
+            candidates=np.flatnonzero((x>=minx)&(x<=maxx)&
+                                      (y>=miny)&(y<=maxy))
+        cx=x.ravel()[candidates]
+        cy=y.ravel()[candidates]
+        known=self._analyticContains(cx,cy)
+        if known is not None:
+            inside,outside=known
+            result.ravel()[candidates[inside]]=True
+            undecided=~(inside|outside)
+            candidates=candidates[undecided]
+            cx=cx[undecided]
+            cy=cy[undecided]
+        result.ravel()[candidates]=self._rayCast(cx,cy)
+        return result
+
+    def _analyticContains(self,x,y):
+        """
+        Subclasses with a simple shape can return (inside, outside) bool
+        arrays for points whose containment is certain; other points are
+        then ray cast against the polygon. None means ray cast them all.
+        """
+        return None
+
+    def _getEdges(self):
+        if self._edges is None:
+            x0=[];y0=[];x1=[];y1=[]
+            for ring in [self.exterior]+list(self.interiors):
+                coords=np.asarray(ring.coords,dtype=np.float64)
+                x0.append(coords[:-1,0]);y0.append(coords[:-1,1])
+                x1.append(coords[1:,0]);y1.append(coords[1:,1])
+            self._edges=zip(*[np.concatenate(c) for c in (x0,y0,x1,y1)])
+        return self._edges
+
+    def _rayCast(self,x,y):
+        """
+        Even-odd ray crossing test, one polygon edge at a time. The
+        crossing test uses the sign of the same cross product that finds
+        boundary points, so the two always agree.
+        """
+        inside=np.zeros(x.shape,dtype=bool)
+        boundary=np.zeros(x.shape,dtype=bool)
+        for x0,y0,x1,y1 in self._getEdges():
+            left=(x1-x0)*(y-y0)
+            right=(y1-y0)*(x-x0)
+            cross=left-right
+            # like shapely (GEOS), get the sign right for points within
+            # rounding error of the edge's line
+            uncertain=np.abs(cross)<=_CROSS_ERROR*(np.abs(left)+np.abs(right))
+            uncertain&=(y>=min(y0,y1))&(y<=max(y0,y1))
+            for i in np.flatnonzero(uncertain):
+                cross[i]=_exactCrossSign(x0,y0,x1,y1,x[i],y[i])
+            spans=(y0>y)!=(y1>y)
+            inside^=spans&((cross>0)==(y1>y0))&(cross!=0)
+            boundary|=((cross==0)&(x>=min(x0,x1))&(x<=max(x0,x1))&
+                       (y>=min(y0,y1))&(y<=max(y0,y1)))
+        return inside&~boundary
+
+    def _setRadialBounds(self,center,matrix):
+        """
+        For shapes made by an affine transform of a regular polygon about
+        center: `matrix` maps positions back to the regular polygon, whose
+        inscribed and circumscribed radii are stored (with a small margin
+        for rounding).
+        """
+        self._center=np.asarray(center,dtype=np.float64)
+        self._matrix=np.asarray(matrix,dtype=np.float64)
+        coords=self._toRegular(*np.asarray(self.exterior.coords).T)
+        coords=np.column_stack(coords)
+        start=coords[:-1]
+        edge=coords[1:]-start
+        # distance from the center to the closest point of each edge
+        along=np.clip(-np.sum(start*edge,axis=1)/np.sum(edge*edge,axis=1),0,1)
+        closest=start+along[:,np.newaxis]*edge
+        self._innerRadius2=np.min(np.sum(closest**2,axis=1))*(1-1e-9)
+        self._outerRadius2=np.max(np.sum(coords**2,axis=1))*(1+1e-9)
+
+    def _toRegular(self,x,y):
+        dx=x-self._center[0]
+        dy=y-self._center[1]
+        m=self._matrix
+        return m[0,0]*dx+m[0,1]*dy,m[1,0]*dx+m[1,1]*dy
+
     def filter(self,target_df,x_col='x_position',y_col='y_position'):
         if self._last_target_df is not target_df:
             self._last_target_df=proxy(target_df)
             self._ia_df=None
-            self._ia_df=target_df[target_df[[x_col,y_col]].apply(self.contains,axis = 1)]
+            mask=self.contains_points(target_df[x_col].values,
+                                      target_df[y_col].values)
+            self._ia_df=target_df[mask].copy()
             self._ia_df['ia_name']=self.name
             self._ia_df['ia_id']=self.ia_id
             self._ia_df['ia_name']=self.name
             self._ia_df['ia_id_num']=range(1,len(self._ia_df)+1) 
         return self._ia_df
         
-class Circle(Polygon):            
+class RegularPolygon(Polygon):
+    """
+    Base for interest areas that approximate a circle (after an affine
+    transform), so most points can be tested against the inscribed and
+    circumscribed circles instead of every edge.
+    """
+    def _analyticContains(self,x,y):
+        rx,ry=self._toRegular(x,y)
+        r2=rx*rx+ry*ry
+        return r2<self._innerRadius2,r2>self._outerRadius2
+
+class Circle(RegularPolygon):
     def __init__(self,name,center_point,radius):
         point=shapely.geometry.Point(*center_point).buffer(radius,resolution=16)
         Polygon.__init__(self,name,point.exterior.coords)
+        self._setRadialBounds(center_point,np.identity(2))
 
-class Ellipse(Polygon):
+class Ellipse(RegularPolygon):
     def __init__(self,name,center_point,min_axis,max_axis,angle,use_radians=False):     
         point=spy.geometry.Point(*center_point).buffer(min_axis,resolution=16)
         point=spy.affinity.scale(point, xfact=1.0, yfact=max_axis/min_axis, origin='center')
         point=spy.affinity.rotate(point, angle, origin='center', use_radians=use_radians)
         Polygon.__init__(self,name,point.exterior.coords)
+        if not use_radians:
+            angle=np.radians(angle)
+        # undo the rotation, then the scaling
+        unrotate=np.array([[np.cos(angle),np.sin(angle)],
+                           [-np.sin(angle),np.cos(angle)]])
+        unscale=np.diag([1.0,min_axis/max_axis])
+        self._setRadialBounds(center_point,np.dot(unscale,unrotate))
         
 class Rectangle(Polygon):
     def __init__(self,name,minx,miny,maxx,maxy,ccw=True):
@@ -71,6 +197,32 @@ class Rectangle(Polygon):
             coords = coords[::-1]
         Polygon.__init__(self,name,coords)
 
+    def _analyticContains(self,x,y):
+        # points in the bounds are inside unless they are on the boundary
+        minx,miny,maxx,maxy=self.bounds
+        inside=(x>minx)&(x<maxx)&(y>miny)&(y<maxy)
+        return inside,~inside
+
+def find_interest_areas(areas,target_df,x_col='x_position',y_col='y_position'):
+    """
+    Find which of several interest areas each row of target_df falls in,
+    in one pass over the data. Returns a pandas Series (with the index of
+    target_df) of the ia_id of the first area in `areas` containing the
+    position, or 0 for rows that are in none of them.
+    """
+    import pandas as pd
+    x=target_df[x_col].values
+    y=target_df[y_col].values
+    ia_ids=np.zeros(len(target_df),dtype=np.int64)
+    unassigned=np.arange(len(target_df))
+    for area in areas:
+        if len(unassigned)==0:
+            break
+        found=area.contains_points(x[unassigned],y[unassigned])
+        ia_ids[unassigned[found]]=area.ia_id
+        unassigned=unassigned[~found]
+    return pd.Series(ia_ids,index=target_df.index,name='ia_id')
+
 if __name__ == '__main__':
     circle = Circle('Circle IA',[0,0],400)
     rect=Rectangle('Rect IA',-200,200,200,-200)
@@ -42,56 +42,113 @@ class InterestPeriodDefinition(object):
         return self._ipid
     
     def find(self, target, ip_cols=None):
-        df = target[:]
-        df['ip_id_num'] = np.nan 
-        df['ip_id'] = self.ipid
-        df['ip_name'] = self.name
-        df = df.groupby(level=[0,1], group_keys=False).apply(self.__find)
-        
-        if ip_cols is not None:
-            df = self._merge_ip_cols(df, ip_cols)
-        
-        return df
-    
-    def __find(self, target_group):
-        group_id = target_group.index[0]
-        group_ips = self.ip_df.ix[group_id]
-        if len(group_ips) > 0:
-            overlapping = []
-            for index, ip in group_ips.iterrows():
-                in_ip = ((target_group['time'] >= ip['start_time']) &
-                         (target_group['time'] <= ip['end_time']))
-                target_in_ip = target_group[in_ip]
-                target_in_ip['ip_id_num'] = ip['ip_id_num']
-                overlapping += [target_in_ip]
-            target_filtered = pd.concat(overlapping)
-        else:
-            target_filtered = target_group[[False]*len(target_group)]
-        return target_filtered
-    
+        """
+        Return the rows of target that occurred within an interest period of
+        the same session (time >= start_time and time <= end_time). A row
+        that falls within several overlapping periods is returned once for
+        each of them, with ip_id_num giving the period it was found in.
+        """
+        rows, ip_rows, start_keys = self._find_rows(target)
+        return self._ip_rows_df(target, rows, ip_rows, ip_cols)
+
     def filter(self, target, ip_cols=None):
-        df = target[:]
+        """
+        Return the rows of target that occurred within an interest period of
+        the same session, keeping the order of target. Unlike find(), each
+        row is returned at most once; when periods overlap, it is assigned
+        to the most recently started period that it falls within.
+        """
+        rows, ip_rows, start_keys = self._find_rows(target)
+        if (rows[1:] > rows[:-1]).all():
+            # no overlapping periods, so every row was found once
+            return self._ip_rows_df(target, rows, ip_rows, ip_cols)
+        order = np.lexsort((start_keys[ip_rows], rows))
+        rows = rows[order]
+        last = np.r_[rows[1:] != rows[:-1], True]
+        return self._ip_rows_df(target, rows[last], ip_rows[order][last], ip_cols)
+
+    def _ip_rows_df(self, target, rows, ip_rows, ip_cols):
+        df = target.iloc[rows].copy()
+        df['ip_id_num'] = self.ip_df['ip_id_num'].values[ip_rows]
         df['ip_id'] = self.ipid
         df['ip_name'] = self.name
-        df = target.groupby(level=[0,1], group_keys=False).apply(self.__filter)
-        
+
         if ip_cols is not None:
             df = self._merge_ip_cols(df, ip_cols)
-        
+
         return df
-    
-    def __filter(self, group):
+
+    def _find_rows(self, target):
         """
-        HT http://stackoverflow.com/a/21370058/2506078
+        Return the positions in target and in ip_df of every row and
+        interest period pair where the row falls within the period, ordered
+        by session, then by period in ip_df order, then by row in target
+        order. The period start keys are returned as well.
+
+        All sessions are matched at once by sorting target on its session
+        and time keys and searching it for the start and end of every
+        period, so each period costs O(log n) rather than a pass over the
+        rows of its session.
         """
-        ips = self.ip_df.ix[group.index[0]]
-        start_idx = np.searchsorted(ips['start_time'], group['time'])-1
-        end_idx = np.searchsorted(ips['end_time'], group['time'])
-        mask = (start_idx == end_idx)
-        group['ip_id_num'] = np.nan
-        group['ip_id_num'][mask] = start_idx
-        return group[mask]
-    
+        t_keys, ip_codes, start_keys, end_keys, ip_valid = self._session_time_keys(target)
+
+        t_order = np.argsort(t_keys, kind='mergesort')
+        sorted_keys = t_keys[t_order]
+        first = sorted_keys.searchsorted(start_keys, 'left')
+        last = sorted_keys.searchsorted(end_keys, 'right')
+        counts = np.where(ip_valid, np.maximum(last - first, 0), 0)
+
+        ip_order = np.argsort(ip_codes, kind='mergesort')
+        counts = counts[ip_order]
+        first = first[ip_order]
+        ip_rows = np.repeat(ip_order, counts)
+        offsets = np.repeat(first - (np.cumsum(counts) - counts), counts)
+        rows = t_order[offsets + np.arange(len(offsets))]
+        # the rows of a period are sorted by time; put them back in the
+        # order of target
+        ip_rank = np.repeat(np.arange(len(ip_order)), counts)
+        order = np.lexsort((rows, ip_rank))
+        return rows[order], ip_rows[order], start_keys
+
+    def _session_time_keys(self, target):
+        """
+        Return int64 sort keys that order the rows of target, and the start
+        and end times of ip_df, by session (index levels 0 and 1) and then
+        by time. Times are replaced by their rank among all the times, so
+        the keys are exact. Rows of target with a missing session or time
+        get a key of -1, which is before every period.
+
+        Returns (target_keys, ip_session_codes, start_keys, end_keys,
+        ip_valid).
+        """
+        ips = self.ip_df
+        n_target = len(target)
+        codes = 0
+        missing = False
+        for level in (0, 1):
+            values = np.concatenate([target.index.get_level_values(level).values,
+                                     ips.index.get_level_values(level).values])
+            level_codes, uniques = pd.factorize(values, sort=True)
+            codes = codes * len(uniques) + level_codes
+            missing = missing | (level_codes < 0)
+        codes = np.where(missing, -1, codes).astype(np.int64)
+
+        times = np.concatenate([target['time'].values,
+                                ips['start_time'].values,
+                                ips['end_time'].values])
+        unique_times, ranks = np.unique(times, return_inverse=True)
+        # start and end times share the session codes of their ip row
+        time_codes = np.concatenate([codes, codes[n_target:]])
+        keys = time_codes * len(unique_times) + ranks
+        keys[pd.isnull(times)] = -1
+
+        t_keys = keys[:n_target]
+        t_keys[codes[:n_target] < 0] = -1
+        start_keys, end_keys = np.split(keys[n_target:], 2)
+        ip_codes = codes[n_target:]
+        ip_valid = (ip_codes >= 0) & (start_keys >= 0) & (end_keys >= 0)
+        return t_keys, ip_codes, start_keys, end_keys, ip_valid
+
     def _merge_ip_cols(self, target, cols):
         if not isinstance(cols, dict):
             if not hasattr(cols, '__iter__'):
@@ -124,18 +181,17 @@ class InterestPeriodDefinition(object):
         
         return matches
     
-    def __enumerate_ips(self, group):
-        group['ip_id_num'] = range(len(group))
-        return group
-    
     def _ip_zipper(self, start, end, temp_index='ip_id_num'):
         # TODO: make sure the two dfs "zip" nicely
-        _start = start.groupby(level=[0,1]).apply(self.__enumerate_ips)
-        _end = end.groupby(level=[0,1]).apply(self.__enumerate_ips)
-        
+        # the n'th start of each session is paired with its n'th end
+        _start = start.copy()
+        _end = end.copy()
+        _start[temp_index] = start.groupby(level=[0,1]).cumcount().values
+        _end[temp_index] = end.groupby(level=[0,1]).cumcount().values
+
         _start.set_index(temp_index, append=True, inplace=True)
         _end.set_index(temp_index, append=True, inplace=True)
-        
+
         _all = pd.merge(_start, _end, left_index=True, right_index=True)
         return _all.reset_index(temp_index)
 
@@ -158,7 +214,9 @@ class EventBasedIP(InterestPeriodDefinition):
         InterestPeriodDefinition.__init__(self,name)
 
         self._start_source_df=start_source_df
-        self._end_source_df=end_source_df or start_source_df[:]
+        self._end_source_df=end_source_df
+        if end_source_df is None:
+            self._end_source_df=start_source_df[:]
         self._start_criteria=start_criteria
         self._end_criteria=end_criteria
         self._exact=exact
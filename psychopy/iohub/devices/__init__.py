@@ -12,12 +12,13 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 .. fileauthor:: Sol Simpson <sol@isolver-software.com>
 """
 
-import gc, os, sys, copy
+import gc, os, sys
 import collections
 from collections import deque
-from operator import itemgetter
 import numpy as N
 import psutil
+from heapq import merge
+from ..constants import EventConstants
 from ..util import convertCamelToSnake, print2err,printExceptionDetailsToStdErr
 from psychopy.clock import monotonicClock
 
@@ -831,7 +832,8 @@ class Device(ioObject):
                                             '_is_reporting_events',
                                             '_configuration',
                                             'monitor_event_types',
-                                            '_filters']
+                                            '_filters',
+                                            '_filter_routes']
 
     def __init__(self,*args,**kwargs):
         #: The user defined name given to this device instance. A device name must be
@@ -889,13 +891,14 @@ class Device(ioObject):
         ioObject.__init__(self, *args, **kwargs)
 
         self._is_reporting_events = kwargs.get('auto_report_events', False)
-        self._iohub_event_buffer = dict()
+        self._iohub_event_buffer = DeviceEventBuffer(self.event_buffer_length)
         self._event_listeners = dict()
         self._configuration = kwargs
         self._last_poll_time = 0
         self._last_callback_time = 0
         self._native_event_buffer = deque(maxlen=self.event_buffer_length)
         self._filters = dict()
+        self._filter_routes = None
 
     def getConfiguration(self):
         """
@@ -952,26 +955,9 @@ class Device(ioObject):
 
         filter_id=kwargs.get('filter_id',None)
 
-        currentEvents=[]
-        if eventTypeID:
-            currentEvents=list(self._iohub_event_buffer.get(eventTypeID,[]))
-
-            if filter_id:
-                currentEvents = [e for e in currentEvents if e[DeviceEvent.EVENT_FILTER_ID_INDEX] == filter_id]
-
-            if clearEvents is True and len(currentEvents)>0:
-                self.clearEvents(eventTypeID,filter_id=filter_id, call_proc_events=False)
-        else:
-            if filter_id:
-                [currentEvents.extend([fe for fe in l if fe[DeviceEvent.EVENT_FILTER_ID_INDEX] == filter_id]) for l in self._iohub_event_buffer.values()]
-            else:
-                [currentEvents.extend(l) for l in self._iohub_event_buffer.values()]
-
-            if clearEvents is True and len(currentEvents)>0:
-                self.clearEvents(filter_id=filter_id, call_proc_events=False)
-
-        if len(currentEvents)>0:
-            currentEvents=sorted(currentEvents, key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
+        currentEvents=self._iohub_event_buffer.getEvents(eventTypeID,filter_id)
+        if clearEvents is True and len(currentEvents)>0:
+            self.clearEvents(eventTypeID,filter_id=filter_id, call_proc_events=False)
         return currentEvents
 
 
@@ -993,21 +979,7 @@ class Device(ioObject):
         if call_proc_events:
             self._iohub_server.processDeviceEvents()
 
-        if event_type:
-            if filter_id:
-                event_que = self._iohub_event_buffer[event_type]
-                newque = deque([e for e in event_que if e[DeviceEvent.EVENT_FILTER_ID_INDEX] != filter_id], maxlen=self.event_buffer_length)
-                self._iohub_event_buffer[event_type] = newque
-            else:
-                self._iohub_event_buffer.setdefault(event_type,
-                                deque(maxlen=self.event_buffer_length)).clear()
-        else:
-            if filter_id:
-                for event_type, event_deque in self._iohub_event_buffer.items():
-                    newque = deque([e for e in event_deque if e[DeviceEvent.EVENT_FILTER_ID_INDEX] != filter_id], maxlen=self.event_buffer_length)
-                    self._iohub_event_buffer[event_type] = newque
-            else:
-                self._iohub_event_buffer.clear()
+        self._iohub_event_buffer.clear(event_type,filter_id)
 
     def enableEventReporting(self,enabled=True):
         """
@@ -1079,6 +1051,7 @@ class Device(ioObject):
                     filter_key = filter_file_path+'.'+filter_class_name
                     filter_class_instance._filter_key = filter_key
                     self._filters[filter_key] = filter_class_instance
+                    self._filter_routes = None
                     return filter_class_instance.filter_id
 
             else:
@@ -1092,6 +1065,7 @@ class Device(ioObject):
         filter_key = filter_file_path+'.'+filter_class_name
         if filter_key in self._filters:
             del self._filters[filter_key]
+            self._filter_routes = None
             return True
         return False
 
@@ -1108,20 +1082,46 @@ class Device(ioObject):
 
     def _handleEvent(self,e):
         event_type_id = e[DeviceEvent.EVENT_TYPE_ID_INDEX]
-        self._iohub_event_buffer.setdefault(event_type_id,
-                               deque(maxlen=self.event_buffer_length)).append(e)
+        self._iohub_event_buffer.append(e)
 
-        # Add the event to any filters bound to the device which
+        # Queue the event for any filters bound to the device which
         # list wanting the event's type and events filter_id
-        input_evt_filter_id = e[DeviceEvent.EVENT_FILTER_ID_INDEX]
+        if self._filters:
+            input_evt_filter_id = e[DeviceEvent.EVENT_FILTER_ID_INDEX]
+            for event_filter, evt_filter_ids in self._getFilterRoutes(event_type_id):
+                # filter_id check stops circular event processing
+                if input_evt_filter_id in evt_filter_ids and event_filter.enable is True:
+                    event_filter._queueInputEvent(e)
+
+    def _getFilterRoutes(self, event_type_id):
+        """
+        Returns a list of (filter, accepted_filter_ids) for the filters that
+        take events of event_type_id as input. The lookup is built once from
+        each filter's input_event_types, and rebuilt when filters are added
+        or removed.
+        """
+        routes = self._filter_routes
+        if routes is None:
+            routes = dict()
+            for event_filter in self._filters.values():
+                filter_id = event_filter.filter_id
+                for etype, filter_ids in event_filter.input_event_types.items():
+                    filter_ids = frozenset(fid for fid in filter_ids if fid != filter_id)
+                    if filter_ids:
+                        routes.setdefault(etype, []).append((event_filter, filter_ids))
+            self._filter_routes = routes
+        return routes.get(event_type_id, ())
+
+    def _processFilterInputEvents(self):
+        """
+        Calls process() for each filter that has new input events queued.
+        Returns the output events from all of the device's filters.
+        """
+        filtered_events = []
         for event_filter in self._filters.values():
-            if event_filter.enable is True:
-                current_filter_id = event_filter.filter_id
-                if current_filter_id != input_evt_filter_id:
-                    # stops circular event processing
-                    evt_filter_ids= event_filter.input_event_types.get(event_type_id, [])
-                    if input_evt_filter_id in evt_filter_ids:
-                        event_filter._addInputEvent(copy.deepcopy(e))
+            event_filter._processInputEvents()
+            filtered_events.extend(event_filter._removeOutputEvents())
+        return filtered_events
 
     def _getNativeEventBuffer(self):
         return self._native_event_buffer
@@ -1145,7 +1145,7 @@ class Device(ioObject):
     def getCurrentDeviceState(self, clear_events=True):
         result_dict={}
         self._iohub_server.processDeviceEvents()
-        events = {key:tuple(value) for key, value in self._iohub_event_buffer.items()}
+        events = {key:tuple(value) for key, value in self._iohub_event_buffer.getEventsByType().items()}
         result_dict['events'] = events
         if clear_events:
             self.clearEvents(call_proc_events=False)
@@ -1238,6 +1238,40 @@ class Device(ioObject):
         """
         pass
 
+    def _getPollFileDescriptor(self):
+        """
+        Devices that poll a native interface which is backed by a file
+        descriptor (for example a serial port or socket) can return that
+        descriptor here. The ioHub Server then calls _poll() as soon as the
+        descriptor becomes readable, instead of every device_timer interval.
+
+        The default implementation returns None, so the device is polled
+        using its device_timer interval.
+
+        Args:
+            None
+
+        Returns:
+            int or None: a readable file descriptor, or None.
+        """
+        return None
+
+    def _isPollFileDescriptorActive(self):
+        """
+        Devices that return a file descriptor from _getPollFileDescriptor()
+        must return False here whenever _poll() would not read from it (for
+        example while the device is not reporting events). Unread data keeps
+        the descriptor readable, so while this is False the ioHub Server
+        polls the device on its device_timer interval instead.
+
+        Args:
+            None
+
+        Returns:
+            bool: True if _poll() reads the descriptor's pending data.
+        """
+        return True
+
     def _handleNativeEvent(self,*args,**kwargs):
         """
         The _handleEvent method can be used by the native device interface (implemented
@@ -1517,6 +1551,311 @@ class DeviceEvent(ioObject):
     @classmethod
     def createEventAsNamedTuple(cls,valueList):
         return cls.namedTupleClass(*valueList)
+
+########### Event buffers used by Devices and the ioHub Server ##########
+
+class EventTypeBuffer(object):
+    """
+    A ring buffer holding up to max_length events of one event type,
+    in the order they were added.
+
+    If the event class for the event type has a NUMPY_DTYPE with only numeric
+    fields, each event is stored as a row of a structured numpy array, so an
+    event uses a fixed number of bytes. The array uses the NUMPY_DTYPE
+    fields, except that float fields are stored as float64 so that time
+    stamps keep their full precision, and grows as needed, up to max_length
+    rows.
+
+    Other event types, or events whose values do not all survive being
+    stored in those fields unchanged (for example a float mouse position in
+    an int16 field, or a negative value in an unsigned field), are kept as
+    event lists in a deque, so events are always returned with the values
+    they were added with.
+    """
+    INITIAL_SIZE=64
+
+    def __init__(self, event_type_id, max_length):
+        self.max_length=max_length
+        self._rows=None
+        self._row=None
+        self._start=0
+        self._count=0
+        event_class=EventConstants.getClass(event_type_id)
+        dtype=getattr(event_class,'NUMPY_DTYPE',None)
+        if dtype is not None and all(dtype[i].kind in 'iuf' and dtype[i].shape==()
+                                     for i in range(len(dtype))):
+            dtype=N.dtype([(name,N.float64 if dtype[name].kind=='f' else dtype[name])
+                           for name in dtype.names])
+            size=min(self.INITIAL_SIZE,max_length)
+            self._rows=N.zeros(size,dtype=dtype)
+            self._row=N.zeros(1,dtype=dtype)
+            self._seqs=N.zeros(size,dtype=N.int64)
+        else:
+            self._events=deque(maxlen=max_length)
+            self._seqs=deque(maxlen=max_length)
+
+    def append(self, event, seq=0):
+        """
+        Add the event (in list form) to the buffer. If the buffer is full,
+        the oldest event is dropped. seq is the order the event was added
+        in, relative to events of other types.
+        """
+        if self._rows is not None:
+            try:
+                # Convert using a scratch row so a bad event can not
+                # leave a partly written row in the buffer.
+                values=tuple(event)
+                self._row[0]=values
+                stored=self._row[0].tolist()
+                # (NaN, e.g. a missing gaze position, never equals itself)
+                exact=stored==values or all(a==b or (a!=a and b!=b)
+                                            for a,b in zip(stored,values))
+            except (TypeError, ValueError, OverflowError):
+                exact=False
+            if not exact:
+                self._useEventLists()
+            else:
+                size=len(self._rows)
+                if self._count==size and size<self.max_length:
+                    self._grow()
+                    size=len(self._rows)
+                pos=(self._start+self._count)%size
+                self._rows[pos]=self._row[0]
+                self._seqs[pos]=seq
+                if self._count==size:
+                    self._start=(self._start+1)%size
+                else:
+                    self._count+=1
+                return
+        self._events.append(event)
+        self._seqs.append(seq)
+
+    def getEvents(self, filter_id=None):
+        """
+        Returns a list of the events in the buffer, oldest first, each in
+        list form. If filter_id is given, only events with that filter_id
+        are returned.
+        """
+        if self._rows is None:
+            if filter_id:
+                return [e for e in self._events if e[DeviceEvent.EVENT_FILTER_ID_INDEX]==filter_id]
+            return list(self._events)
+        rows=self.getRows()
+        if filter_id:
+            rows=rows[rows['filter_id']==filter_id]
+        return map(list,rows.tolist())
+
+    def getSortedEvents(self, filter_id=None):
+        """
+        Returns (times, events), where events is the list returned by
+        getEvents(filter_id) sorted by ioHub time, and times is a
+        numpy array of the event times.
+
+        Events are normally added in time order already, so sorting is only
+        done when the times are found to be out of order.
+        """
+        if self._rows is None:
+            events=self.getEvents(filter_id)
+            times=N.fromiter((e[DeviceEvent.EVENT_HUB_TIME_INDEX] for e in events),
+                             dtype=N.float64,count=len(events))
+        else:
+            rows=self.getRows()
+            if filter_id:
+                rows=rows[rows['filter_id']==filter_id]
+            times=rows['time']
+            if N.any(times[1:]<times[:-1]):
+                rows=rows[N.argsort(times,kind='mergesort')]
+                times=rows['time']
+            return times,map(list,rows.tolist())
+        if N.any(times[1:]<times[:-1]):
+            order=N.argsort(times,kind='mergesort')
+            times=times[order]
+            events=[events[i] for i in order]
+        return times,events
+
+    def getRows(self):
+        """
+        Returns the numpy structured array of the events in the buffer, oldest
+        first, or None if the buffer is storing event lists. The array is a view
+        of the buffer when the stored events do not wrap around its end.
+        """
+        if self._rows is None:
+            return None
+        return self._ringSlice(self._rows)
+
+    def getFirstSeq(self):
+        """
+        Returns the seq of the oldest event in the buffer, or None if
+        the buffer is empty.
+        """
+        if len(self)==0:
+            return None
+        if self._rows is None:
+            return self._seqs[0]
+        return self._seqs[self._start]
+
+    def popOldest(self):
+        """
+        Removes the oldest event from the buffer.
+        """
+        if self._rows is None:
+            self._events.popleft()
+            self._seqs.popleft()
+        elif self._count:
+            self._start=(self._start+1)%len(self._rows)
+            self._count-=1
+
+    def clear(self, filter_id=None):
+        """
+        Removes all events from the buffer, or only the events that have
+        a matching filter_id.
+        """
+        if filter_id is None:
+            if self._rows is None:
+                self._events.clear()
+                self._seqs.clear()
+            self._start=0
+            self._count=0
+        elif self._rows is None:
+            keep=[(e,s) for e,s in zip(self._events,self._seqs)
+                  if e[DeviceEvent.EVENT_FILTER_ID_INDEX]!=filter_id]
+            self._events=deque([k[0] for k in keep],maxlen=self.max_length)
+            self._seqs=deque([k[1] for k in keep],maxlen=self.max_length)
+        else:
+            rows=self.getRows()
+            keep=rows['filter_id']!=filter_id
+            seqs=self._ringSlice(self._seqs)[keep]
+            rows=rows[keep]
+            self._count=len(rows)
+            self._start=0
+            self._rows[:self._count]=rows
+            self._seqs[:self._count]=seqs
+
+    def __len__(self):
+        if self._rows is None:
+            return len(self._events)
+        return self._count
+
+    def _ringSlice(self, a):
+        end=self._start+self._count
+        if end<=len(a):
+            return a[self._start:end]
+        return N.concatenate((a[self._start:],a[:end-len(a)]))
+
+    def _grow(self):
+        size=min(len(self._rows)*2,self.max_length)
+        rows=N.zeros(size,dtype=self._rows.dtype)
+        seqs=N.zeros(size,dtype=N.int64)
+        rows[:self._count]=self.getRows()
+        seqs[:self._count]=self._ringSlice(self._seqs)
+        self._rows=rows
+        self._seqs=seqs
+        self._start=0
+
+    def _useEventLists(self):
+        seqs=self._ringSlice(self._seqs).tolist()
+        self._events=deque(self.getEvents(),maxlen=self.max_length)
+        self._seqs=deque(seqs,maxlen=self.max_length)
+        self._rows=None
+        self._row=None
+        self._start=0
+        self._count=0
+
+class DeviceEventBuffer(object):
+    """
+    Holds iohub events, in list form, using an EventTypeBuffer for each
+    event type.
+
+    If shared_length is False, each event type can hold up to max_length
+    events. If shared_length is True, max_length is the total number of events
+    held, and adding an event to a full buffer drops the oldest event
+    of any type, like a collections.deque with maxlen set.
+
+    Events of more than one type are returned sorted by ioHub time, using a
+    merge of the already sorted events of each type.
+    """
+    def __init__(self, max_length, shared_length=False):
+        self.max_length=max_length
+        self._shared_length=shared_length
+        self._buffers=dict()
+        self._seq=0
+        self._count=0
+
+    def append(self, event):
+        event_type_id=event[DeviceEvent.EVENT_TYPE_ID_INDEX]
+        type_buffer=self._buffers.get(event_type_id)
+        if type_buffer is None:
+            type_buffer=self._buffers[event_type_id]=EventTypeBuffer(event_type_id,
+                                                                     self.max_length)
+        type_buffer.append(event,self._seq)
+        self._seq+=1
+        if self._shared_length:
+            self._count+=1
+            if self._count>self.max_length:
+                self._popOldest()
+
+    def getEvents(self, event_type=None, filter_id=None):
+        """
+        Returns a list of the events of event_type, or of all event types if
+        event_type is None, sorted by ioHub time. If filter_id is given, only
+        events with that filter_id are returned.
+        """
+        if event_type:
+            type_buffers=[self._buffers.get(event_type)]
+        else:
+            type_buffers=self._buffers.values()
+
+        runs=[]
+        for type_buffer in type_buffers:
+            if type_buffer:
+                times,events=type_buffer.getSortedEvents(filter_id)
+                if events:
+                    runs.append((times,events))
+        if len(runs)==0:
+            return []
+        if len(runs)==1:
+            return runs[0][1]
+        # Merge keys are (time, run index, event index), which gives the same
+        # order as a stable sort of the runs on time.
+        keyed_runs=[zip(times.tolist(),[r]*len(events),xrange(len(events)),events)
+                    for r,(times,events) in enumerate(runs)]
+        return [k[3] for k in merge(*keyed_runs)]
+
+    def getEventsByType(self):
+        """
+        Returns a dict of event_type_id : list of events, oldest first.
+        """
+        return dict((event_type,type_buffer.getEvents())
+                    for event_type,type_buffer in self._buffers.items())
+
+    def clear(self, event_type=None, filter_id=None):
+        """
+        Removes the events of event_type, or of all event types if event_type
+        is None. If filter_id is given, only events with that filter_id
+        are removed.
+        """
+        if event_type:
+            type_buffers=[self._buffers.get(event_type)]
+        else:
+            type_buffers=self._buffers.values()
+        for type_buffer in type_buffers:
+            if type_buffer:
+                type_buffer.clear(filter_id)
+        self._count=len(self)
+
+    def __len__(self):
+        return sum(len(b) for b in self._buffers.values())
+
+    def _popOldest(self):
+        oldest=None
+        for type_buffer in self._buffers.values():
+            seq=type_buffer.getFirstSeq()
+            if seq is not None and (oldest is None or seq<oldest[0]):
+                oldest=seq,type_buffer
+        if oldest:
+            oldest[1].popOldest()
+            self._count-=1
+
 #
 # Import Devices and DeviceEvents
 #
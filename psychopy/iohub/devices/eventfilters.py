@@ -1,7 +1,8 @@
 __author__ = 'Sol'
+import copy
 import numpy as np
 from collections import deque
-from psychopy.iohub.util import NumPyRingBuffer
+from psychopy.iohub.util import NumPyRingBuffer, RunningMedian, slidingWindows
 from psychopy.iohub import EventConstants, DeviceEvent, print2err, Computer
 
 
@@ -23,10 +24,23 @@ class DeviceEventFilter(object):
     The class __init__ can accept a set of kwargs, which will automatically be
     converted into class_instance.key = value attributes.
 
+    input_event_copy sets how the device hands each new event to the filter:
+        * 'deep' (default): a copy.deepcopy of the event, so the filter can
+          change the input events in any way.
+        * 'shallow': a list copy of the event. Use when the filter only
+          replaces top level field values of the input events.
+        * None: the event list used by the device itself. The filter must
+          treat these events as read-only. This avoids any per event copy.
+
+    New events are queued for the filter as they are received, and process()
+    is called once per ioHub event processing pass with all queued events.
     """
     event_filter_id_index = DeviceEvent.EVENT_FILTER_ID_INDEX
     event_id_index = DeviceEvent.EVENT_ID_INDEX
     event_time_index = DeviceEvent.EVENT_HUB_TIME_INDEX
+    event_type_index = DeviceEvent.EVENT_TYPE_ID_INDEX
+
+    input_event_copy = 'deep'
 
     def __init__(self, **kwargs):
         # _parent_device_type filled in by iohub
@@ -36,6 +50,7 @@ class DeviceEventFilter(object):
 
         self._input_events = []
         self._output_events = []
+        self._has_new_input = False
 
         for key, value in kwargs.items():
             setattr(self, key, value)
@@ -53,12 +68,25 @@ class DeviceEventFilter(object):
     def getInputEvents(self):
         return self._input_events
 
+    def getInputEventArray(self, event_type):
+        """
+        Returns the current input events of the given event_type as a numpy
+        structured array, using the event class NUMPY_DTYPE, so a whole batch
+        of new events can be processed one field (column) at a time;
+        for example arr['gaze_x'].
+        """
+        dtype = EventConstants.getClass(event_type).NUMPY_DTYPE
+        type_ix = self.event_type_index
+        return np.array([tuple(e) for e in self._input_events
+                         if e[type_ix] == event_type], dtype=dtype)
+
     def clearInputEvents(self):
-        self._input_events = []
+        del self._input_events[:]
 
     def reset(self):
-        self._input_events = []
+        del self._input_events[:]
         self._output_events = []
+        self._has_new_input = False
 
     @property
     def filter_id(self):
@@ -92,8 +120,9 @@ class DeviceEventFilter(object):
         # Optionally remove the input events processed so they are not
         # repeatedly retrieved using clearInputEvents(.
         #
-        # The events returned by getInputEvents() are copies of the
-        # original event lists, so it is fine to filter in place if desired.
+        # Unless the filter class sets input_event_copy = None, the events
+        # returned by getInputEvents() are copies of the original event
+        # lists, so it is fine to filter in place if desired.
         #
         # Each event passed to addOutputEvent() will have it's event_id and
         # filter_id updated appropriately; this is done for you.
@@ -109,8 +138,30 @@ class DeviceEventFilter(object):
         """
         Takes event from parent device for processing.
         """
+        self._queueInputEvent(evt)
+        self._processInputEvents()
+
+    def _queueInputEvent(self, evt):
+        """
+        Called by the parent device for each new event the filter accepts.
+        The event is copied according to input_event_copy.
+        """
+        copy_type = self.input_event_copy
+        if copy_type == 'deep':
+            evt = copy.deepcopy(evt)
+        elif copy_type == 'shallow':
+            evt = list(evt)
         self._input_events.append(evt)
-        self.process()
+        self._has_new_input = True
+
+    def _processInputEvents(self):
+        """
+        Called by the iohub Server when processing device events. Calls
+        process() once if events have been queued since the last call.
+        """
+        if self._has_new_input:
+            self._has_new_input = False
+            self.process()
 
     def _removeOutputEvents(self):
         """
@@ -134,11 +185,15 @@ class MovingWindowFilter(object):
 
     If the windowing buffer is full, a filtered value is returned when a
     value is added to the MovingWindow using MovingWindow.add.
-    None is returned until the MovingWindow is full.
+    None is returned until the MovingWindow is full. A block of values can be
+    added at once using MovingWindow.add_many.
 
     The base class implements a moving window averaging filter, no weights.
     To change the filter used, extend this class and replace the filteredValue
-    method.
+    method. Optionally also implement _filterWindows, which is given a 2D
+    array with one full window per row, and must return the filteredValue
+    result for each row. add_many uses it to filter a block of values
+    with one numpy call. Without it, add_many calls add for each value.
     """
     def __init__(self, **kwargs):
         self._inplace = kwargs.get('inplace')
@@ -179,6 +234,9 @@ class MovingWindowFilter(object):
         """
         return self._filtering_buffer.mean()
 
+    def _filterWindows(self, windows):
+        return windows.mean(axis=1)
+
     def add(self, event):
         """
         Add the given iohub event ( in list form ) to the moving window.
@@ -189,17 +247,65 @@ class MovingWindowFilter(object):
         been filtered, and the filtered value of the field being filtered.
         """
         if isinstance(event, (list,tuple)):
-            self._filtering_buffer.append(event[self._event_field_index])
+            self._appendValue(event[self._event_field_index])
             self._events.append(event)
             if self.isFull():
                 if self._inplace:
                     self._events[self._active_index][self._event_field_index] = self.filteredValue()
                 return self._events[self._active_index], self.filteredValue()
         else:
-            self._filtering_buffer.append(event)
+            self._appendValue(event)
             if self.isFull():
                 return None, self.filteredValue()
 
+    def add_many(self, events):
+        """
+        Add a sequence of iohub events ( in list form ), or of values, to
+        the moving window. Returns a list with one item for each event added,
+        equal to what calling add() with each event in turn would return.
+
+        If the filter class implements _filterWindows, the filtered values
+        for all the windows that become full are calculated with one
+        vectorized call.
+        """
+        if len(events) == 0:
+            return []
+        if not self._hasWindowsFilter():
+            return [self.add(e) for e in events]
+
+        values = events
+        if isinstance(events[0], (list,tuple)):
+            values = [e[self._event_field_index] for e in events]
+            prev_events = list(self._events)
+        else:
+            events = None
+
+        buff = self._filtering_buffer
+        values = np.asarray(values, dtype=buff._dtype)
+        prev_values = buff.getElements()
+        if buff.isFull():
+            prev_values = prev_values[1:]
+        prev_count = len(prev_values)
+        filtered = self._filterWindows(slidingWindows(np.concatenate((prev_values, values)), buff.max_size))
+        self._extendValues(values)
+
+        # Window n ends with the value at index n+length-1-prev_count of values.
+        first = buff.max_size-1-prev_count
+        results = [None]*min(max(first,0),len(values))
+        if events is None:
+            results.extend((None, v) for v in filtered)
+            return results
+
+        prev_events = prev_events[len(prev_events)-prev_count:]
+        window_events = prev_events+list(events)
+        self._events.extend(events)
+        for n, v in enumerate(filtered):
+            e = window_events[n+self._active_index]
+            if self._inplace:
+                e[self._event_field_index] = v
+            results.append((e, v))
+        return results
+
     def isFull(self):
         return self._filtering_buffer.isFull()
 
@@ -207,6 +313,20 @@ class MovingWindowFilter(object):
         self._filtering_buffer.clear()
         if self._events:
             self._events.clear()
+
+    def _appendValue(self, value):
+        self._filtering_buffer.append(value)
+
+    def _extendValues(self, values):
+        self._filtering_buffer.extend(values)
+
+    def _hasWindowsFilter(self):
+        # _filterWindows can only be used if it was implemented by the same
+        # class that provides the filteredValue method being used.
+        for cls in type(self).__mro__:
+            if 'filteredValue' in cls.__dict__:
+                return '_filterWindows' in cls.__dict__
+        return False
 # ------
 
 class PassThroughFilter(MovingWindowFilter):
@@ -221,17 +341,42 @@ class PassThroughFilter(MovingWindowFilter):
     def filteredValue(self):
         return self._filtering_buffer[0]
 
+    def _filterWindows(self, windows):
+        return windows[:, 0]
+
 # ------
 
 class MedianFilter(MovingWindowFilter):
     """
     Returns the median value of the moving window. Length must be odd.
+
+    When values are added one at a time, the median is updated using a
+    RunningMedian, which is O(log n) per value added.
     """
     def __init__(self, **kwargs):
         MovingWindowFilter.__init__(self, **kwargs)
+        self._running_median = RunningMedian(self._filtering_buffer.max_size)
 
     def filteredValue(self):
-        return np.median(self._filtering_buffer.getElements())
+        if self._filtering_buffer.max_size%2 == 0:
+            return np.median(self._filtering_buffer.getElements())
+        return self._running_median.median()
+
+    def _filterWindows(self, windows):
+        return np.median(windows, axis=1)
+
+    def clear(self):
+        MovingWindowFilter.clear(self)
+        self._running_median.clear()
+
+    def _appendValue(self, value):
+        MovingWindowFilter._appendValue(self, value)
+        self._running_median.append(self._filtering_buffer[-1])
+
+    def _extendValues(self, values):
+        MovingWindowFilter._extendValues(self, values)
+        for v in self._filtering_buffer.getElements()[-len(values):]:
+            self._running_median.append(v)
 
 # ------
 
@@ -255,6 +400,14 @@ class WeightedAverageFilter(MovingWindowFilter):
     def filteredValue(self):
         return np.convolve(self._filtering_buffer.getElements(), self._weights, 'valid')
 
+    def _filterWindows(self, windows):
+        # Convolving the whole block gives each window the same dot product
+        # as filteredValue. Each row is kept as a length 1 array, like
+        # filteredValue returns.
+        if len(windows) == 0:
+            return windows[:, :1]
+        values = np.concatenate((windows[0], windows[1:, -1]))
+        return np.convolve(values, self._weights, 'valid')[:, np.newaxis]
 
 # ------
 
@@ -293,6 +446,16 @@ class StampFilter(MovingWindowFilter):
             return (e1+e3)/2.0
         return e2
 
+    def _filterWindows(self, windows):
+        e1, e2, e3 = windows.T
+        replace = ~((e1 < e2) & (e2 < e3)) | ~((e3 < e2) & (e2 < e1))
+        return np.where(replace, (e1+e3).astype(np.float64)/2.0, e2)
+
+    def add_many(self, events):
+        if self.sub_filter:
+            return [self.add(e) for e in events]
+        return MovingWindowFilter.add_many(self, events)
+
     def add(self, event):
         if self.sub_filter:
             sub_result =  self.sub_filter.add(event)
@@ -149,6 +149,9 @@ RIGHT_EYE = 2
 BOTH_EYE = 3
 
 class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
+    # Input samples are only read; converted monocular samples are new lists.
+    input_event_copy = None
+
     def __init__(self, **kwargs):
         eventfilters.DeviceEventFilter.__init__(self,**kwargs)
         self.sample_type = None
@@ -497,10 +500,12 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
         current_event[io_ix('velocity_xy')] = np.hypot(dx/dt, dy/dt)
 
     def _convertMonoFields(self, prev_event, current_event):
-        if self.isValidSample(current_event):
-            self._convertPosToAngles(self, current_event)
+        mono_evt = list(current_event)
+        if self.isValidSample(mono_evt):
+            self._convertPosToAngles(mono_evt)
             if prev_event:
-                self._addVelocity(prev_event, current_event)
+                self._addVelocity(prev_event, mono_evt)
+        return mono_evt
 
     def _convertToMonoAveraged(self, prev_event, current_event):
         mono_evt=[]
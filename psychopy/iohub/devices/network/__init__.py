@@ -14,7 +14,7 @@ Distributed under the terms of the GNU General Public License
 
 import gevent
 import zmq.green as zmq
-import copy
+import numpy
 import msgpack
 try:
     import msgpack_numpy as m
@@ -50,13 +50,22 @@ class EventPublisher(Device):
     EVENT_CLASS_NAMES=[]    
     DEVICE_TYPE_ID=DeviceConstants.EVENTPUBLISHER
     DEVICE_LABEL = 'EVENTPUBLISHER'
-    __slots__=[e[0] for e in _newDataTypes]+['_zmq_context','_pub_socket','_sub_listener','_publishing_protocal','_sub_protocal']
+    __slots__=[e[0] for e in _newDataTypes]+['_zmq_context','_pub_socket','_sub_listener','_publishing_protocal','_sub_protocal',
+                                             '_batch_events','_batch_interval','_batch_size','_pending_batches','_batch_flush']
     def __init__(self, *args,**kwargs):
         self._pub_socket=None
+        self._pending_batches={}
+        self._batch_flush=None
         try:            
             Device.__init__(self,*args,**kwargs['dconfig'])
             device_config=self.getConfiguration()
             
+            # When batch_events is True, events of the same type are
+            # coalesced into a single published frame, sent once batch_size
+            # events are waiting or batch_interval sec. after the first one.
+            self._batch_events=device_config.get('batch_events',False)
+            self._batch_interval=device_config.get('batch_interval',0.002)
+            self._batch_size=device_config.get('batch_size',64)
             
             # setup publisher
             self._zmq_context = zmq.Context()
@@ -93,20 +102,54 @@ class EventPublisher(Device):
             #                 data[9] = delay, 
             #                 data[10] = filter_id, # always 0, not used currently
     
-            event_array=copy.deepcopy(e)
+            # Event arrays are flat, so a shallow copy is enough to leave
+            # the local event untouched.
+            event_array=list(e)
             event_array[0]=0
             event_array[1]=0
             event_array[2]=self.device_number
             event_array[3] = 0
             
+            category=EventConstants.getClass(e_id).__name__
+            if self._batch_events:
+                self._addToBatch(category,event_array)
+            else:
+                # send event to subscribers        
+                # 
+                self._pub_socket.send_multipart([category,self.pack(event_array)], 0)
 
-            # send event to subscribers        
-            # 
-            self._pub_socket.send_multipart([EventConstants.getClass(e_id).__name__,self.pack(event_array)], 0)
+    def _addToBatch(self,category,event_array):
+        batch=self._pending_batches.setdefault(category,[])
+        batch.append(event_array)
+        if len(batch)>=self._batch_size:
+            self._sendBatch(category)
+        elif self._batch_flush is None:
+            self._batch_flush=gevent.spawn_later(self._batch_interval,self._flushBatches)
+
+    def _sendBatch(self,category):
+        """
+        Publish the events waiting for the given category as one frame. The
+        frame holds a list of event arrays instead of a single event array;
+        RemoteEventSubscriber devices accept either form.
+        """
+        batch=self._pending_batches.pop(category,None)
+        if batch:
+            if len(batch)==1:
+                batch=batch[0]
+            self._pub_socket.send_multipart([category,self.pack(batch)], 0)
+
+    def _flushBatches(self):
+        self._batch_flush=None
+        for category in self._pending_batches.keys():
+            self._sendBatch(category)
  
     def _close(self):
+        if self._batch_flush is not None:
+            self._batch_flush.kill(block=False)
+            self._batch_flush=None
         if self._pub_socket is not None:
-            self._pub_socket.send_multipart([u'EXIT',''])
+            self._flushBatches()
+            self._pub_socket.send_multipart(['EXIT',''])
             self._pub_socket.close()
             self._pub_socket=None
             Device._close(self)
@@ -164,6 +207,7 @@ class RemoteEventSubscriber(Device):
     def __init__(self, *args,**kwargs):
         self._sub_socket=None
         self._time_sync_manager=None
+        self._time_sync_state=None
         try:
             Device.__init__(self,*args,**kwargs['dconfig'])
             device_config=self.getConfiguration()
@@ -215,36 +259,13 @@ class RemoteEventSubscriber(Device):
 
     def _poll(self):
         while self._time_sync_manager is None:
+            if self._sub_socket is None:
+                return
             gevent.sleep(0.5)
-        time_sync_manager=self._time_sync_manager
-        time_sync_state=self._time_sync_state
         self._running=True
         while self._running is True and self._time_sync_manager:
             try:
-                category,data=self._sub_socket.recv_multipart(0)
-                logged_time=Computer.currentSec()
-                if category == u'EXIT':
-                    self._running=False
-                    break
-                self.feed(data)
-                data=self.unpack()
-                network_delay=0.0
-
-                data[0]=0
-                data[1]=0
-                data[3]=Computer._getNextEventID() #set event id
-                network_delay=0.0
-                
-                if time_sync_manager:
-                    remote_logged_time=data[6]
-                    data[6]=logged_time #update logged time
-                    remote_hub_time=data[7]
-                    data[7]=time_sync_state.remote2LocalTime(remote_hub_time)
-                    data[8]=time_sync_state.getAccuracy()*2.0 
-                    network_delay=time_sync_state.local2RemoteTime(logged_time)-remote_logged_time
-                    data[9]+=network_delay
-
-                self._nativeEventCallback(data)
+                self._receiveEvents()
                 gevent.sleep(0)
             except zmq.ZMQError,z:
                 break
@@ -252,6 +273,67 @@ class RemoteEventSubscriber(Device):
                 printExceptionDetailsToStdErr()
             
         self._close()
+
+    def _receiveEvents(self):
+        """
+        Wait for the next published frame, then read every other frame that
+        is already queued on the socket, so a burst of remote events is
+        handled in a single wakeup. Returns the number of events received.
+        """
+        frames=[self._sub_socket.recv_multipart(0)]
+        while True:
+            try:
+                frames.append(self._sub_socket.recv_multipart(zmq.NOBLOCK))
+            except zmq.Again:
+                break
+        logged_time=Computer.currentSec()
+
+        # Format of received event data:
+        #                        
+        #                 data[0] = exp_id 
+        #                 data[1] = sess_id, 
+        #                 data[2] = device_id (EventPublisher device_number)
+        #                 data[3] = event_num, 
+        #                 data[4] = event type id 
+        #                 data[5] = device_time, 
+        #                 data[6] = logged_time, 
+        #                 data[7] = local ioHub time, 
+        #                 data[8] = confidence_interval, 
+        #                 data[9] = delay, 
+        #                 data[10] = filter_id
+        events=[]
+        for category,data in frames:
+            if category == u'EXIT':
+                self._running=False
+                break
+            self.feed(data)
+            data=self.unpack()
+            if data and isinstance(data[0],list):
+                # a batch of events published as one frame
+                events.extend(data)
+            else:
+                events.append(data)
+        if not events:
+            return 0
+
+        time_sync_state=self._time_sync_state
+        if time_sync_state is not None:
+            # the clock model is linear, so convert the whole batch at once
+            remote_times=numpy.asarray([(e[6],e[7]) for e in events],dtype=numpy.float64)
+            hub_times=time_sync_state.remote2LocalTime(remote_times[:,1]).tolist()
+            network_delays=(time_sync_state.local2RemoteTime(logged_time)-remote_times[:,0]).tolist()
+            accuracy=time_sync_state.getAccuracy()*2.0
+        for i,data in enumerate(events):
+            data[0]=0
+            data[1]=0
+            data[3]=Computer._getNextEventID() #set event id
+            if time_sync_state is not None:
+                data[6]=logged_time #update logged time
+                data[7]=hub_times[i]
+                data[8]=accuracy
+                data[9]+=network_delays[i]
+            self._nativeEventCallback(data)
+        return len(events)
             
     def _nativeEventCallback(self,native_event_data):
         if self.isReportingEvents():
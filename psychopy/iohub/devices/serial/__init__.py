@@ -17,6 +17,87 @@ import numpy as N
 getTime = Computer.getTime
 
 
+class SerialFrameParser(object):
+    """
+    Incremental framing engine used by the Serial device when the
+    event_parser preferences define a prefix, delimiter and / or fixed_length.
+
+    Received bytes are appended to one reusable bytearray, and every
+    complete frame found in the buffer is returned by each feed() call, so
+    a burst of frames read in a single poll is parsed in one pass. Bytes that
+    do not yet form a complete frame are kept for the next call.
+
+    If a delimiter is given, a frame ends at the delimiter; otherwise a
+    fixed_length frame ends after fixed_length bytes. When a prefix is
+    given, any bytes before it are discarded and the prefix is not
+    included in the frame data.
+    """
+    def __init__(self, prefix=None, delimiter=None, fixed_length=None):
+        self.prefix = prefix or None
+        self.delimiter = delimiter or None
+        self.fixed_length = fixed_length or None
+        self.buffer = bytearray()
+        self._prefix_found = self.prefix is None
+        self._scan_from = 0
+
+    def reset(self):
+        del self.buffer[:]
+        self._prefix_found = self.prefix is None
+        self._scan_from = 0
+
+    def feed(self, rx_data):
+        """
+        Add rx_data to the parser buffer and return a list of
+        (end_offset, frame_data) tuples for each complete frame, in the
+        order received. end_offset is the number of bytes of rx_data read up
+        to and including the last byte of the frame, and can be used to
+        estimate when each frame of a burst arrived.
+        """
+        buf = self.buffer
+        carry = len(buf)
+        buf.extend(rx_data)
+        buf_len = len(buf)
+        prefix = self.prefix
+        delimiter = self.delimiter
+        fixed_length = self.fixed_length
+        frames = []
+        pos = 0
+        while pos < buf_len:
+            if self._prefix_found is False:
+                pindex = buf.find(prefix, pos)
+                if pindex < 0:
+                    # keep any partial prefix at the end of the buffer
+                    pos = max(pos, buf_len-len(prefix)+1)
+                    break
+                pos = pindex+len(prefix)
+                self._prefix_found = True
+                self._scan_from = pos
+
+            if delimiter:
+                dindex = buf.find(delimiter, max(pos, self._scan_from))
+                if dindex < 0:
+                    self._scan_from = max(pos, buf_len-len(delimiter)+1)
+                    break
+                end = dindex+len(delimiter)
+                frames.append((end-carry, str(buf[pos:dindex])))
+            elif fixed_length:
+                end = pos+fixed_length
+                if end > buf_len:
+                    break
+                frames.append((end-carry, str(buf[pos:end])))
+            else:
+                break
+
+            pos = end
+            self._scan_from = end
+            self._prefix_found = prefix is None
+
+        if pos:
+            del buf[:pos]
+            self._scan_from = max(0, self._scan_from-pos)
+        return frames
+
+
 class Serial(Device):
     """
     A general purpose serial input interface device. Configuration options
@@ -53,7 +134,8 @@ class Serial(Device):
         'port', 'baud', 'bytesize', 'parity', 'stopbits', '_serial',
         '_timeout', '_rx_buffer', '_parser_config', '_parser_state',
         '_event_count', '_byte_diff_mode', '_custom_parser',
-        '_custom_parser_kwargs'
+        '_custom_parser_kwargs', '_frame_parser', '_byte_time',
+        '_poll_interval', '_rx_start_time'
     ]
     __slots__ = [e for e in _serial_slots]
 
@@ -75,9 +157,16 @@ class Serial(Device):
         self.bytesize = self._bytesizes[self.getConfiguration().get('bytesize')]
         self.parity = self._parities[self.getConfiguration().get('parity')]
         self.stopbits = self._stopbits[self.getConfiguration().get('stopbits')]
+        # time taken to receive one byte: start bit, data, parity, stop bits
+        self._byte_time = (1+self.bytesize+(self.parity != serial.PARITY_NONE)
+                           + self.stopbits)/float(self.baud)
+        self._poll_interval = self.getConfiguration().get(
+            'device_timer', {}).get('interval', 0.001)
+        self._rx_start_time = 0.0
 
         self._parser_config = self.getConfiguration().get('event_parser')
         self._byte_diff_mode = None
+        self._frame_parser = None
         self._custom_parser = None
         self._custom_parser_kwargs = {}
         custom_parser_func_str = self._parser_config.get('parser_function')
@@ -136,7 +225,6 @@ class Serial(Device):
             self._rx_buffer = None
         else:
             self._resetParserState()
-            self._rx_buffer = ''
 
         self._event_count = 0
         self._timeout = None
@@ -175,43 +263,20 @@ class Serial(Device):
                 self._parser_state = dict()
                 return
 
-            self._parser_state = dict(parsed_event='')
-            parser_state = self._parser_state
+            if self._frame_parser:
+                self._frame_parser.reset()
+                return
 
             fixed_length = parser_config.setdefault('fixed_length',None)
-            if fixed_length:
-                parser_state['bytes_needed'] = fixed_length
-            else:
-                parser_state['bytes_needed'] = 0
-
-            prefix = parser_config.setdefault('prefix', None)
-            if prefix == r'\n':
-               parser_config['prefix'] = '\n'
-            elif prefix == r'\t':
-               parser_config['prefix'] = '\t'
-            elif prefix == r'\r':
-               parser_config['prefix'] = '\r'
-            elif prefix == r'\r\n':
-               parser_config['prefix'] = '\r\n'
-
-            if prefix:
-                parser_state['prefix_found'] = False
-            else:
-                parser_state['prefix_found'] = True
-
-            delimiter = parser_config.setdefault('delimiter', None)
-            if delimiter == r'\n':
-               parser_config['delimiter'] = '\n'
-            elif delimiter  == r'\t':
-               parser_config['delimiter'] = '\t'
-            elif delimiter == r'\r':
-               parser_config['delimiter'] = '\r'
-            elif delimiter == r'\r\n':
-               parser_config['delimiter'] = '\r\n'
-            if delimiter:
-                parser_state['delimiter_found'] = False
-            else:
-                parser_state['delimiter_found'] = True
+            prefix = self._unescapeParserString(parser_config.setdefault('prefix', None))
+            delimiter = self._unescapeParserString(parser_config.setdefault('delimiter', None))
+            parser_config['prefix'] = prefix
+            parser_config['delimiter'] = delimiter
+            self._frame_parser = SerialFrameParser(prefix, delimiter, fixed_length)
+
+    @staticmethod
+    def _unescapeParserString(s):
+        return {r'\n': '\n', r'\t': '\t', r'\r': '\r', r'\r\n': '\r\n'}.get(s, s)
 
     def setConnectionState(self, enable):
         if enable is True:
@@ -256,8 +321,8 @@ class Serial(Device):
             self.flushInput()
         if self._byte_diff_mode:
             self._rx_buffer = None
-        else:
-            self._rx_buffer = ''
+        elif self._frame_parser:
+            self._frame_parser.reset()
         self._event_count = 0
         return Device.enableEventReporting(self, enabled)
 
@@ -282,8 +347,8 @@ class Serial(Device):
           self._serial.read(inBytes)
         if self._byte_diff_mode:
             self._rx_buffer = None
-        else:
-            self._rx_buffer = ''
+        elif self._frame_parser:
+            self._frame_parser.reset()
 
     def flushInput(self):
         self._serial.flushInput()
@@ -299,6 +364,16 @@ class Serial(Device):
     def read(self):
         return self._serial.read(self._serial.inWaiting())
 
+    def _getPollFileDescriptor(self):
+        # pyserial only provides fileno() for posix ports.
+        if self._serial is not None and hasattr(self._serial, 'fileno'):
+            return self._serial.fileno()
+        return None
+
+    def _isPollFileDescriptorActive(self):
+        # _poll() leaves received bytes unread while either is False.
+        return self.isReportingEvents() and self.isConnected()
+
     def closeSerial(self):
         if self._serial:
             self._serial.close()
@@ -319,7 +394,7 @@ class Serial(Device):
 
     def _createSerialEvent(self, logged_time, read_time, event_data):
         self._event_count += 1
-        confidence_interval = read_time - self._last_poll_time
+        confidence_interval = read_time - self._rx_start_time
         elist=[0, 0, 0, Computer._getNextEventID(),
                EventConstants.SERIAL_INPUT,
                read_time,
@@ -334,9 +409,9 @@ class Serial(Device):
         self._addNativeEventToBuffer(elist)
         self._resetParserState()
 
-    def _createMultiByteSerialEvent(self, logged_time, read_time):
+    def _createMultiByteSerialEvent(self, logged_time, read_time, event_data):
         self._event_count += 1
-        confidence_interval = read_time - self._last_poll_time
+        confidence_interval = read_time - self._rx_start_time
         elist=[0, 0, 0, Computer._getNextEventID(),
                EventConstants.SERIAL_INPUT,
                read_time,
@@ -346,14 +421,13 @@ class Serial(Device):
                0.0,
                0,
                self.port,
-               self._parser_state['parsed_event']
+               event_data
             ]
         self._addNativeEventToBuffer(elist)
-        self._resetParserState()
 
     def _createByteChangeSerialEvent(self, logged_time, read_time, prev_byte, new_byte):
         self._event_count += 1
-        confidence_interval = read_time - self._last_poll_time
+        confidence_interval = read_time - self._rx_start_time
         elist=[0, 0, 0, Computer._getNextEventID(),
                EventConstants.SERIAL_BYTE_CHANGE,
                read_time,
@@ -368,6 +442,28 @@ class Serial(Device):
             ]
         self._addNativeEventToBuffer(elist)
 
+    def _setReadStartTime(self, read_time, rx_length):
+        # The earliest time that the rx_length bytes returned by a read() at
+        # read_time can have started to arrive: not before the previous
+        # poll, and, as the device is polled as soon as its fd is readable
+        # or at least every device_timer interval, not before the time the
+        # bytes took to send plus one poll interval. The second limit matters
+        # after an idle period, when the previous poll may be seconds ago.
+        start_time = read_time-(rx_length*self._byte_time+self._poll_interval)
+        if start_time < self._last_poll_time:
+            start_time = self._last_poll_time
+        self._rx_start_time = start_time
+
+    def _interpolateReadTimes(self, read_time, end_offsets, rx_length):
+        # All bytes returned by one read() arrived after _rx_start_time and
+        # before read_time. Spread the time stamps of the events in a burst
+        # across that period, based on where in the rx data each event
+        # ended, so the last event of the burst gets read_time.
+        period = read_time - self._rx_start_time
+        if rx_length <= 0 or period <= 0:
+            return [read_time]*len(end_offsets)
+        return (read_time-period*(1.0-N.asarray(end_offsets, dtype=N.float64)/rx_length)).tolist()
+
     def _poll(self):
         try:
             logged_time = getTime()
@@ -381,6 +477,7 @@ class Serial(Device):
                     newrx = self.read()
                     read_time = getTime()
                     if newrx:
+                        self._setReadStartTime(read_time, len(newrx))
                         try:
                             serial_events = self._custom_parser(read_time, newrx,
                                                             parser_state,
@@ -402,63 +499,40 @@ class Serial(Device):
 
                 elif self._byte_diff_mode:
                     rx = self.read()
-
-                    read_time = getTime()
-                    for c in rx:
-                        if self._rx_buffer is not None and c != self._rx_buffer:
-                            self._createByteChangeSerialEvent(logged_time,
-                                                              read_time,
-                                                              self._rx_buffer,
-                                                              c)
-                        self._rx_buffer = c
-                else:
-                    parser_state = self._parser_state
-                    rx_buffer = self._rx_buffer + self.read()
                     read_time = getTime()
-                    prefix = self._parser_config['prefix']
-                    delimiter = self._parser_config['delimiter']
-
-                    if parser_state['prefix_found'] is False:
-                        if prefix and rx_buffer and len(rx_buffer) >= len(prefix):
-                            pindex = rx_buffer.find(prefix)
-                            if pindex >= 0:
-                                rx_buffer = rx_buffer[pindex+len(prefix):]
-                                parser_state['prefix_found'] = True
-
-                    if parser_state['delimiter_found'] is False:
-                        if delimiter and self._rx_buffer and len(rx_buffer) >= len(delimiter):
-                            dindex = rx_buffer.find(delimiter)
-                            if dindex >= 0:
-                                parser_state['delimiter_found'] = True
-                                sindex = dindex
-                                eindex = dindex+len(delimiter)
-                                parser_state['parsed_event'] += rx_buffer[:sindex]
-                                if len(rx_buffer) > eindex:
-                                    rx_buffer = rx_buffer[eindex:]
-                                else:
-                                    rx_buffer = ''
-                                self._rx_buffer = rx_buffer
-                                self._createMultiByteSerialEvent(logged_time, read_time)
-                                return True
-
-                    if parser_state['bytes_needed'] > 0 and rx_buffer:
-                        rxlen = len(rx_buffer)
-                        #takebytes = rxlen - parser_state['bytes_needed']
-                        if rxlen > parser_state['bytes_needed']:
-                            parser_state['parsed_event'] += rx_buffer[:parser_state['bytes_needed']]
-                            parser_state['bytes_needed'] = 0
-                            rx_buffer = rx_buffer[parser_state['bytes_needed']:]
+                    if rx:
+                        self._setReadStartTime(read_time, len(rx))
+                        # Compare every received byte with the byte before it
+                        # in one pass; the last byte of the previous read
+                        # (if any) is prepended so changes across reads are
+                        # detected.
+                        rx_bytes = N.frombuffer(rx, dtype=N.uint8)
+                        if self._rx_buffer is None:
+                            byte_seq = rx_bytes
                         else:
-                            parser_state['parsed_event'] += rx_buffer
-                            parser_state['bytes_needed'] -= rxlen
-                            rx_buffer = ''
-
-                        if parser_state['bytes_needed'] == 0:
-                                self._rx_buffer = rx_buffer
-                                self._createMultiByteSerialEvent(logged_time, read_time)
-                                return True
-
-                    self._rx_buffer = rx_buffer
+                            byte_seq = N.empty(len(rx_bytes)+1, dtype=N.uint8)
+                            byte_seq[0] = ord(self._rx_buffer)
+                            byte_seq[1:] = rx_bytes
+                        changed = N.flatnonzero(byte_seq[1:] != byte_seq[:-1])
+                        if len(changed):
+                            end_offsets = changed+(len(rx_bytes)-len(byte_seq)+2)
+                            evt_times = self._interpolateReadTimes(read_time, end_offsets, len(rx_bytes))
+                            for ci, evt_time in zip(changed.tolist(), evt_times):
+                                self._createByteChangeSerialEvent(logged_time,
+                                                                  evt_time,
+                                                                  chr(byte_seq[ci]),
+                                                                  chr(byte_seq[ci+1]))
+                        self._rx_buffer = rx[-1]
+                elif self._frame_parser:
+                    rx = self.read()
+                    read_time = getTime()
+                    if rx:
+                        self._setReadStartTime(read_time, len(rx))
+                        frames = self._frame_parser.feed(rx)
+                        if frames:
+                            evt_times = self._interpolateReadTimes(read_time, [f[0] for f in frames], len(rx))
+                            for (end_offset, frame_data), evt_time in zip(frames, evt_times):
+                                self._createMultiByteSerialEvent(logged_time, evt_time, frame_data)
             else:
                 read_time = logged_time
             self._last_poll_time = read_time
@@ -682,7 +756,7 @@ class Pstbox(Serial):
     def _createByteChangeSerialEvent(self, logged_time, read_time,
                                      prev_byte, new_byte):
         self._event_count += 1
-        confidence_interval = read_time - self._last_poll_time
+        confidence_interval = read_time - self._rx_start_time
 
         prev_byte = ord(prev_byte)
         new_byte = ord(new_byte)
@@ -53,10 +53,7 @@ def run(rootScriptPathDir,configFilePath):
             gevent.spawn(s.pumpMsgTasklet, s.config.get('windows_msgpump_interval', 0.00375))
 
         if hasattr(gevent,'run'):
-            for m in s.deviceMonitors:
-                m.start()
-    
-            gevent.spawn(s.processEventsTasklet, 0.01)
+            s.deviceScheduler.start()
 
             sys.stdout.write("IOHUB_READY\n\r\n\r")
 
@@ -72,10 +69,8 @@ def run(rootScriptPathDir,configFilePath):
             if Computer.system == 'win32':
                 glets.append(gevent.spawn(s.pumpMsgTasklet, s.config.get('windows_msgpump_interval', 0.00375)))
 
-            for m in s.deviceMonitors:
-                m.start()
-                glets.append(m)
-            glets.append(gevent.spawn(s.processEventsTasklet,0.01))
+            s.deviceScheduler.start()
+            glets.append(s.deviceScheduler)
     
             sys.stdout.write("IOHUB_READY\n\r\n\r")
             sys.stdout.flush()
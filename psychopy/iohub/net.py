@@ -11,6 +11,7 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 """
 
 from psychopy.iohub import Computer
+import numpy
 import msgpack
 try:
     import msgpack_numpy as m
@@ -206,21 +207,8 @@ class ioHubTimeGreenSyncManager(Greenlet):
         try:
             if self._sync_socket:
                 min_delay, min_local_time, min_remote_time=self._sync_socket.sync()     
-                sync_state_target=self.sync_state_target
-                sync_state_target.RTTs.append(min_delay)
-                sync_state_target.L_times.append(min_local_time)
-                sync_state_target.R_times.append(min_remote_time)
-                
-                if calc_drift_and_offset is True:
-                    l1=sync_state_target.L_times[-2]
-                    l2=sync_state_target.L_times[-1]
-                    r1=sync_state_target.R_times[-2]
-                    r2=sync_state_target.R_times[-1]
-                    self.sync_state_target.drifts.append((r2-r1)/(l2-l1))
-        
-                    l=sync_state_target.L_times[-1]
-                    r=sync_state_target.R_times[-1]
-                    self.sync_state_target.offsets=(r-l)
+                self.sync_state_target.addSample(min_delay,min_local_time,min_remote_time,
+                                                 update_model=calc_drift_and_offset)
                 return True
         except Exception, e:
             return False            
@@ -248,21 +236,8 @@ class ioHubTimeSyncManager(object):
     def sync(self,calc_drift_and_offset=True):
         if self._sync_socket:
             min_delay, min_local_time, min_remote_time=self._sync_socket.sync()     
-            sync_state_target=self.sync_state_target
-            sync_state_target.RTTs.append(min_delay)
-            sync_state_target.L_times.append(min_local_time)
-            sync_state_target.R_times.append(min_remote_time)
-            
-            if calc_drift_and_offset is True:
-                l1=sync_state_target.L_times[-2]
-                l2=sync_state_target.L_times[-1]
-                r1=sync_state_target.R_times[-2]
-                r2=sync_state_target.R_times[-1]
-                self.sync_state_target.drifts.append((r2-r1)/(l2-l1))
-    
-                l=sync_state_target.L_times[-1]
-                r=sync_state_target.R_times[-1]
-                self.sync_state_target.offsets=(r-l)
+            self.sync_state_target.addSample(min_delay,min_local_time,min_remote_time,
+                                             update_model=calc_drift_and_offset)
 
     def close(self):           
         if self._sync_socket:        
@@ -275,35 +250,103 @@ class ioHubTimeSyncManager(object):
 
 class TimeSyncState(object):
     """
-    Container class used by an ioHubSyncManager to hold the data necessary to
-    calculate the current time base offset and drift between an ioHub Server
-    and a ioHubRemoteEventSubscriber client.
+    Container class used by an ioHubSyncManager to hold the time sync samples
+    taken with a remote ioHub Server, and the model fitted to them that is used
+    to convert between the local and remote time bases.
+
+    Each sample is the local and remote time of the sync request with the
+    shortest round trip time (RTT) in a batch. The model,
+    remote = drift * local + offset, is refitted to the last window_size
+    samples each time one is added:
+
+    * samples with an RTT more than rtt_rejection robust standard deviations
+      above the median RTT are not used, as their network delay may have
+      been far from symmetric.
+    * drift is the median of the slopes between every pair of the samples
+      used (the Theil-Sen estimate), and the offset the median intercept,
+      so that a few bad samples do not move the model.
+
+    Converting a time only evaluates the fitted model, so is O(1).
     """
-    RTTs=RingBuffer(10)
-    L_times=RingBuffer(10)
-    R_times=RingBuffer(10)
-    drifts=RingBuffer(20)
-    offsets=RingBuffer(20)
-    
+    def __init__(self,window_size=32,rtt_rejection=3.0):
+        self.rtt_rejection=rtt_rejection
+        self.RTTs=RingBuffer(window_size,dtype=numpy.float64)
+        self.L_times=RingBuffer(window_size,dtype=numpy.float64)
+        self.R_times=RingBuffer(window_size,dtype=numpy.float64)
+        # the history of fitted models
+        self.drifts=RingBuffer(20,dtype=numpy.float64)
+        self.offsets=RingBuffer(20,dtype=numpy.float64)
+
+        # remote = drift * (local - local_ref) + remote_ref; times near the
+        # newest sample keep the fit well conditioned.
+        self._drift=1.0
+        self._local_ref=0.0
+        self._remote_ref=0.0
+        self._accuracy=numpy.nan
+
+    def addSample(self,rtt,local_time,remote_time,update_model=True):
+        """
+        Add a time sync sample and, unless update_model is False, refit the
+        model to the samples in the window.
+        """
+        self.RTTs.append(rtt)
+        self.L_times.append(local_time)
+        self.R_times.append(remote_time)
+        if update_model:
+            self._fitModel()
+
+    def _fitModel(self):
+        rtts=self.RTTs.getElements()
+        rtt_median=numpy.median(rtts)
+        rtt_spread=1.4826*numpy.median(numpy.abs(rtts-rtt_median))
+        used=rtts<=rtt_median+self.rtt_rejection*rtt_spread
+
+        rtts=rtts[used]
+        local_ref=self.L_times[-1]
+        locals_=self.L_times.getElements()[used]-local_ref
+        remotes=self.R_times.getElements()[used]
+        remote_ref=remotes[-1]
+        remotes=remotes-remote_ref
+
+        if len(locals_)>1:
+            i,j=numpy.triu_indices(len(locals_),1)
+            dl=locals_[j]-locals_[i]
+            distinct=dl!=0
+            if distinct.any():
+                self._drift=numpy.median((remotes[j]-remotes[i])[distinct]/dl[distinct])
+        residuals=remotes-self._drift*locals_
+        intercept=numpy.median(residuals)
+        residuals-=intercept
+
+        self._local_ref=local_ref
+        self._remote_ref=remote_ref+intercept
+        # each sample is only known to within half its RTT; add the spread
+        # of the samples about the model.
+        self._accuracy=(numpy.median(rtts)/2.0+
+                        3*1.4826*numpy.median(numpy.abs(residuals)))
+        self.drifts.append(self._drift)
+        self.offsets.append(self.getOffset())
+
     def getDrift(self):
         """
         Current drift between two time bases.
         """
-        return self.drifts.mean()
+        return self._drift
         
     def getOffset(self):
         """
         Current offset between two time bases.
         """
-        return self.offsets.mean()
+        return self._remote_ref-self._drift*self._local_ref
 
     def getAccuracy(self):
         """
-        Current accuracy of the time syncronization, as calculated as the 
-        average of the last 10 round trip time sync request - response delays
-        divided by two.
+        Current accuracy of the time syncronization: a bound on the error
+        of a converted time, calculated as half the median round trip time
+        of the samples used plus three robust standard deviations of their
+        remote times about the model. nan until a sample has been added.
         """
-        return self.RTTs.mean()/2.0
+        return self._accuracy
         
     def local2RemoteTime(self,local_time=None):
         """
@@ -312,11 +355,11 @@ class TimeSyncState(object):
         """        
         if local_time is None:
             local_time=Computer.currentSec()
-        return self.getDrift()*local_time+self.getOffset()
+        return self._drift*(local_time-self._local_ref)+self._remote_ref
           
     def remote2LocalTime(self,remote_time):
         """
         Converts a remote computer time (sec.msec format) to the corresponding local
         time, using the current offset and drift measures.       
         """
-        return (remote_time-self.getOffset())/self.getDrift()
\ No newline at end of file
+        return (remote_time-self._remote_ref)/self._drift+self._local_ref
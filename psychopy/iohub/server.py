@@ -13,15 +13,17 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 import gevent
 from gevent.server import DatagramServer
 from gevent import Greenlet
+from gevent.select import select as gselect
 import os,sys
-from operator import itemgetter
 from collections import deque
+from heapq import heappush, heappop
 import psychopy.iohub
 from psychopy.iohub import OrderedDict, convertCamelToSnake, IO_HUB_DIRECTORY
 from psychopy.iohub import load, dump, Loader, Dumper
 from psychopy.iohub import print2err, printExceptionDetailsToStdErr, ioHubError
 from psychopy.iohub import DeviceConstants, EventConstants
 from psychopy.iohub import Computer, DeviceEvent, import_device
+from psychopy.iohub.devices import DeviceEventBuffer
 from psychopy.iohub.devices.deviceConfigValidation import validateDeviceConfiguration
 currentSec= Computer.currentSec
 
@@ -41,6 +43,17 @@ import psutil
 
 MAX_PACKET_SIZE = 64*1024
 
+class TicketReplyTo(object):
+    """
+    The reply address of a request sent by an ioHubConnection in async mode.
+    The reply is tagged with the ticket of the request, so the client can
+    match it to the request when it has several outstanding.
+    """
+    __slots__=['ticket','address']
+    def __init__(self,ticket,address):
+        self.ticket=ticket
+        self.address=address
+
 class udpServer(DatagramServer):
     def __init__(self,ioHubServer,address,coder='msgpack'):
         global MAX_PACKET_SIZE
@@ -66,6 +79,9 @@ class udpServer(DatagramServer):
         self.feed(request)
         request = self.unpack()   
         request_type= request.pop(0)
+        if request_type == 'TICKET_REQ':
+            replyTo=TicketReplyTo(request.pop(0),replyTo)
+            request_type= request.pop(0)
         if request_type == 'SYNC_REQ':
             self.sendResponse(['SYNC_REPLY',currentSec()],replyTo)  
             return True        
@@ -136,11 +152,10 @@ class udpServer(DatagramServer):
     def handleGetEvents(self,replyTo):
         try:
             self.iohub.processDeviceEvents()
-            currentEvents=list(self.iohub.eventBuffer)
+            currentEvents=self.iohub.eventBuffer.getEvents()
             self.iohub.eventBuffer.clear()
 
             if len(currentEvents)>0:
-                currentEvents=sorted(currentEvents, key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
                 self.sendResponse(('GET_EVENTS_RESULT',currentEvents),replyTo)
             else:
                 self.sendResponse(('GET_EVENTS_RESULT', None),replyTo)
@@ -273,6 +288,11 @@ class udpServer(DatagramServer):
             return False
             
     def sendResponse(self,data,address):
+        ticket=None
+        if isinstance(address,TicketReplyTo):
+            ticket=address.ticket
+            data=('TICKET_REPLY',ticket,data)
+            address=address.address
         packet_data=None
         try:
             num_packets = -1
@@ -314,7 +334,11 @@ class udpServer(DatagramServer):
 
             print2err("IOHUB_SERVER_RESPONSE_ERROR")
             printExceptionDetailsToStdErr()
-            packet_data=self.pack('IOHUB_SERVER_RESPONSE_ERROR')
+            error_reply='IOHUB_SERVER_RESPONSE_ERROR'
+            if ticket is not None:
+                # so the client can give the error to the request's ticket
+                error_reply=('TICKET_REPLY',ticket,error_reply)
+            packet_data=self.pack(error_reply)
             self.socket.sendto(packet_data,address)
             
     def setExperimentInfo(self,experimentInfoList):
@@ -412,6 +436,9 @@ class udpServer(DatagramServer):
         """
         return Computer.getPriority()
 
+    def getDevicePollStatistics(self):
+        return self.iohub.deviceScheduler.getStatistics()
+
     def getProcessAffinity(self):
         return Computer.getCurrentProcessAffinity()
 
@@ -435,27 +462,189 @@ class udpServer(DatagramServer):
             printExceptionDetailsToStdErr()
             sys.exit(1)
 
-class DeviceMonitor(Greenlet):
-    def __init__(self, device,sleep_interval):
-        Greenlet.__init__(self)
+class DeviceMonitor(object):
+    """
+    Scheduling entry for a single polled device. DeviceMonitor instances are
+    no longer greenlets themselves; every monitor registered with the
+    ioServer is driven by the one DeviceScheduler greenlet, which also keeps
+    the poll latency and busy time statistics stored here.
+    """
+    def __init__(self, device, sleep_interval, fileno=None):
         self.device = device
-        self.sleep_interval=sleep_interval
-        self.running=False
-        
+        self.sleep_interval = sleep_interval
+        self.fileno = fileno
+        # True while a fileno device is polled on its timer instead
+        self.fd_suspended = False
+        self.running = True
+        self.poll_count = 0
+        self.busy_time = 0.0
+        self.max_busy_time = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_poll_time = 0.0
+
+    def _poll(self, scheduled_time):
+        stime = Computer.currentSec()
+        latency = stime - scheduled_time
+        self.device._poll()
+        etime = Computer.currentSec()
+        busy = etime - stime
+        self.poll_count += 1
+        self.busy_time += busy
+        self.total_latency += latency
+        if busy > self.max_busy_time:
+            self.max_busy_time = busy
+        if latency > self.max_latency:
+            self.max_latency = latency
+        self.last_poll_time = stime
+        return etime
+
+    def getStatistics(self):
+        pcount = self.poll_count or 1
+        return dict(device=self.device.__class__.__name__,
+                    mode=('fd' if self.fileno is not None and
+                          not self.fd_suspended else 'timer'),
+                    interval=self.sleep_interval,
+                    poll_count=self.poll_count,
+                    busy_time=self.busy_time,
+                    mean_busy_time=self.busy_time/pcount,
+                    max_busy_time=self.max_busy_time,
+                    mean_latency=self.total_latency/pcount,
+                    max_latency=self.max_latency)
+
+    def __del__(self):
+        self.device = None
+
+
+class DeviceScheduler(Greenlet):
+    """
+    Single greenlet that drives every DeviceMonitor of the ioServer.
+
+    Devices whose native interface exposes a file descriptor (see
+    Device._getPollFileDescriptor) are multiplexed through gevent's select,
+    so the scheduler wakes as soon as data arrives instead of sleeping a full
+    device_timer interval. All other monitors are kept on a shared deadline
+    heap, so devices that are due at the same time are polled in the same
+    wakeup rather than each greenlet waking on its own timer.
+
+    While a device's _isPollFileDescriptorActive() is False (its _poll()
+    would leave the descriptor's data unread, so select would keep returning
+    at once) the monitor is moved to the deadline heap, and back again once
+    the device is reading its descriptor.
+
+    Any monitor that has been polled is followed by one call to
+    the ioServer's processDeviceEvents(), so new native events reach the
+    event buffers within the same wakeup.
+    """
+    def __init__(self, iohub, process_events_interval=0.01):
+        Greenlet.__init__(self)
+        self.iohub = iohub
+        self.running = False
+        self.process_events_interval = process_events_interval
+        self._timer_heap = []
+        self._fd_monitors = {}
+        self._seq = 0
+
+    def addMonitor(self, monitor):
+        if (monitor.fileno is not None and
+                monitor.device._isPollFileDescriptorActive()):
+            monitor.fd_suspended = False
+            self._fd_monitors[monitor.fileno] = monitor
+        else:
+            monitor.fd_suspended = monitor.fileno is not None
+            self._seq += 1
+            heappush(self._timer_heap,
+                     (currentSec()+monitor.sleep_interval, self._seq, monitor))
+        return monitor
+
+    def removeMonitor(self, monitor):
+        monitor.running = False
+        if monitor.fileno is not None:
+            self._fd_monitors.pop(monitor.fileno, None)
+
+    def _moveToTimerHeap(self, monitor):
+        # Fallback used when select() reports a bad descriptor.
+        print2err("DeviceScheduler: fd polling failed for ",
+                  monitor.device.__class__.__name__,
+                  ", using device_timer interval instead.")
+        self._fd_monitors.pop(monitor.fileno, None)
+        monitor.fileno = None
+        self.addMonitor(monitor)
+
+    def _suspendFdPolling(self, monitor):
+        # The device will not read its descriptor for now, so poll it on
+        # its timer until it does.
+        self._fd_monitors.pop(monitor.fileno, None)
+        self.addMonitor(monitor)
+
+    def getStatistics(self):
+        monitors = [m for _t, _s, m in self._timer_heap if m.running]
+        monitors.extend(self._fd_monitors.values())
+        return [m.getStatistics() for m in monitors]
+
     def _run(self):
         self.running = True
-        ctime=Computer.currentSec
+        ctime = currentSec
+        timer_heap = self._timer_heap
+        fd_monitors = self._fd_monitors
+        next_proc_time = ctime()+self.process_events_interval
         while self.running is True:
-            stime=ctime()
-            self.device._poll()
-            i=self.sleep_interval-(ctime()-stime)
-            if i > 0.0:
-                gevent.sleep(i)
+            now = ctime()
+            deadline = next_proc_time
+            if timer_heap and timer_heap[0][0] < deadline:
+                deadline = timer_heap[0][0]
+            timeout = max(0.0, deadline-now)
+
+            polled = False
+            if fd_monitors:
+                try:
+                    ready = gselect(fd_monitors.keys(), [], [], timeout)[0]
+                except Exception:
+                    ready = []
+                    for fd, m in fd_monitors.items():
+                        try:
+                            os.fstat(fd)
+                        except OSError:
+                            self._moveToTimerHeap(m)
+                wake = ctime()
+                for fd in ready:
+                    m = fd_monitors.get(fd)
+                    if m is not None and m.running is True:
+                        m._poll(wake)
+                        polled = True
+                        if not m.device._isPollFileDescriptorActive():
+                            self._suspendFdPolling(m)
+            elif timeout > 0.0:
+                gevent.sleep(timeout)
             else:
                 gevent.sleep(0.0)
-                
+
+            now = ctime()
+            while timer_heap and timer_heap[0][0] <= now:
+                due_time, seq, m = heappop(timer_heap)
+                if m.running is False:
+                    continue
+                now = m._poll(due_time)
+                polled = True
+                if (m.fd_suspended and
+                        m.device._isPollFileDescriptorActive()):
+                    self.addMonitor(m)
+                    continue
+                next_due = due_time+m.sleep_interval
+                if next_due <= now:
+                    next_due = now+m.sleep_interval
+                heappush(timer_heap, (next_due, seq, m))
+
+            if polled or now >= next_proc_time:
+                self.iohub.processDeviceEvents()
+                if now >= next_proc_time:
+                    next_proc_time = now+self.process_events_interval
+            if not polled and timeout <= 0.0:
+                # Yield so the UDP server greenlet is never starved.
+                gevent.sleep(0.0)
+
     def __del__(self):
-        self.device = None
+        self.iohub = None
 
 
 class ioServer(object):
@@ -474,13 +663,15 @@ class ioServer(object):
         self.config=config
         self.devices=[]
         self.deviceMonitors=[]
+        self.deviceScheduler=DeviceScheduler(self)
         self.sessionInfoDict=None
         self.experimentInfoList=None
         self.filterLookupByInput={}
         self.filterLookupByOutput={}
         self.filterLookupByName={}  
         self._hookDevice=None
-        ioServer.eventBuffer=deque(maxlen=config.get('global_event_buffer',2048))
+        ioServer.eventBuffer=DeviceEventBuffer(config.get('global_event_buffer',2048),
+                                               shared_length=True)
 
         self._running=True
         
@@ -705,15 +896,13 @@ class ioServer(object):
                     
                 if  device_class_name == 'Mouse' and 'Mouse' not in self._hookDevice:
                     #print2err("Hooking OSX Mouse.....")
-                    mouseHookMonitor=DeviceMonitor(deviceDict['Mouse'],0.004)
-                    self.deviceMonitors.append(mouseHookMonitor)
+                    self.addDeviceMonitor(deviceDict['Mouse'],0.004)
                     deviceDict['Mouse']._CGEventTapEnable(deviceDict['Mouse']._tap, True)
                     self._hookDevice.append('Mouse')
                     #print2err("Done Hooking OSX Mouse.....")
                 if device_class_name == 'Keyboard'  and 'Keyboard' not in self._hookDevice:
                     #print2err("Hooking OSX Keyboard.....")
-                    kbHookMonitor=DeviceMonitor(deviceDict['Keyboard'],0.004)
-                    self.deviceMonitors.append(kbHookMonitor)
+                    self.addDeviceMonitor(deviceDict['Keyboard'],0.004)
                     deviceDict['Keyboard']._CGEventTapEnable(deviceDict['Keyboard']._tap, True)
                     self._hookDevice.append('Keyboard')
                     #print2err("DONE Hooking OSX Keyboard.....")
@@ -789,8 +978,7 @@ class ioServer(object):
             if 'device_timer' in device_config:
                 interval = device_config['device_timer']['interval']
                 self.log("%s has requested a timer with period %.5f"%(device_class_name, interval))
-                dPoller=DeviceMonitor(deviceInstance,interval)
-                self.deviceMonitors.append(dPoller)
+                self.addDeviceMonitor(deviceInstance,interval)
 
             monitoringEventIDs=[]
             monitor_events_list=device_config.get('monitor_event_types',[])
@@ -816,6 +1004,19 @@ class ioServer(object):
             return deviceInstance,device_config,monitoringEventIDs,event_classes
 
 
+    def addDeviceMonitor(self, device, interval):
+        fileno = None
+        try:
+            fileno = device._getPollFileDescriptor()
+        except Exception:
+            printExceptionDetailsToStdErr()
+        if fileno is not None:
+            self.log("%s will be polled when its file descriptor %d is readable"%(device.__class__.__name__, fileno))
+        monitor=DeviceMonitor(device, interval, fileno)
+        self.deviceMonitors.append(monitor)
+        self.deviceScheduler.addMonitor(monitor)
+        return monitor
+
     def log(self,text,level=None):
         try:
             log_time=currentSec()
@@ -843,13 +1044,6 @@ class ioServer(object):
             pytablesfile.flush()
             pytablesfile.close()
             
-    def processEventsTasklet(self,sleep_interval):
-        while self._running:
-            stime=Computer.getTime()
-            self.processDeviceEvents()
-            dur = sleep_interval - (Computer.getTime()-stime)
-            gevent.sleep(max(0.0, dur))
-
     def processDeviceEvents(self):
         for device in self.devices:
             try:
@@ -863,14 +1057,10 @@ class ioServer(object):
                             l._handleEvent(e)
 
 
-                filtered_events = []
-                for filter in device._filters.values():
-                    filtered_events.extend(filter._removeOutputEvents())
-
-                for i in range(len(filtered_events)):
-                    e = filtered_events[i]
-                    for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
-                        l._handleEvent(e)
+                if device._filters:
+                    for e in device._processFilterInputEvents():
+                        for l in device._getEventListeners(e[DeviceEvent.EVENT_TYPE_ID_INDEX]):
+                            l._handleEvent(e)
 
 
             except Exception:
@@ -919,7 +1109,8 @@ class ioServer(object):
                     
             while len(self.deviceMonitors) > 0:
                 m=self.deviceMonitors.pop(0)
-                m.running=False
+                self.deviceScheduler.removeMonitor(m)
+            self.deviceScheduler.running=False
 
             if self.eventBuffer:
                 self.clearEventBuffer()
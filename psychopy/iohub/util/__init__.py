@@ -16,7 +16,8 @@ import warnings
 import scipy, numpy
 import sys,os,inspect
 import psychopy
-from collections import Iterable
+from heapq import heappush, heappop
+from collections import Iterable, deque
 
 from exception_tools import ioHubError
 from exception_tools import printExceptionDetailsToStdErr, print2err
@@ -236,6 +237,26 @@ class NumPyRingBuffer(object):
         self._npa[(i%self.max_size)+self.max_size]=element
         self._index+=1
 
+    def extend(self, elements):
+        """
+        Add each element of the elements sequence to the end of the RingBuffer,
+        using one numpy assignment instead of an append() call per element.
+        The result is the same as calling append() for each element in order.
+
+        :param sequence elements: The elements to add to the RingBuffer.
+        :returns None:
+        """
+        elements=numpy.asarray(elements,dtype=self._dtype)
+        count=len(elements)
+        if count>self.max_size:
+            self._index+=count-self.max_size
+            elements=elements[-self.max_size:]
+            count=self.max_size
+        positions=(self._index+numpy.arange(count))%self.max_size
+        self._npa[positions]=elements
+        self._npa[positions+self.max_size]=elements
+        self._index+=count
+
     def getElements(self):
         """
         Return the numpy array being used by the RingBuffer, the length of 
@@ -246,6 +267,8 @@ class NumPyRingBuffer(object):
         :param None:
         :returns numpy.array: The array of data elements that make up the Ring Buffer.
         """
+        if self._index<self.max_size:
+            return self._npa[:self._index]
         return self._npa[self._index%self.max_size:(self._index%self.max_size)+self.max_size]
 
     def isFull(self):
@@ -318,15 +341,139 @@ class NumPyRingBuffer(object):
             raise TypeError()
     
     def __getattr__(self,a):
-        if self._index<self.max_size:
-            return getattr(self._npa[:self._index],a)
-        return getattr(self._npa[self._index%self.max_size:(self._index%self.max_size)+self.max_size],a)
+        return getattr(self.getElements(),a)
     
     def __len__(self):
         if self.isFull():
             return self.max_size
         return self._index
-        
+
+def slidingWindows(a, length):
+    """
+    Return a read only 2D view of the one dimensional array a, where row i
+    is a[i:i+length]. No data is copied. If a has fewer than length elements,
+    an array with 0 rows is returned.
+
+    :param numpy.array a: The one dimensional array to create windows for.
+    :param int length: The number of elements in each window.
+    :returns numpy.array: Array with shape (len(a)-length+1, length).
+    """
+    a=numpy.ascontiguousarray(a)
+    count=max(len(a)-length+1,0)
+    return numpy.lib.stride_tricks.as_strided(a,shape=(count,length),
+                                              strides=(a.strides[0],)*2,
+                                              writeable=False)
+
+class RunningMedian(object):
+    """
+    RunningMedian keeps the median of the last max_size values appended
+    to it, using a max heap for the lower half of the window values and a min
+    heap for the upper half. Each append() is O(log n), and median() is O(1),
+    so it is a cheaper alternative to calling numpy.median on a moving window
+    for each new value.
+
+    Values removed from the window are deleted lazily, when they reach the top
+    of the heap they are in. If the window contains any NaN values, median()
+    returns NaN, matching numpy.median.
+
+    Example::
+
+        running_median=RunningMedian(5)
+        for v in (3, 1, 4, 1, 5, 9, 2, 6):
+            running_median.append(v)
+            print running_median.median()
+    """
+    def __init__(self, max_size):
+        self.max_size=max_size
+        self.clear()
+
+    def clear(self):
+        """
+        Remove all values from the RunningMedian window.
+        """
+        self._values=deque()
+        self._low=[]
+        self._high=[]
+        self._low_size=0
+        self._high_size=0
+        self._removed=set()
+        self._nan_count=0
+        self._seq=0
+
+    def append(self, value):
+        """
+        Add value to the window. If the window already holds max_size
+        values, the oldest value is removed from it.
+        """
+        if len(self._values)==self.max_size:
+            self._remove(self._values.popleft())
+        if value!=value:
+            self._nan_count+=1
+            self._values.append((value,None))
+            return
+        item=(value,self._seq)
+        self._seq+=1
+        self._values.append(item)
+        if self._low_size and item>self._lowTop():
+            heappush(self._high,item)
+            self._high_size+=1
+        else:
+            heappush(self._low,(-value,-item[1]))
+            self._low_size+=1
+        self._balance()
+
+    def median(self):
+        """
+        Return the median of the values in the window, or None if the window
+        is empty. For an even number of values, the mean of the two middle
+        values is returned.
+        """
+        if self._nan_count:
+            return numpy.nan
+        if self._low_size==0:
+            return None
+        if self._low_size>self._high_size:
+            return self._lowTop()[0]
+        return (self._lowTop()[0]+self._high[0][0])/2.0
+
+    def __len__(self):
+        return len(self._values)
+
+    def _lowTop(self):
+        v,s=self._low[0]
+        return -v,-s
+
+    def _remove(self, item):
+        if item[1] is None:
+            self._nan_count-=1
+            return
+        self._removed.add(item[1])
+        if item<=self._lowTop():
+            self._low_size-=1
+        else:
+            self._high_size-=1
+        self._balance()
+
+    def _prune(self, heap, sign):
+        while heap and sign*heap[0][1] in self._removed:
+            self._removed.discard(sign*heappop(heap)[1])
+
+    def _balance(self):
+        self._prune(self._low,-1)
+        self._prune(self._high,1)
+        if self._low_size>self._high_size+1:
+            v,s=heappop(self._low)
+            heappush(self._high,(-v,-s))
+            self._low_size-=1
+            self._high_size+=1
+            self._prune(self._low,-1)
+        elif self._high_size>self._low_size:
+            v,s=heappop(self._high)
+            heappush(self._low,(-v,-s))
+            self._high_size-=1
+            self._low_size+=1
+            self._prune(self._high,1)
+
 ###############################################################################
 #
 ## Generate a set of points in a NxM grid. Useful for creating calibration target positions,
@@ -175,6 +175,11 @@ class Monitor(object):
         self.calibNames = []
         self._gammaInterpolator = None
         self._gammaInterpolator2 = None
+        # size of the inverse gamma tables used by lineariseLums
+        self.linearizeLUTBits = 16
+        self._linearizeLUT = None
+        self._linearizeLUTGuns = None
+        self._linearizeLUTKey = None
         self._loadAll()
         if len(self.calibNames) > 0:
             self.setCurrent(-1)  # will fetch previous vals if monitor exists
@@ -583,9 +588,72 @@ class Monitor(object):
         self.setCurrent(calibName)
 
     def lineariseLums(self, desiredLums, newInterpolators=False,
-                      overrideGamma=None):
+                      overrideGamma=None, useLUT=True, interpolateLUT=True):
         """lums should be uncalibrated luminance values (e.g. a linear ramp)
         ranging 0:1
+
+        For a single value or 1D array the luminance (white) calibration is
+        used, for Nx3 arrays each column is linearised for its gun.
+
+        By default the values are looked up in the inverse gamma table of
+        each gun (see :meth:`getLinearizeLUT`), with linear interpolation
+        between its entries unless `interpolateLUT=False`. Set
+        `useLUT=False` to evaluate the gamma function (or interpolation)
+        for each value instead; this is also done for values outside 0:1.
+        """
+        desiredLums = numpy.asarray(desiredLums)
+        if (useLUT and desiredLums.size and desiredLums.ndim in (1, 2) and
+                (desiredLums.ndim == 1 or desiredLums.shape[1] >= 3) and
+                0 <= desiredLums.min() and desiredLums.max() <= 1):
+            lut = self.getLinearizeLUT(newInterpolators=newInterpolators,
+                                       overrideGamma=overrideGamma)
+            if lut is not None:
+                return _lookupLinearizeLUT(self._linearizeLUTGuns,
+                                           desiredLums, interpolateLUT)
+        return self._lineariseLumsDirect(desiredLums, newInterpolators,
+                                         overrideGamma)
+
+    def getLinearizeLUT(self, newInterpolators=False, overrideGamma=None):
+        """Returns the table used by :meth:`lineariseLums` to linearise
+        the guns, or None if the monitor has no linearize method.
+
+        This has 2**self.linearizeLUTBits rows, one for each luminance in
+        a linear ramp from 0 to 1, and a column for each gun (lum, R, G, B)
+        giving the (0:1) level to request for that luminance. It is made
+        on first use from the gamma function (or interpolation) of the
+        current calibration, and again once that calibration changes.
+        """
+        linMethod = self.getLinearizeMethod()
+        if linMethod not in [1, 2, 3, 4]:
+            return None
+        calib = [self.getGammaGrid(), self.getGamma(), overrideGamma]
+        if linMethod == 3:
+            calib = [self.getLumsPre(), self.getLevelsPre()]
+        key = (linMethod, self.linearizeLUTBits,
+               tuple(None if val is None else
+                     numpy.asarray(val, 'd').tostring() for val in calib))
+        if self._linearizeLUTKey != key or newInterpolators:
+            if self.autoLog:
+                logging.info('Creating %i-bit linearization table' %
+                             self.linearizeLUTBits)
+            ramp = numpy.linspace(0, 1, 2**self.linearizeLUTBits)
+            lut = numpy.empty((len(ramp), 4))
+            # (the interpolators may be from an earlier calibration)
+            lut[:, 0] = self._lineariseLumsDirect(ramp, True, overrideGamma)
+            lut[:, 1:] = self._lineariseLumsDirect(
+                numpy.repeat(ramp[:, None], 3, 1), False, overrideGamma)
+            # each gun only ever gets brighter (also means lookups are sure
+            # to be within the range of the table)
+            self._linearizeLUT = numpy.maximum.accumulate(lut, 0)
+            # for lookups, with the levels for each gun together
+            self._linearizeLUTGuns = self._linearizeLUT.T.copy()
+            self._linearizeLUTKey = key
+        return self._linearizeLUT
+
+    def _lineariseLumsDirect(self, desiredLums, newInterpolators=False,
+                             overrideGamma=None):
+        """lineariseLums by evaluating the gamma function (or
+        interpolation) for each value
         """
         linMethod = self.getLinearizeMethod()
         desiredLums = numpy.asarray(desiredLums)
@@ -608,9 +676,8 @@ class Monitor(object):
                     # scale to 0:1
                     lumsPre[gun, :] = ((lumsPre[gun, :] - lumsPre[gun, 0]) /
                                        (lumsPre[gun, -1] - lumsPre[gun, 0]))
-                    self._gammaInterpolator.append(interp1d(lumsPre[gun, :],
-                                                            levelsPre,
-                                                            kind='linear'))
+                    self._gammaInterpolator.append(interpolate.interp1d(
+                        lumsPre[gun, :], levelsPre, kind='linear'))
                     # interpFunc = Interpolation.InterpolatingFunction(
                     #    (lumsPre[gun,:],), levelsPre)
                     # polyFunc = interpFunc.fitPolynomial(3)
@@ -637,7 +704,7 @@ class Monitor(object):
 
             # get the min,max lums
             gammaGrid = self.getGammaGrid()
-            if gammaGrid != None:
+            if gammaGrid is not None:
                 # if we have info about min and max luminance then use it
                 minLum = gammaGrid[1, 0]
                 maxLum = gammaGrid[1:4, 1]
@@ -648,14 +715,21 @@ class Monitor(object):
                     gamma = gammaGrid[1:4, 2]
                 maxLumWhite = gammaGrid[0, 1]
                 gammaWhite = gammaGrid[0, 2]
+                bWhite = gammaGrid[0, 4]
                 if self.autoLog:
                     logging.debug('using gamma grid' + str(gammaGrid))
             else:
                 # just do the calculation using gamma
                 minLum = 0
-                maxLumR, maxLumG, maxLumB, maxLumWhite = 1, 1, 1, 1
-                gamma = self.gamma
-                gammaWhite = num.average(self.gamma)
+                maxLum, maxLumWhite = [1, 1, 1], 1
+                b = [0, 0, 0]
+                if overrideGamma is not None:
+                    gamma = overrideGamma
+                else:
+                    gamma = self.getGamma()
+                gamma = numpy.ones(3) * gamma  # one per gun
+                gammaWhite = numpy.average(gamma)
+                bWhite = 0
 
             # get the inverse gamma
             if len(desiredLums.shape) > 1:
@@ -666,7 +740,7 @@ class Monitor(object):
                                                  eq=linMethod, b=b[gun])
             else:
                 output = gammaInvFun(desiredLums, minLum, maxLumWhite,
-                                     gammaWhite, eq=linMethod)
+                                     gammaWhite, eq=linMethod, b=bWhite)
 
         else:
             msg = "Don't know how to linearise with method %i"
@@ -1111,6 +1185,36 @@ def getAllMonitors():
     return monitorList
 
 
+def _lookupLinearizeLUT(lutGuns, lums, interpolateLUT=True):
+    """Look up lums (0:1, a 1D array or Nx3+) in the tables from
+    Monitor.getLinearizeLUT: the luminance table for 1D lums, or the gun
+    tables for the first 3 columns of Nx3 lums (as lineariseLums does).
+
+    lutGuns has a row of levels for each gun (lum, R, G, B)
+    """
+    def lookup(levels, lums):
+        pos = lums * (len(levels) - 1.0)
+        if not interpolateLUT:
+            return levels.take(numpy.rint(pos).astype(numpy.intp))
+        index = pos.astype(numpy.intp)
+        numpy.minimum(index, len(levels) - 2, out=index)
+        pos -= index  # now the fraction of the way to the next level
+        lower = levels.take(index)
+        upper = levels.take(index + 1)
+        upper -= lower
+        upper *= pos
+        upper += lower
+        return upper
+
+    if lums.ndim == 1:
+        return lookup(lutGuns[0], lums)
+    output = numpy.zeros(lums.shape)  # any other columns are left at 0
+    # a gun at a time, as each table is then more likely to stay in cache
+    for gun in range(3):
+        output[:, gun] = lookup(lutGuns[gun + 1], lums[:, gun])
+    return output
+
+
 def gammaFun(xx, minLum, maxLum, gamma, eq=1, a=None, b=None, k=None):
     """Returns gamma-transformed luminance values.
     y = gammaFun(x, minLum, maxLum, gamma)
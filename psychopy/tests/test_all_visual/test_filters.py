@@ -0,0 +1,51 @@
+"""Tests for the cached filter kernels and real FFT filtering in
+psychopy.visual.filters"""
+import numpy
+from numpy.fft import ifft2, ifftshift
+
+from psychopy.visual import filters
+
+
+def test_cachedKernels():
+    lowpass = filters.butter2d_lp((64, 48), 0.2, n=2)
+    radius = numpy.sqrt(numpy.linspace(-0.5, 0.5, 48)[numpy.newaxis]**2 +
+                        numpy.linspace(-0.5, 0.5, 64)[:, numpy.newaxis]**2)
+    assert numpy.allclose(lowpass, 1 / (1.0 + (radius / 0.2)**4))
+    # callers get their own copy of the cached kernel
+    lowpass *= 0
+    again = filters.butter2d_lp((64, 48), 0.2, n=2)
+    assert again.max() > 0.99
+    assert numpy.allclose(filters.butter2d_hp((64, 48), 0.2, n=2),
+                          1 - again)
+    assert numpy.allclose(filters.butter2d_bp((64, 48), 0.1, 0.2, 2),
+                          again - filters.butter2d_lp((64, 48), 0.1, 2))
+    assert (filters.butter2d_lp((64, 48), 0.3, n=2) != again).any()
+
+
+def test_filterImages():
+    rng = numpy.random.RandomState(0)
+    for size in [(64, 64), (63, 80)]:
+        images = rng.uniform(-1, 1, (40,) + size)
+        kernels = [filters.butter2d_lp(size, 0.1, 2),
+                   filters.butter2d_lp_elliptic(size, 0.3, 0.5, 2, alpha=0.4,
+                                                offset_x=0.1),
+                   filters.butter2d_bp(size, 0.1, 0.3, 3) *
+                   numpy.exp(1j * rng.rand(*size))]
+        for kernel in kernels:
+            expected = [ifft2(ifftshift(filters.imfft(image) * kernel)).real
+                        for image in images]
+            found = filters.filterImages(images, kernel, dtype=float)
+            assert numpy.allclose(found, expected)
+            threaded = filters.filterImages(images, kernel, nThreads=2)
+            assert threaded.dtype == numpy.float32
+            assert numpy.allclose(threaded, expected, atol=1e-6)
+            single = filters.filterImages(images[0], kernel)
+            assert numpy.allclose(single, expected[0], atol=1e-6)
+
+
+def test_conv2d():
+    rng = numpy.random.RandomState(1)
+    smaller, larger = rng.rand(2, 32, 31)
+    expected = ifft2(numpy.fft.fft2(smaller) * numpy.fft.fft2(larger)).real
+    assert numpy.allclose(filters.conv2d(smaller, larger), expected)
+    assert numpy.allclose(filters.conv2d(smaller + 0j, larger), expected)
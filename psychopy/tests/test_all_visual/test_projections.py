@@ -1,10 +1,11 @@
 import pyglet
 from pyglet.window import key
 from psychopy.visual import Window, shape, TextStim, GratingStim, Circle
-from psychopy.visual.windowwarp import Warper
+from psychopy.visual.windowwarp import Warper, readWarpfile
 from psychopy import event, core 
 from psychopy.tests import utils
 import pytest, copy
+import numpy as np
 
 """define WindowWarp configurations, test the logic
 
@@ -205,6 +206,64 @@ class Test_class_WindowWarp(object):
         self.warper.changeProjection(self.warper.warp, self.warper.warpfile, flipVertical = not self.warper.flipVertical)
         self.draw_projection()
 
+def quadCornersLoop(grid):
+    """Reference for the quad layout: corners (y,x), (y,x+1), (y+1,x+1),
+    (y+1,x) for each quad, y major."""
+    rows, cols = grid.shape[:2]
+    corners = []
+    for y in range(rows - 1):
+        for x in range(cols - 1):
+            corners.extend([grid[y, x], grid[y, x + 1],
+                            grid[y + 1, x + 1], grid[y + 1, x]])
+    return np.array(corners)
+
+class BufferCapture(Warper):
+    """Warper that records the arrays it would upload, without a window."""
+    def __init__(self, warpGridsize):
+        self.warpGridsize = warpGridsize
+        self.mon_width_cm = 50.0
+        self.mon_height_cm = 50.0 / 1.6
+        self.dist_cm = 30.0
+        self.buffers = None
+
+    def createVertexAndTextureBuffers(self, vertices, tcoords, opacity=None):
+        self.buffers = vertices, tcoords, opacity
+
+def test_warpMeshLayout():
+    warper = BufferCapture(17)
+    warper.changeProjection('spherical', eyepoint=(0.3, 0.6))
+    vertices, tcoords, opacity = warper.buffers
+    x_c = np.linspace(-1.0, 1.0, 17)
+    x_coords, y_coords = np.meshgrid(x_c, x_c)
+    assert vertices.dtype == tcoords.dtype == np.float32
+    assert warper.nverts == len(vertices) == 16 * 16 * 4
+    assert np.array_equal(vertices[:, 0], quadCornersLoop(x_coords).astype('float32'))
+    assert np.array_equal(vertices[:, 1], quadCornersLoop(y_coords).astype('float32'))
+    assert opacity is None
+
+def test_warpfile(tmpdir):
+    cols, rows = 7, 4
+    warpdata = np.random.RandomState(0).rand(cols * rows, 5)
+    warpfile = tmpdir.join('warp.data')
+    with open(str(warpfile), 'w') as f:
+        f.write('2\n%d %d\n' % (cols, rows))
+        np.savetxt(f, warpdata, fmt='%.6f')
+    warpdata = np.loadtxt(str(warpfile), skiprows=2)
+
+    warper = BufferCapture(64)
+    warper.changeProjection('warpfile', warpfile=str(warpfile))
+    vertices, tcoords, opacity = warper.buffers
+    corners = quadCornersLoop(warpdata.reshape(rows, cols, 5)).astype('float32')
+    assert warper.nverts == (cols - 1) * (rows - 1) * 4
+    assert np.array_equal(vertices, corners[:, :2])
+    assert np.array_equal(tcoords, corners[:, 2:4])
+    assert np.array_equal(opacity[:, 3], corners[:, 4])
+    assert np.all(opacity[:, :3] == 1)
+
+    # an unchanged file is not parsed again
+    cached = readWarpfile(str(warpfile))
+    assert readWarpfile(str(warpfile)) is cached
+
 if __name__ == '__main__':
     if RunningPyTest:
         cls = Test_class_WindowWarp()
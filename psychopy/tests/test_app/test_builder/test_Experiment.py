@@ -300,6 +300,47 @@ class TestExpt(object):
         dat = numpy.recfromcsv(f, case_sensitive=True)
         f.close()
         assert len(dat)==8 # because 4 'blocks' with 2 trials each (3 stims per trial)
+
+    def test_resourceFiles(self):
+        """conditions files (and the files they name) and component files,
+        found again only where the experiment or the files have changed
+        """
+        demo = path.join(self.exp.prefsPaths['demos'], 'builder', 'images_blocks')
+        tmp = path.join(self.tmp_dir, 'images_blocks')
+        shutil.copytree(demo, tmp)
+        exp = psychopy.app.builder.experiment.Experiment()
+        exp.loadFromXML(path.join(tmp, 'blockedTrials.psyexp'))
+        expected = ['chooseBlock.csv', 'facesBlock.csv', 'stims/face01.jpg',
+                    'stims/face02.jpg', 'stims/face03.jpg', 'housesBlock.csv',
+                    'stims/house01.jpg', 'stims/house02.jpg', 'stims/house03.jpg']
+        resources = exp.getResourceFiles()
+        assert [f['rel'] for f in resources] == expected
+        for f in resources:
+            assert f['abs'] == path.join(tmp, f['rel'])
+        timing = exp.resourceIndex.timing
+        assert timing['conditionsParsed'] == 3
+        assert timing['total'] >= timing['conditions'] > 0
+
+        # nothing has changed
+        assert exp.getResourceFiles() == resources
+        timing = exp.resourceIndex.timing
+        assert timing['conditionsParsed'] == timing['componentsChecked'] == 0
+        assert timing['conditionsCached'] == 3
+
+        # a component now needs a file, and a conditions file has changed
+        shutil.copyfile(path.join(tmp, 'stims', 'face01.jpg'),
+                        path.join(tmp, 'extra.jpg'))
+        exp.routines['readyMessage'].getComponentFromName('text').params['text'].val = 'extra.jpg'
+        with open(path.join(tmp, 'chooseBlock.csv'), 'w') as f:
+            f.write('condsFile,readyMsg\nhousesBlock.csv,Some houses\n')
+        os.utime(path.join(tmp, 'chooseBlock.csv'), (0, 0))
+        resources = exp.getResourceFiles()
+        assert [f['rel'] for f in resources] == (
+            ['chooseBlock.csv', 'housesBlock.csv', 'stims/house01.jpg',
+             'stims/house02.jpg', 'stims/house03.jpg', 'extra.jpg'])
+        timing = exp.resourceIndex.timing
+        assert timing['conditionsParsed'] == timing['componentsChecked'] == 1
+
     def test_Run_FastStroopPsyExp(self):
         # start from a psyexp file, loadXML, execute, get keypresses from a emulator thread
 
@@ -0,0 +1,141 @@
+"""Run the frame loop that a Routine writes against stand-in stimuli and
+a stand-in window, to check when components start and stop"""
+import pytest
+
+from psychopy.app.builder import experiment
+from psychopy.app.builder.components import getAllComponents
+from psychopy.constants import NOT_STARTED, STARTED, FINISHED
+
+FRAME = 1 / 60.0
+
+
+class StubWindow(object):
+    """Each flip advances the (stub) time by one frame"""
+    monitorFramePeriod = FRAME
+
+    def __init__(self):
+        self.nFlips = 0
+
+    def flip(self):
+        self.nFlips += 1
+
+
+class StubClock(object):
+    def __init__(self, win):
+        self.win = win
+        self.offset = 0
+
+    def reset(self):
+        self.offset = self.win.nFlips
+
+    def getTime(self):
+        return (self.win.nFlips - self.offset) * FRAME
+
+
+class StubTimer(StubClock):
+    """Counts down, like core.CountdownTimer"""
+
+    def add(self, t):
+        self.offset = self.win.nFlips + t / FRAME
+
+    def getTime(self):
+        return -StubClock.getTime(self)
+
+
+class StubStim(object):
+    """Records the frames on which drawing started and stopped"""
+
+    def __init__(self, win):
+        self.win = win
+        self.drawn = []
+        self.status = NOT_STARTED
+
+    def setAutoDraw(self, value):
+        if value != (self.status == STARTED):
+            self.drawn.append((value, self.win.nFlips))
+        self.status = STARTED if value else FINISHED
+
+
+class StubEvent(object):
+    def getKeys(self, keyList=None):
+        return []
+
+
+def runRoutine(components, startTypes={}, **variables):
+    exp = experiment.Experiment()
+    exp.addRoutine('trial')
+    routine = exp.routines['trial']
+    textClass = getAllComponents(fetchIcons=False)['TextComponent']
+    for name, startVal, stopType, stopVal in components:
+        routine.addComponent(textClass(
+            exp, parentName='trial', name=name,
+            startType=startTypes.get(name, 'time (s)'), startVal=startVal,
+            stopType=stopType, stopVal=stopVal))
+    buff = experiment.IndentingBuffer(u'')
+    routine._clockName = 'trialClock'
+    routine.writeMainCode(buff)
+
+    win = StubWindow()
+    namespace = {'win': win, 'trialClock': StubClock(win),
+                 'routineTimer': StubTimer(win), 'event': StubEvent(),
+                 'endExpNow': False, 'dur': 0.25,
+                 'NOT_STARTED': NOT_STARTED, 'STARTED': STARTED,
+                 'FINISHED': FINISHED}
+    namespace.update(variables)
+    for name, startVal, stopType, stopVal in components:
+        namespace[name] = StubStim(win)
+    exec(buff.getvalue(), namespace)
+    return win, namespace
+
+
+@pytest.mark.builder
+def test_routineEndsWhenAllComponentsFinish():
+    win, namespace = runRoutine([
+        ('first', 0.0, 'duration (s)', 0.5),
+        ('second', 0.25, 'time (s)', 1.0),
+        ('third', 0.5, 'duration (s)', 'dur')])
+    # constant stop times are computed before the frame loop
+    assert namespace['firstStopDue'] == pytest.approx(0.5 - FRAME * 0.75)
+    assert 'thirdStopDue' not in namespace
+    # and are not added to the stimuli
+    for name in ('first', 'second', 'third'):
+        assert not hasattr(namespace[name], 'tStopDue')
+    assert namespace['first'].drawn == [(True, 0), (False, 30)]
+    assert namespace['second'].drawn == [(True, 15), (False, 60)]
+    assert namespace['third'].drawn == [(True, 30), (False, 45)]
+    # no flip once the last component has finished
+    assert win.nFlips == 60
+    assert namespace['trialPending'] == namespace['trialActive'] == set()
+
+
+@pytest.mark.builder
+def test_routineKeepsRunningUntilLastComponent():
+    # the first component in the list finishes last
+    win, namespace = runRoutine([
+        ('slow', 0.0, 'duration (s)', 1.0),
+        ('fast', 0.0, 'duration (frames)', 6)])
+    assert namespace['fast'].drawn == [(True, 0), (False, 6)]
+    assert namespace['slow'].drawn == [(True, 0), (False, 60)]
+    assert win.nFlips == 60
+
+
+@pytest.mark.builder
+def test_testsOnlyWhilePendingOrActive():
+    # record the frames on which the start and stop tests are evaluated
+    evaluated = {'start': [], 'stop': []}
+
+    def test(which, frameN, due):
+        evaluated[which].append(frameN)
+        return frameN >= due
+
+    win, namespace = runRoutine([
+        ('cued', 'test("start", frameN, 10)', 'condition',
+         'test("stop", frameN, 20)'),
+        ('other', 0.0, 'duration (s)', 1.0)],
+        startTypes={'cued': 'condition'}, test=test)
+    assert namespace['cued'].drawn == [(True, 10), (False, 20)]
+    assert win.nFlips == 60
+    # not started: no stop test; started or finished: no start test
+    assert evaluated['start'] == list(range(11))
+    # finished: no stop test
+    assert evaluated['stop'] == list(range(10, 21))
@@ -5,6 +5,7 @@ from os.path import join as pjoin
 import shutil
 from pytest import raises
 from tempfile import mkdtemp
+import numpy
 from numpy.random import random
 
 from psychopy import data
@@ -145,6 +146,57 @@ class TestTrialHandler(object):
         trials.saveAsWideText(pjoin(self.temp_dir, 'testRandom.csv'), delim=',', appendFile=False)#this omits values
         utils.compareTextFiles(pjoin(self.temp_dir, 'testRandom.csv'), pjoin(fixturesPath,'corrRandom.csv'))
 
+    def test_seeded_sequences(self):
+        # later tests depend on the global random state left by earlier ones
+        state = numpy.random.get_state()
+        try:
+            self._check_seeded_sequences()
+        finally:
+            numpy.random.set_state(state)
+
+    def _check_seeded_sequences(self):
+        conditions = [{'trialType': n} for n in range(1000)]
+        for method in ['random', 'fullRandom', 'sequential']:
+            trials = data.TrialHandler(conditions, 50, method=method,
+                                       seed=100, autoLog=False)
+            seq = trials.sequenceIndices
+            assert seq.shape == (1000, 50)
+            after = random()  # the global state was seeded
+            # a RandomState gives the same sequence, leaving that alone
+            rand = numpy.random.RandomState(100)
+            other = data.TrialHandler(conditions, 50, method=method,
+                                      seed=rand, autoLog=False)
+            assert numpy.array_equal(other.sequenceIndices, seq)
+            assert random() != after
+            if method == 'random':
+                # each repeat has every condition
+                assert (numpy.sort(seq, 0) == numpy.arange(1000)[:, None]).all()
+            elif method == 'fullRandom':
+                assert numpy.array_equal(numpy.bincount(seq.ravel()),
+                                         [50] * 1000)
+                assert not (numpy.sort(seq, 0) == numpy.arange(1000)[:, None]).all()
+        trials = data.TrialHandler(conditions[:3], 2, method='random',
+                                   seed=rand, autoLog=False)
+        assert [t['trialType'] for t in trials] == list(
+            trials.sequenceIndices.T.ravel())
+
+    def test_factorial_trial_list(self):
+        factors = {'text': ['red', 'green', 'blue'],
+                   'letterColor': ['red', 'green'],
+                   'size': [0, 1]}
+        trialList = data.createFactorialTrialList(factors)
+        assert len(trialList) == 12
+        assert sorted(trialList) == sorted(
+            {'text': t, 'letterColor': c, 'size': s}
+            for t in factors['text'] for c in factors['letterColor']
+            for s in factors['size'])
+        # the first factor varies fastest
+        first = list(factors)[0]
+        assert [trial[first] for trial in trialList[:len(factors[first])]] == \
+            factors[first]
+        assert data.createFactorialTrialList({}) == [{}]
+        assert data.createFactorialTrialList({'a': [], 'b': [1]}) == []
+
 class TestMultiStairs(object):
     def setup_class(self):
         self.temp_dir = mkdtemp(prefix='psychopy-tests-testdata')
@@ -190,6 +242,82 @@ class TestMultiStairs(object):
         stairs.saveAsExcel(pjoin(self.temp_dir, 'multiQuestOut'))
         stairs.saveAsPickle(pjoin(self.temp_dir, 'multiQuestOut'))#contains more info
 
+    def test_experimentData(self):
+        # later tests depend on the global random state left by earlier ones
+        state = numpy.random.get_state()
+        try:
+            self._check_experimentData()
+        finally:
+            numpy.random.set_state(state)
+
+    def _check_experimentData(self):
+        conditions = [{'label': 'c%i' % n, 'startVal': 0.5, 'ori': n % 2}
+                      for n in range(6)]
+        conditions.append(dict(conditions[0]))  # a repeat of the first
+        stairs = data.MultiStairHandler(conditions=conditions, nTrials=3,
+                                        name='ms', autoLog=False)
+        exp = data.ExperimentHandler(name='testExp', autoLog=False)
+        exp.addLoop(stairs)
+        # passes left by an earlier version were lists
+        stairs.thisPassRemaining = list(stairs.thisPassRemaining)
+        labels = []
+        for intensity, condition in stairs:
+            labels.append(condition['label'])
+            stairs.addResponse(1)
+            exp.nextEntry()
+        assert len(exp.entries) == 21
+        for n, entry in enumerate(exp.entries):
+            assert entry['ms.label'] == labels[n]
+            assert entry['ms.thisIndex'] == int(labels[n][1:])
+            assert entry['ms.thisN'] == n
+            assert entry['ms.thisRepN'] == n // 7 + 1
+            assert entry['ms.response'] == 1
+        # every staircase starts at its startVal
+        assert [e['ms.intensity'] for e in exp.entries[:7]] == [0.5] * 7
+        # each pass runs every staircase once
+        for start in range(0, 21, 7):
+            assert len([e for e in exp.entries[start:start + 7]
+                        if e['ms.label'] == 'c0']) == 2
+        assert exp.dataNames[:3] == ['ms.' + key for key in conditions[0]]
+        assert exp.dataNames[3:] == [
+            'ms.thisIndex', 'ms.thisRepN', 'ms.thisN', 'ms.direction',
+            'ms.stepSize', 'ms.stepType', 'ms.intensity', 'ms.response']
+
+    def test_changedConditionKeys(self):
+        state = numpy.random.get_state()
+        try:
+            self._check_changedConditionKeys()
+        finally:
+            numpy.random.set_state(state)
+
+    def _check_changedConditionKeys(self):
+        conditions = [{'label': 'a', 'startVal': 0.5, 'ori': 0}]
+        stairs = data.MultiStairHandler(conditions=conditions, nTrials=3,
+                                        name='ms', autoLog=False)
+        exp = LoggingExperimentHandler(name='testExp', autoLog=False)
+        exp.addLoop(stairs)
+        for trialN, (intensity, condition) in enumerate(stairs):
+            if trialN == 1:
+                # replace a key, keeping the number of keys the same
+                del condition['ori']
+                condition['sf'] = 4
+            stairs.addResponse(1)
+            exp.nextEntry()
+        assert 'ori' not in exp.entries[2] and exp.entries[2]['ms.sf'] == 4
+        assert exp.entries[0]['ms.ori'] == 0
+        # the data went through addData, so subclasses can see it
+        assert ('ms.thisN', 2) in exp.added
+
+
+class LoggingExperimentHandler(data.ExperimentHandler):
+    def __init__(self, *args, **kwargs):
+        data.ExperimentHandler.__init__(self, *args, **kwargs)
+        self.added = []
+
+    def addData(self, name, value):
+        self.added.append((name, value))
+        data.ExperimentHandler.addData(self, name, value)
+
 if __name__=='__main__':
     import pytest
     pytest.main()
@@ -75,6 +75,33 @@ def test_ImportCondsUnicode():
                                      'right_to_left_unidcode.xlsx'))
     assert u'\u05d2\u05d9\u05dc' in fromXLSX[0]['question']
 
+def test_ImportCondsListsAndCache(tmpdir, monkeypatch):
+    cacheDir = tmpdir.mkdir('cache')
+    monkeypatch.setattr(data, '_conditionsCachePath',
+                        lambda fileName: str(cacheDir.join('conds.pickle')))
+    condsFile = tmpdir.join('conds.csv')
+    condsFile.write('ori,pos,label,sf\n'
+                    '0,"[1, -2.5]",a,\n'
+                    '90,"[__import__(\'os\')]",b,2.0\n')
+    for repeat in range(2):
+        conds, names = data.importConditions(str(condsFile),
+                                             returnFieldNames=True)
+        assert names == ('ori', 'pos', 'label', 'sf')
+        assert conds[0] == {'ori': 0, 'pos': [1, -2.5], 'label': 'a',
+                            'sf': None}
+        # not a literal, so it isn't evaluated
+        assert conds[1]['pos'] == "[__import__('os')]"
+        assert type(conds[1]['sf']) == numpy.float64
+        assert len(cacheDir.listdir()) == 1
+
+    # the cache is ignored once the file changes
+    condsFile.write('ori\n45\n')
+    os.utime(str(condsFile), (0, 0))
+    assert data.importConditions(str(condsFile)) == [{'ori': 45}]
+    assert data.importConditions(str(condsFile), selection='0') == [
+        {'ori': 45}]
+
+
 if __name__=='__main__':
     t=TestXLSX()
     t.setup_class()
@@ -0,0 +1,69 @@
+"""Tests for psychopy.data.bootStraps and friends"""
+import numpy
+
+from psychopy import data
+
+
+def legacyBootStraps(dat, n):
+    # the original per-resample loop, for comparison
+    dat = numpy.array([dat]) if numpy.ndim(dat) == 1 else numpy.asarray(dat)
+    nTrials = dat.shape[1]
+    resamples = numpy.zeros(dat.shape + (n,), dat.dtype)
+    for stimulusN in range(dat.shape[0]):
+        for sampleN in range(n):
+            indices = numpy.floor(
+                nTrials * numpy.random.rand(nTrials)).astype('i')
+            resamples[stimulusN, :, sampleN] = dat[stimulusN, indices]
+    return resamples
+
+
+def median(resamples):
+    return numpy.median(resamples, axis=1)
+
+
+def test_bootStrapsMatchesLegacy():
+    dat = numpy.arange(60).reshape([3, 20])
+    numpy.random.seed(10)
+    expected = legacyBootStraps(dat, 50)
+    numpy.random.seed(10)
+    out = data.bootStraps(dat, 50)
+    assert out.shape == (3, 20, 50)
+    assert out.dtype == dat.dtype
+    assert (out == expected).all()
+
+    numpy.random.seed(3)
+    expected = legacyBootStraps(dat[0], 5)
+    numpy.random.seed(3)
+    assert (data.bootStraps(dat[0], 5) == expected).all()
+
+
+def test_bootStrapsSeed():
+    dat = numpy.random.rand(2, 30)
+    first = data.bootStraps(dat, 20, seed=1)
+    assert (first == data.bootStraps(dat, 20, seed=1)).all()
+    assert not (first == data.bootStraps(dat, 20, seed=2)).all()
+    # every resampled value comes from the same condition
+    for cond in range(2):
+        assert numpy.in1d(first[cond], dat[cond]).all()
+
+    indices = data.bootStrapIndices(30, n=20, seed=1)
+    assert indices.shape == (20, 30)
+    assert indices.min() >= 0 and indices.max() < 30
+
+
+def test_bootStrapStatistic():
+    dat = numpy.random.RandomState(0).rand(2, 40)
+    means = data.bootStrapStatistic(dat, n=1050, seed=4, chunkSize=100)
+    assert means.shape == (2, 1050)
+    assert numpy.allclose(means.mean(axis=1), dat.mean(axis=1), atol=0.02)
+    # chunks are seeded independently of how the work is shared out
+    parallel = data.bootStrapStatistic(dat, n=1050, seed=4, chunkSize=100,
+                                       nProcesses=2)
+    assert (means == parallel).all()
+
+    # an odd number of trials, so each median is one of the data values
+    oddTrials = dat[0, :39]
+    medians = data.bootStrapStatistic(oddTrials, statistic=median, n=30,
+                                      seed=4, chunkSize=7)
+    assert medians.shape == (30,)
+    assert numpy.in1d(medians, oddTrials).all()
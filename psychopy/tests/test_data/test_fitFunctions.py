@@ -86,6 +86,32 @@ def test_logistic():
     if PLOTTING:
         plotFit(modResps, thresh, 'Logistic (thresh=%.2f, params=%s)' %(fit.inverse(0.75), fit.params))
 
+def test_fitBatch():
+    #noisy copies of the fake data, fitted at once and then one at a time
+    rand = numpy.random.RandomState(0)
+    noisy = responses + rand.normal(0, 0.02, (20, len(contrasts)))
+    for fitClass in [data.FitWeibull, data.FitLogistic,
+                     data.FitCumNormal, data.FitNakaRushton]:
+        params, covars = fitClass.fitBatch(contrasts, noisy)
+        nParams = params.shape[1]
+        assert params.shape == (20, nParams)
+        assert covars.shape == (20, nParams, nParams)
+        for thisResp, thisParams, thisCovar in zip(noisy, params, covars):
+            fit = fitClass(contrasts, thisResp, display=0)
+            assert numpy.allclose(fit.params, thisParams, rtol=1e-4,
+                                  atol=1e-5), fitClass
+            assert numpy.allclose(fit.covar, thisCovar, rtol=0.05,
+                                  atol=1e-8), fitClass
+        #a 1D dataset gives 1D params
+        params, covars = fitClass.fitBatch(contrasts, responses)
+        fit = fitClass(contrasts, responses, display=0)
+        assert numpy.allclose(fit.params, params, rtol=1e-4, atol=1e-5)
+        assert params.shape == (nParams,)
+        assert covars.shape == (nParams, nParams)
+    #sharing the datasets across processes gives the same result
+    parallel = data.FitLogistic.fitBatch(contrasts, noisy, nProcesses=2)
+    assert (parallel[0] == data.FitLogistic.fitBatch(contrasts, noisy)[0]).all()
+
 def teardown():
     if PLOTTING:
         pylab.show()
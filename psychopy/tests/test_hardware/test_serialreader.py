@@ -0,0 +1,190 @@
+"""Tests for the background serial reader and frame parsers used by
+psychopy.hardware.serialdevice, cedrus and forp, against a scripted device
+on the other end of a pseudo-terminal"""
+
+import os
+import sys
+import struct
+import threading
+import time
+import pytest
+
+serial = pytest.importorskip('serial')
+if sys.platform == 'win32':
+    pytest.skip("needs a pseudo-terminal", allow_module_level=True)
+
+from psychopy import core
+from psychopy.hardware.serialdevice import (SerialDevice, SerialReader,
+                                            LineParser)
+from psychopy.hardware.cedrus import RB730, XidParser
+from psychopy.hardware.forp import ButtonBox
+
+
+class ScriptedDevice(object):
+    """The device end of a pty pair: replies to commands and sends
+    scripted bytes, optionally split into several writes"""
+
+    def __init__(self, replies=None):
+        self.master, slave = os.openpty()
+        self.portName = os.ttyname(slave)
+        self._slave = slave
+        self.replies = replies or {}
+        self.received = ''
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        import select
+        while self.running:
+            if not select.select([self.master], [], [], 0.02)[0]:
+                continue
+            try:
+                self.received += os.read(self.master, 1024)
+            except OSError:
+                break
+            for command, reply in self.replies.items():
+                if command in self.received:
+                    self.received = self.received.replace(command, '', 1)
+                    os.write(self.master, reply)
+
+    def send(self, *parts):
+        """Write each part separately, with a short pause in between"""
+        for part in parts:
+            os.write(self.master, part)
+            time.sleep(0.02)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        os.close(self.master)
+        os.close(self._slave)
+
+
+def xidPacket(key, down, rt):
+    return 'k' + chr((key << 5) | (down << 4)) + struct.pack('i', rt)
+
+
+def waitFor(poll, count, timeout=2.0, size=len):
+    results = []
+    deadline = core.getTime() + timeout
+    while size(results) < count and core.getTime() < deadline:
+        results.extend(poll())
+        time.sleep(0.005)
+    return results
+
+
+def test_parsers():
+    parser = XidParser()
+    # a key event split across reads, and one with a "k" in its rt
+    packets = [xidPacket(2, 1, 350), xidPacket(3, 0, ord('k'))]
+    data = 'X' + packets[0] + packets[1] + '_xid'
+    frames = []
+    for i in range(0, len(data), 4):
+        frames.extend(parser.feed(data[i:i + 4], i))
+    assert [f for t, f in frames if len(f) == 6] == packets
+    assert ''.join(f for t, f in frames) == data
+    assert frames[1][0] == 4  # completed by the second read
+
+    lines = LineParser('\r\n')
+    assert lines.feed('OK\r', 1) == []
+    assert lines.feed('\nA\r\nB', 2) == [(2, 'OK\r\n'), (2, 'A\r\n')]
+    assert lines.buffer == 'B'
+
+
+def test_sharedReader():
+    device = ScriptedDevice()
+    com = serial.Serial(device.portName, timeout=0.1)
+    try:
+        reader = SerialReader.forPort(com)
+        assert SerialReader.forPort(com) is reader
+        first, second = reader.addBuffer(), reader.addBuffer()
+        t0 = core.getTime()
+        device.send('ab', 'cd')
+        chunks = waitFor(lambda: [first.popleft()] if first else [], 4,
+                         size=lambda c: sum(len(data) for t, data in c))
+        assert ''.join(data for t, data in chunks) == 'abcd'
+        assert t0 < chunks[0][0] < chunks[-1][0] < core.getTime()
+        assert ''.join(data for t, data in second) == 'abcd'
+        reader.removeBuffer(first)
+        assert reader.running
+        reader.removeBuffer(second)
+        assert not reader.running
+        assert SerialReader.forPort(com) is not reader
+    finally:
+        com.close()
+        device.close()
+
+
+def test_cedrus():
+    device = ScriptedDevice({'_d1': 'RB-730'})
+    for backgroundReader in (True, False):
+        box = RB730(device.portName, backgroundReader=backgroundReader)
+        try:
+            packets = [xidPacket(1, 1, 100), xidPacket(1, 0, 150),
+                       xidPacket(4, 1, 1000 + ord('k'))]
+            data = ''.join(packets)
+            # split mid-packet, which used to block the frame loop
+            device.send(data[:3], data[3:10], data[10:])
+            keys = waitFor(box.getKeyEvents, 2)
+            assert [(k.key, k.direction, k.rt) for k in keys] == [
+                (1, 'down', 100), (4, 'down', 1000 + ord('k'))]
+            assert keys[0].time <= keys[1].time <= core.getTime()
+            if backgroundReader:
+                # time-stamped on arrival, not when polled
+                assert keys[1].time - keys[0].time > 0.01
+
+            box.sendMessage('_d1')
+            message = waitFor(lambda: [box.readMessage()], 6,
+                              size=lambda m: len(''.join(m)))
+            assert ''.join(message) == 'RB-730'
+            time.sleep(0.1)
+            assert box.readMessage() == ''
+            device.send(xidPacket(2, 1, 5))
+            assert [k.key for k in box.waitKeyEvents()] == [2]
+        finally:
+            box.close()
+    device.close()
+
+
+def test_forp():
+    device = ScriptedDevice()
+    box = ButtonBox(device.portName)
+    try:
+        device.send(chr(0x01), chr(0x03) + chr(0x02), chr(0x00) + chr(0x10))
+        time.sleep(0.1)
+        assert box.getEvents() == set([1, 2, 5])
+        assert box.rawEvts == [0x01, 0x03, 0x02, 0x00, 0x10]
+        assert box.rawEvtTimes == sorted(box.rawEvtTimes)
+        assert box.rawEvtTimes[-1] - box.rawEvtTimes[0] > 0.02
+        assert box.getEvents() == set()
+    finally:
+        box.close()
+        device.close()
+
+
+class EchoDevice(SerialDevice):
+    name = 'echo'
+
+    def isAwake(self):
+        self.sendMessage('?')
+        return self.getResponse() == 'OK\n'
+
+
+def test_serialDevice():
+    device = ScriptedDevice({'?\n': 'OK\n', 'list\n': 'a\nb\nc'})
+    dev = EchoDevice(device.portName, maxAttempts=3, pauseDuration=0)
+    try:
+        assert dev.OK
+        dev.startReader()
+        assert dev.isAwake()
+        dev.sendMessage('list')
+        assert dev.getResponse() == 'a\n'
+        assert dev.getResponse(length=2) == ['b\n']
+        assert dev.getResponse(length=-1) == 'c'
+        dev.stopReader()
+        assert dev.isAwake()
+    finally:
+        dev.com.close()
+        device.close()
@@ -0,0 +1,38 @@
+""" Compare how many device events per second can be routed to a set of
+ioHub device event filters with and without per-event input copies.
+
+Not collected by py.test; command-line usage:
+    python psychopy/tests/test_iohub/filter_fanout_benchmark.py
+"""
+import timeit
+from psychopy.tests.test_iohub.test_eventfilters import (CountingFilter,
+                                                         createDevice,
+                                                         createEvent)
+
+EVENT_COUNT = 20000
+BATCH_SIZE = 20
+FILTER_COUNT = 3
+
+
+def runFanout(copy_mode):
+    filters = []
+    for i in range(FILTER_COUNT):
+        f = CountingFilter()
+        f.input_event_copy = copy_mode
+        f.process = f.clearInputEvents
+        filters.append(f)
+    device = createDevice(*filters)
+    events = [createEvent(i) for i in range(BATCH_SIZE)]
+
+    def run():
+        for b in range(EVENT_COUNT // BATCH_SIZE):
+            for e in events:
+                device._handleEvent(e)
+            device._processFilterInputEvents()
+    return min(timeit.repeat(run, number=1, repeat=3))
+
+if __name__ == '__main__':
+    for copy_mode in ('deep', 'shallow', None):
+        dur = runFanout(copy_mode)
+        print "input_event_copy=%-9s %10.0f events / sec" % (repr(copy_mode),
+                                                           EVENT_COUNT / dur)
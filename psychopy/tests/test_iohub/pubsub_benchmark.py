@@ -0,0 +1,29 @@
+""" Compare the throughput and delay of ioHub events sent from an
+EventPublisher to a RemoteEventSubscriber, with and without event batching,
+over a local ipc:// endpoint.
+
+Not collected by py.test; command-line usage:
+    python psychopy/tests/test_iohub/pubsub_benchmark.py
+"""
+from psychopy.tests.test_iohub.test_pubsub import (createPair, closePair,
+                                                   ipcAddress,
+                                                   measureDelivery)
+
+EVENT_COUNT = 20000
+# kept below the subscriber event_buffer_length of 128
+CHUNK_SIZES = (1, 10, 100)
+
+if __name__ == '__main__':
+    for settings in [{}, dict(batch_events=True, batch_size=64,
+                              batch_interval=0.002)]:
+        publisher, subscriber = createPair(ipcAddress(), **settings)
+        try:
+            for chunk_size in CHUNK_SIZES:
+                rate, delay = measureDelivery(publisher, subscriber,
+                                              EVENT_COUNT, chunk_size)
+                print "batch_events=%-5s chunk=%-5d %10.0f events / sec" \
+                      " %8.3f msec mean delay" % (
+                          settings.get('batch_events', False), chunk_size,
+                          rate, delay * 1000)
+        finally:
+            closePair(publisher, subscriber)
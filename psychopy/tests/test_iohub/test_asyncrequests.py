@@ -0,0 +1,170 @@
+""" Test the ioHubConnection async (ticketed) requests against an ioHub
+udpServer running on a thread of the test process, over loopback UDP.
+"""
+import threading
+import pytest
+
+from psychopy.iohub import Computer, ioHubError
+from psychopy.iohub.net import UDPClientConnection
+from psychopy.iohub.server import udpServer, ioServer
+from psychopy.iohub.client import ioHubConnection
+
+
+class StubHub(object):
+    """Just enough of an ioServer for the udpServer requests used here"""
+    emrt_file = None
+    devices = []
+
+    def __init__(self):
+        self.events = []
+        self.messages = []
+        self.eventBuffer = self
+
+    def log(self, text, level=None):
+        pass
+
+    def processDeviceEvents(self):
+        pass
+
+    def getEvents(self):
+        return self.events
+
+    def clear(self):
+        self.events = []
+
+    def _nativeEventCallback(self, event):
+        self.messages.append(event)
+
+
+class LoopbackServer(udpServer):
+    def shutDown(self):
+        self._running = False
+        self.stop()
+
+
+class LoopbackConnection(ioHubConnection):
+    """An ioHubConnection to a server in this process rather than to a
+    launched ioHub Process"""
+    port = None
+
+    def _startServer(self, ioHubConfig=None, ioHubConfigAbsPath=None):
+        self.udp_client = UDPClientConnection(remote_port=self.port)
+        return "OK"
+
+
+class TestAsyncRequests(object):
+    def setup_method(self, method):
+        self.hub = StubHub()
+        self.deviceDict = ioServer.deviceDict
+        ioServer.deviceDict = dict(Experiment=self.hub)
+        started = threading.Event()
+
+        def serve():
+            # the server uses the gevent hub of the thread it is created on
+            self.server = LoopbackServer(self.hub, ('127.0.0.1', 0))
+            self.server.start()
+            started.set()
+            self.server.serve_forever()
+        self.thread = threading.Thread(target=serve)
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait(5)
+        LoopbackConnection.port = self.server.socket.getsockname()[1]
+        self.io = LoopbackConnection()
+
+    def teardown_method(self, method):
+        self.io._shutdown_attempted = True
+        self.io.udp_client.sendTo(('STOP_IOHUB_SERVER',))
+        self.thread.join(5)
+        self.io.udp_client.close()
+        ioServer.deviceDict = self.deviceDict
+
+    def test_blockingRequests(self):
+        assert self.io._sendToHubServer(('RPC', 'getTime'))[0] == 'RPC_RESULT'
+        assert self.io.sendMessageEvent('sync') is True
+        assert self.io.addRowToConditionVariableTable([1, u'a']) is False
+        assert len(self.hub.messages) == 1
+
+    def test_ticketsAndWindow(self):
+        self.io.enableAsyncRequests(max_outstanding=4)
+        tickets = [self.io._sendToHubServerAsync(('RPC', 'getTime'))
+                   for i in range(3)]
+        for i in range(20):
+            self.io.sendMessageEvent('message %d' % i)
+            assert len(self.io._async_tickets) <= 4
+        assert self.io.addRowToConditionVariableTable([1, 2]) is None
+
+        # a blocking call is matched to its own reply
+        ticketIds = [t.ticket_id for t in tickets]
+        assert ticketIds == sorted(set(ticketIds))
+        assert self.io._sendToHubServer(('EXP_DEVICE', 'GET_DEVICE_LIST')) \
+            [0] == 'GET_DEV_LIST_RESULT'
+        times = [t.result()[2] for t in tickets]
+        assert all(t.done() for t in tickets)
+        assert times == sorted(times)
+        assert times[-1] <= Computer.getTime()
+
+        self.io.disableAsyncRequests()
+        assert self.io._async_tickets == {}
+        assert [m[-1] for m in self.hub.messages] == \
+            ['message %d' % i for i in range(20)]
+
+    def test_eventsAndErrors(self):
+        self.io.enableAsyncRequests()
+        self.hub.events = [[1, 2, 3]]
+        ticket = self.io.getEventsAsync(as_type='list')
+        assert list(ticket.result()) == [[1, 2, 3]]
+        assert self.io.getEventsAsync(as_type='list').result() == []
+
+        ticket = self.io._sendToHubServerAsync(('RPC', 'noSuchMethod'))
+        with pytest.raises(Exception):
+            ticket.result()
+        # an error reply to a blocking call is raised as before
+        with pytest.raises(Exception):
+            self.io._sendToHubServer(('RPC', 'noSuchMethod'))
+        self.io.disableAsyncRequests()
+        with pytest.raises(Exception):
+            self.io.getEventsAsync()
+
+    def test_serverResponseError(self):
+        self.io.enableAsyncRequests()
+        pack = self.server.pack
+
+        def failingPack(data):
+            if 'RPC_RESULT' in repr(data):
+                raise ValueError("can't pack this")
+            return pack(data)
+        self.server.pack = failingPack
+        ticket = self.io._sendToHubServerAsync(('RPC', 'getTime'))
+        # the error reply has the request's ticket, so the error is
+        # given to that ticket
+        with pytest.raises(Exception) as error:
+            ticket.result()
+        assert str(error.value) == 'IOHUB_SERVER_RESPONSE_ERROR'
+        assert ticket.done() and self.io._async_tickets == {}
+        self.server.pack = pack
+        assert self.io._sendToHubServer(('RPC', 'getTime'))[0] == 'RPC_RESULT'
+
+    def test_lostReplyExpires(self):
+        self.io.enableAsyncRequests(max_outstanding=1, timeout=0.2)
+        sendTo = self.io.udp_client.sendTo
+        lost = []
+
+        def losingSendTo(data, address=None):
+            # the request (so also its reply) is lost
+            if not lost:
+                lost.append(data)
+                return len(data)
+            return sendTo(data, address)
+        self.io.udp_client.sendTo = losingSendTo
+        ticket = self.io.getEventsAsync(as_type='list')
+        assert not ticket.done()
+        start = Computer.getTime()
+        # the window is full until the lost request's ticket expires
+        self.io.sendMessageEvent('after the lost request')
+        assert 0.1 < Computer.getTime() - start < 2.0
+        assert ticket.done()
+        with pytest.raises(ioHubError):
+            ticket.result()
+        self.io.disableAsyncRequests()
+        assert [m[-1] for m in self.hub.messages] == ['after the lost request']
@@ -0,0 +1,176 @@
+""" Test the typed event buffers used by ioHub Devices and the ioHub Server.
+"""
+import numpy as np
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.devices import (DeviceEvent, EventTypeBuffer,
+                                    DeviceEventBuffer)
+
+NUMERIC_EVENT = 250
+TEXT_EVENT = 251
+POSITION_EVENT = 252
+GAZE_EVENT = 253
+
+
+class NumericTestEvent(DeviceEvent):
+    EVENT_TYPE_ID = NUMERIC_EVENT
+    _newDataTypes = [('value', np.int32)]
+    __slots__ = [e[0] for e in _newDataTypes]
+
+
+class TextTestEvent(DeviceEvent):
+    EVENT_TYPE_ID = TEXT_EVENT
+    _newDataTypes = [('text', np.str, 16)]
+    __slots__ = [e[0] for e in _newDataTypes]
+
+
+class PositionTestEvent(DeviceEvent):
+    # the position fields of a MouseEvent
+    EVENT_TYPE_ID = POSITION_EVENT
+    _newDataTypes = [('x_position', np.int16), ('y_position', np.int16)]
+    __slots__ = [e[0] for e in _newDataTypes]
+
+
+class GazeTestEvent(DeviceEvent):
+    # a gaze position field of an eye tracker sample
+    EVENT_TYPE_ID = GAZE_EVENT
+    _newDataTypes = [('gaze_x', np.float32)]
+    __slots__ = [e[0] for e in _newDataTypes]
+
+EventConstants.addClassMappings(None, [NUMERIC_EVENT, TEXT_EVENT,
+                                       POSITION_EVENT, GAZE_EVENT],
+                                {'numeric': NumericTestEvent,
+                                 'text': TextTestEvent,
+                                 'position': PositionTestEvent,
+                                 'gaze': GazeTestEvent})
+
+
+def createEvent(event_class, time, value, filter_id=0):
+    e = [0] * len(event_class.CLASS_ATTRIBUTE_NAMES)
+    e[DeviceEvent.EVENT_TYPE_ID_INDEX] = event_class.EVENT_TYPE_ID
+    e[DeviceEvent.EVENT_HUB_TIME_INDEX] = time
+    e[DeviceEvent.EVENT_FILTER_ID_INDEX] = filter_id
+    e[-1] = value
+    return e
+
+
+def test_typeBufferStorage():
+    numeric = EventTypeBuffer(NUMERIC_EVENT, 100)
+    text = EventTypeBuffer(TEXT_EVENT, 100)
+    assert numeric.getRows() is not None
+    assert text.getRows() is None
+
+    events = [createEvent(NumericTestEvent, i * 0.5, i) for i in range(150)]
+    for e in events:
+        numeric.append(e)
+    assert len(numeric) == 100
+    assert numeric.getEvents() == events[50:]
+    assert numeric.getRows().dtype.names == NumericTestEvent.NUMPY_DTYPE.names
+
+    # an event that does not fit the dtype switches to event list storage
+    bad_event = createEvent(NumericTestEvent, 100.0, 'x')
+    numeric.append(bad_event)
+    assert numeric.getRows() is None
+    assert numeric.getEvents() == events[51:] + [bad_event]
+
+
+def test_typeBufferKeepsValues():
+    # time stamps are float32 in the NUMPY_DTYPE, but keep full precision
+    event_buffer = EventTypeBuffer(POSITION_EVENT, 10)
+    events = []
+    for i in range(3):
+        e = createEvent(PositionTestEvent, 123456.789 + i * 0.001, 10 - i)
+        e[DeviceEvent.EVENT_DEVICE_TIME_INDEX] = 100000.0123 + i * 0.001
+        e[-2] = 20 + i
+        events.append(e)
+        event_buffer.append(e)
+    assert event_buffer.getRows() is not None
+    assert event_buffer.getEvents() == events
+
+    # positions in norm or deg units are floats, which an int16 field
+    # would truncate, so the buffer keeps event lists instead
+    float_pos = createEvent(PositionTestEvent, 123456.8, -0.25)
+    float_pos[-2] = 0.5
+    event_buffer.append(float_pos)
+    assert event_buffer.getRows() is None
+    assert event_buffer.getEvents() == events + [float_pos]
+    assert event_buffer.getEvents()[-1][-2:] == [0.5, -0.25]
+
+    # as are values that would overflow, or wrap around in an unsigned
+    # field (event_id is a uint32)
+    for index, value in ((-1, 70000), (3, -1)):
+        type_buffer = EventTypeBuffer(POSITION_EVENT, 10)
+        e = createEvent(PositionTestEvent, 1.0, 0)
+        e[index] = value
+        type_buffer.append(e)
+        assert type_buffer.getRows() is None
+        assert type_buffer.getEvents() == [e]
+
+
+def test_typeBufferKeepsNaN():
+    # a sample with a missing gaze position still fits the typed rows
+    type_buffer = EventTypeBuffer(GAZE_EVENT, 10)
+    events = [createEvent(GazeTestEvent, 1.0 + i, value)
+              for i, value in enumerate([0.5, float('nan'), -0.25])]
+    for e in events:
+        type_buffer.append(e)
+    assert type_buffer.getRows() is not None
+    values = [e[-1] for e in type_buffer.getEvents()]
+    assert values[0] == 0.5 and np.isnan(values[1]) and values[2] == -0.25
+
+
+def test_typeBufferClearByFilter():
+    type_buffer = EventTypeBuffer(NUMERIC_EVENT, 8)
+    events = [createEvent(NumericTestEvent, i, i, filter_id=i % 2)
+              for i in range(12)]
+    for e in events:
+        type_buffer.append(e)
+    assert type_buffer.getEvents(filter_id=1) == events[5::2]
+    type_buffer.clear(filter_id=1)
+    assert type_buffer.getEvents() == events[4::2]
+    type_buffer.append(events[0])
+    assert type_buffer.getEvents() == events[4::2] + events[:1]
+
+
+def test_mergedEventOrder():
+    event_buffer = DeviceEventBuffer(50)
+    events = [createEvent(NumericTestEvent, 1.0, 1),
+              createEvent(TextTestEvent, 0.5, 'a'),
+              createEvent(NumericTestEvent, 2.0, 2),
+              createEvent(TextTestEvent, 2.0, 'b'),
+              createEvent(TextTestEvent, 1.5, 'c')]
+    for e in events:
+        event_buffer.append(e)
+    by_time = sorted(events, key=lambda e: e[DeviceEvent.EVENT_HUB_TIME_INDEX])
+    merged = event_buffer.getEvents()
+    assert [e[-1] for e in merged] == ['a', 1, 'c', 2, 'b']
+    assert sorted(merged) == sorted(by_time)
+    assert event_buffer.getEvents(TEXT_EVENT) == [events[1], events[4],
+                                                  events[3]]
+    event_buffer.clear(NUMERIC_EVENT)
+    assert len(event_buffer) == 3
+
+
+def test_sharedLengthDropsOldest():
+    event_buffer = DeviceEventBuffer(4, shared_length=True)
+    events = [createEvent(NumericTestEvent, 0, 0),
+              createEvent(TextTestEvent, 1, 'a'),
+              createEvent(NumericTestEvent, 2, 2),
+              createEvent(NumericTestEvent, 3, 3),
+              createEvent(TextTestEvent, 4, 'b'),
+              createEvent(TextTestEvent, 5, 'c')]
+    for e in events:
+        event_buffer.append(e)
+    assert len(event_buffer) == 4
+    assert event_buffer.getEvents() == events[2:]
+    event_buffer.clear()
+    assert len(event_buffer) == 0
+    assert not event_buffer
+
+
+def test_unsortedTypedEvents():
+    event_buffer = DeviceEventBuffer(10)
+    events = [createEvent(NumericTestEvent, t, i)
+              for i, t in enumerate((1.0, 3.0, 2.0, 2.0))]
+    for e in events:
+        event_buffer.append(e)
+    assert [e[-1] for e in event_buffer.getEvents()] == [0, 2, 3, 1]
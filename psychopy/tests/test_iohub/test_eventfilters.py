@@ -0,0 +1,148 @@
+""" Test ioHub device event filters and the moving window field filters.
+"""
+import numpy as np
+from psychopy.iohub.util import NumPyRingBuffer, RunningMedian
+from psychopy.iohub.devices import Device, DeviceEvent
+from psychopy.iohub.devices.eventfilters import (DeviceEventFilter,
+                                                 MovingWindowFilter,
+                                                 PassThroughFilter,
+                                                 MedianFilter,
+                                                 WeightedAverageFilter,
+                                                 StampFilter)
+
+EVENT_TYPE = 36
+TYPE_IX = DeviceEvent.EVENT_TYPE_ID_INDEX
+FILTER_ID_IX = DeviceEvent.EVENT_FILTER_ID_INDEX
+
+
+class CountingFilter(DeviceEventFilter):
+    def __init__(self, **kwargs):
+        DeviceEventFilter.__init__(self, **kwargs)
+        self.process_calls = []
+
+    @property
+    def filter_id(self):
+        return 5
+
+    @property
+    def input_event_types(self):
+        return {EVENT_TYPE: [0, 5]}
+
+    def process(self):
+        self.process_calls.append(list(self.getInputEvents()))
+        for e in self.getInputEvents():
+            self.addOutputEvent(list(e))
+        self.clearInputEvents()
+
+
+class ReadOnlyFilter(CountingFilter):
+    input_event_copy = None
+
+
+def createDevice(*filters):
+    kwargs = dict((n, None) for n in Device.CLASS_ATTRIBUTE_NAMES)
+    kwargs['event_buffer_length'] = 16
+    device = Device(**kwargs)
+    for i, f in enumerate(filters):
+        f.enable = True
+        device._filters['filter%d' % i] = f
+    return device
+
+
+def createEvent(event_id, filter_id=0):
+    e = [0] * 12
+    e[DeviceEvent.EVENT_ID_INDEX] = event_id
+    e[TYPE_IX] = EVENT_TYPE
+    e[FILTER_ID_IX] = filter_id
+    return e
+
+
+def test_filterEventCopies():
+    deep_filter = CountingFilter()
+    ro_filter = ReadOnlyFilter()
+    device = createDevice(deep_filter, ro_filter)
+    events = [createEvent(i) for i in range(1, 4)]
+    for e in events:
+        device._handleEvent(e)
+
+    # events are queued, process() is called once per processing pass
+    assert deep_filter.process_calls == []
+    outputs = device._processFilterInputEvents()
+    assert len(outputs) == 6
+    assert len(deep_filter.process_calls) == 1
+    assert len(ro_filter.process_calls) == 1
+
+    deep_batch = deep_filter.process_calls[0]
+    ro_batch = ro_filter.process_calls[0]
+    assert deep_batch == events and ro_batch == events
+    assert all(a is not b for a, b in zip(deep_batch, events))
+    assert all(a is b for a, b in zip(ro_batch, events))
+
+    # nothing new queued, so process() is not called again
+    assert device._processFilterInputEvents() == []
+    assert len(deep_filter.process_calls) == 1
+
+
+def test_filterIgnoresOwnOutput():
+    f = CountingFilter()
+    device = createDevice(f)
+    device._handleEvent(createEvent(1, filter_id=5))
+    device._handleEvent(createEvent(2, filter_id=7))
+    assert device._processFilterInputEvents() == []
+
+    f.enable = False
+    device._handleEvent(createEvent(3))
+    assert device._processFilterInputEvents() == []
+    assert f.process_calls == []
+
+
+def test_ringBufferExtend():
+    a = NumPyRingBuffer(5)
+    b = NumPyRingBuffer(5)
+    for block in ([], [1, 2], [3], range(4, 12), [12, 13]):
+        for v in block:
+            a.append(v)
+        b.extend(block)
+        assert len(a) == len(b)
+        assert np.array_equal(a.getElements(), b.getElements())
+
+
+def test_runningMedian():
+    values = np.random.RandomState(1).randint(0, 6, 300)
+    for length in (1, 2, 5, 6):
+        running_median = RunningMedian(length)
+        for i, v in enumerate(values):
+            running_median.append(v)
+            assert running_median.median() == np.median(values[max(i-length+1, 0):i+1])
+
+
+def assertSameResults(r1, r2):
+    assert len(r1) == len(r2)
+    for a, b in zip(r1, r2):
+        if a is None or b is None:
+            assert a is b
+        else:
+            assert a[0] is b[0]
+            assert type(a[1]) == type(b[1])
+            assert np.array_equal(a[1], b[1])
+
+
+def test_addManyMatchesAdd():
+    values = np.random.RandomState(0).uniform(-500, 500, 200)
+    filter_configs = [(MovingWindowFilter, dict(length=5, knot_pos='center')),
+                      (MovingWindowFilter, dict(length=12, knot_pos=3)),
+                      (PassThroughFilter, dict()),
+                      (MedianFilter, dict(length=5, knot_pos=0)),
+                      (MedianFilter, dict(length=4, knot_pos='oldest')),
+                      (WeightedAverageFilter, dict(weights=(25, 50, 25),
+                                                   knot_pos=1)),
+                      (StampFilter, dict(level=1))]
+    for filter_class, kwargs in filter_configs:
+        f1 = filter_class(**kwargs)
+        f2 = filter_class(**kwargs)
+        r1 = [f1.add(v) for v in values]
+        r2 = f2.add_many(values[:3])
+        r2.append(f2.add(values[3]))
+        for i in range(4, len(values), 17):
+            r2.extend(f2.add_many(values[i:i+17]))
+        assertSameResults(r1, r2)
@@ -0,0 +1,66 @@
+""" Test the vectorized ioHub pandas interest area containment against the
+shapely point by point version.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip('shapely')
+pd = pytest.importorskip('pandas')
+from psychopy.iohub.datastore.pandas.interestarea import (Polygon, Circle,
+                                                          Ellipse, Rectangle,
+                                                          find_interest_areas)
+
+
+def createAreas():
+    return [Circle('Circle IA', [0, 0], 400),
+            Rectangle('Rect IA', -200, 200, 200, -200),
+            Ellipse('Ellipse IA', [300, 300], 100, 200, 45),
+            Ellipse('Radians IA', [10.5, -3.25], 50, 75, 0.7,
+                    use_radians=True),
+            Polygon('Concave IA', [(0, 0), (100, 0), (50, 80), (100, 100),
+                                   (0, 100)])]
+
+
+def createPoints(areas):
+    rng = np.random.RandomState(1)
+    points = [rng.uniform(-500, 500, (5000, 2)),
+              rng.randint(-410, 410, (5000, 2)).astype(float),
+              [[np.nan, 0], [0, np.nan]]]
+    for area in areas:
+        # vertices, edge midpoints and points very close to the boundary
+        vertices = np.asarray(area.exterior.coords)
+        points.append(vertices)
+        points.append((vertices[:-1] + vertices[1:]) / 2)
+        centroid = np.asarray(area.centroid.coords)[0]
+        scale = rng.uniform(0.999, 1.001, (len(vertices), 1))
+        points.append(centroid + (vertices - centroid) * scale)
+    return np.vstack(points)
+
+
+def test_containsPointsMatchesShapely():
+    areas = createAreas()
+    points = createPoints(areas)
+    for area in areas:
+        expected = [area.contains(p) for p in points]
+        found = area.contains_points(points[:, 0], points[:, 1])
+        assert found.tolist() == expected, area.name
+
+
+def test_filterAndFindAreas():
+    areas = createAreas()
+    points = createPoints(areas)
+    df = pd.DataFrame({'time': np.arange(len(points)),
+                       'x_position': points[:, 0],
+                       'y_position': points[:, 1]})
+
+    circle_df = areas[0].filter(df)
+    expected = df[[areas[0].contains(p) for p in points]]
+    assert (circle_df.index == expected.index).all()
+    assert (circle_df.ia_id == areas[0].ia_id).all()
+    assert circle_df.ia_id_num.tolist() == range(1, len(expected) + 1)
+
+    ia_ids = find_interest_areas(areas, df)
+    assert (ia_ids.index == df.index).all()
+    for row, point in enumerate(points):
+        containing = [a.ia_id for a in areas if a.contains(point)]
+        assert ia_ids.iloc[row] == (containing[0] if containing else 0)
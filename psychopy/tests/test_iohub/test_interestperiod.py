@@ -0,0 +1,103 @@
+""" Test the sort-merge ioHub pandas interest period matching against a
+simple row by row version.
+"""
+import numpy as np
+import pytest
+
+pd = pytest.importorskip('pandas')
+from psychopy.iohub.datastore.pandas.interestperiod import (
+    EventBasedIP, ConditionVariableBasedIP)
+
+
+def createData(seed=0):
+    rng = np.random.RandomState(seed)
+    messages = []
+    events = []
+    # session 3 has a single trial, session 4 has no trials at all
+    for session, nTrials in [(1, 8), (2, 5), (3, 1), (4, 0)]:
+        t = 0.
+        trialTimes = []
+        for trial in range(nTrials):
+            t += rng.uniform(0.5, 1)
+            messages.append((1, session, t, 'TRIAL_START', len(messages)))
+            trialTimes.append(t)
+            t += rng.uniform(1, 3)
+            messages.append((1, session, t, 'TRIAL_END', len(messages)))
+            trialTimes.append(t)
+        # events on the period boundaries are inside the period
+        times = np.sort(np.r_[rng.uniform(0, t + 1, 100), trialTimes])
+        events.extend((1, session, time, len(events)) for time in times)
+    events.append((1, 1, np.nan, len(events)))
+    messages = pd.DataFrame(messages, columns=['experiment_id', 'session_id',
+                                               'time', 'text', 'event_id'])
+    events = pd.DataFrame(events, columns=['experiment_id', 'session_id',
+                                           'time', 'event_id'])
+    return (messages.set_index(['experiment_id', 'session_id']),
+            events.set_index(['experiment_id', 'session_id']))
+
+
+def periodsOf(ip, index):
+    ips = ip.ip_df
+    return [(start, end, num) for idx, start, end, num
+            in zip(ips.index, ips.start_time, ips.end_time, ips.ip_id_num)
+            if idx == index]
+
+
+def test_eventBasedFind():
+    messages, events = createData()
+    ip = EventBasedIP(name='trial_ip', start_source_df=messages,
+                      start_criteria={'text': 'TRIAL_START'},
+                      end_criteria={'text': 'TRIAL_END'})
+    ips = ip.ip_df
+    assert len(ips) == 14
+    assert ips.ix[(1, 2)].ip_id_num.tolist() == range(5)
+    assert (ips.start_time < ips.end_time).all()
+
+    expected = []
+    for index in sorted(set(events.index)):
+        sessionEvents = events.ix[[index]]
+        for start, end, num in periodsOf(ip, index):
+            for eventId, time in zip(sessionEvents.event_id,
+                                     sessionEvents.time):
+                if start <= time <= end:
+                    expected.append((index, eventId, num))
+    found = ip.find(events)
+    assert list(zip(found.index, found.event_id, found.ip_id_num)) == expected
+    assert (found.ip_id == ip.ipid).all()
+    assert (found.ip_name == 'trial_ip').all()
+
+    found = ip.find(events, ip_cols={'start_time': 'trial_start'})
+    assert (found.time >= found.trial_start).all()
+
+
+def test_conditionBasedFilter():
+    messages, events = createData(1)
+    # overlapping periods, numbered across all the sessions
+    conditions = pd.DataFrame({'experiment_id': 1,
+                               'session_id': [1, 1, 1, 2, 3],
+                               'TRIAL_START': [1., 5., 7., 2., 0.5],
+                               'TRIAL_END': [4., 9., 8., 3., 1.]})
+    conditions = conditions.set_index(['experiment_id', 'session_id'])
+    ip = ConditionVariableBasedIP(name='cv_ip', source_df=conditions,
+                                  start_col_name='TRIAL_START',
+                                  end_col_name='TRIAL_END')
+    assert ip.ip_df.ip_id_num.tolist() == range(1, 6)
+
+    expected = []
+    for index, eventId, time in zip(events.index, events.event_id,
+                                    events.time):
+        # the most recently started period the event falls within
+        within = [p for p in periodsOf(ip, index) if p[0] <= time <= p[1]]
+        if within:
+            within.sort(key=lambda p: p[0])
+            expected.append((index, eventId, within[-1][2]))
+    filtered = ip.filter(events)
+    assert list(zip(filtered.index, filtered.event_id,
+                    filtered.ip_id_num)) == expected
+    # the third period ends within the second one
+    late = filtered.ix[[(1, 1)]]
+    late = late[(late.time > 8) & (late.time <= 9)]
+    assert len(late) and (late.ip_id_num == 2).all()
+
+    filtered = ip.filter(events, ip_cols='end_time')
+    assert (filtered.time <= filtered.end_time).all()
@@ -0,0 +1,176 @@
+""" Test the ioHub EventPublisher and RemoteEventSubscriber devices, with
+and without event batching, over a local ipc:// endpoint.
+"""
+import os
+import tempfile
+import numpy
+import gevent
+
+from psychopy.tests.test_iohub.testutil import skip_under_windoz
+from psychopy.iohub import IO_HUB_DIRECTORY, Computer, EventConstants
+from psychopy.iohub import load, Loader
+from psychopy.iohub.net import TimeSyncState
+from psychopy.iohub.devices.network import (EventPublisher,
+                                            RemoteEventSubscriber)
+
+PRESS = EventConstants.KEYBOARD_PRESS
+RELEASE = EventConstants.KEYBOARD_RELEASE
+OFFSET = 1234.5
+
+
+class PressEvent(object):
+    EVENT_TYPE_ID = PRESS
+
+
+class ReleaseEvent(object):
+    EVENT_TYPE_ID = RELEASE
+
+
+def registerEventClasses():
+    """The EventPublisher names published messages after the event class,
+    which the ioHub Server normally registers when loading devices"""
+    for event_class in (PressEvent, ReleaseEvent):
+        event_id = event_class.EVENT_TYPE_ID
+        if (EventConstants._classes is None or
+                EventConstants.getClass(event_id) is None):
+            EventConstants.addClassMappings(None, [event_id],
+                                            {'event': event_class})
+
+
+def loadConfig(file_name, **settings):
+    dconfig_path = os.path.join(IO_HUB_DIRECTORY, 'devices', 'network',
+                                file_name)
+    _dclass, dconfig = load(open(dconfig_path, 'r'), Loader=Loader).popitem()
+    dconfig.update(settings)
+    return dconfig
+
+
+def createEvent(event_id, event_type=PRESS):
+    """An event logged 'now' on a remote ioHub, whose clock is OFFSET sec.
+    ahead of the local one"""
+    remote_time = Computer.currentSec() + OFFSET
+    e = [0] * 12
+    e[3] = event_id
+    e[4] = event_type
+    e[5] = remote_time
+    e[6] = remote_time
+    e[7] = remote_time
+    return e
+
+
+def createPair(address, **publisher_settings):
+    """A connected publisher and subscriber, with the subscriber clock model
+    set as if synced with the remote ioHub"""
+    registerEventClasses()
+    publisher = EventPublisher(dconfig=loadConfig(
+        'default_eventpublisher.yaml', publishing_protocal=address,
+        **publisher_settings))
+    subscriber = RemoteEventSubscriber(dconfig=loadConfig(
+        'default_remoteeventsubscriber.yaml', subscription_protocal=address,
+        remote_iohub_address=None))
+    state = TimeSyncState()
+    now = Computer.currentSec()
+    for t in numpy.linspace(now - 1, now, 8):
+        state.addSample(0.0002, t, t + OFFSET)
+    subscriber._time_sync_state = state
+
+    # wait for the subscription to reach the publisher
+    while True:
+        publisher._handleEvent(createEvent(0, RELEASE))
+        publisher._flushBatches()
+        if subscriber._sub_socket.poll(10):
+            gevent.sleep(0.05)
+            subscriber._receiveEvents()
+            subscriber._native_event_buffer.clear()
+            return publisher, subscriber
+
+
+def closePair(publisher, subscriber):
+    publisher._close()
+    subscriber._close()
+
+
+def receive(subscriber, count):
+    events = []
+    while len(events) < count:
+        assert subscriber._sub_socket.poll(1000), "published events lost"
+        subscriber._receiveEvents()
+        events.extend(subscriber._native_event_buffer)
+        subscriber._native_event_buffer.clear()
+    return events
+
+
+def measureDelivery(publisher, subscriber, count, chunk_size=50):
+    """Publish count events, chunk_size at a time, returning the events
+    per second delivered and the mean publish to receipt delay"""
+    delays = []
+    start = Computer.currentSec()
+    for c in range(0, count, chunk_size):
+        for i in range(c, c + chunk_size):
+            publisher._handleEvent(createEvent(i))
+        delays.extend(e[9] for e in receive(subscriber, chunk_size))
+    duration = Computer.currentSec() - start
+    return count / duration, numpy.mean(delays)
+
+
+def ipcAddress():
+    return 'ipc://' + os.path.join(tempfile.gettempdir(),
+                                   'iohub_pubsub_%d' % os.getpid())
+
+
+@skip_under_windoz
+def test_publishedEvents():
+    for settings in [{}, dict(batch_events=True, batch_size=8)]:
+        publisher, subscriber = createPair(ipcAddress(), **settings)
+        try:
+            sent = [createEvent(i, [PRESS, RELEASE][i % 3 == 0])
+                    for i in range(1, 41)]
+            for e in sent:
+                publisher._handleEvent(e)
+            publisher._flushBatches()
+            received = receive(subscriber, len(sent))
+            now = Computer.currentSec()
+            assert len(received) == len(sent)
+            # the order of the events of each type is kept
+            for event_type in (PRESS, RELEASE):
+                assert ([e[5] for e in received if e[4] == event_type] ==
+                        [e[5] for e in sent if e[4] == event_type])
+            for e in received:
+                assert e[2] == publisher.device_number
+                assert abs(e[7] - (e[5] - OFFSET)) < 0.001
+                assert e[7] <= e[6] <= now
+                assert 0 <= e[9] < 1
+            event_ids = [e[3] for e in received]
+            assert event_ids == sorted(set(event_ids))
+            # the local events are left as they were
+            assert sent[0][2] == 0 and sent[0][3] == 1
+        finally:
+            closePair(publisher, subscriber)
+
+
+@skip_under_windoz
+def test_batchWindow():
+    publisher, subscriber = createPair(ipcAddress(), batch_events=True,
+                                       batch_size=16, batch_interval=0.05)
+    try:
+        # a batch is sent when full ...
+        for i in range(15):
+            publisher._handleEvent(createEvent(i))
+        assert not subscriber._sub_socket.poll(10)
+        publisher._handleEvent(createEvent(15))
+        assert subscriber._sub_socket.poll(1000)
+        assert subscriber._receiveEvents() == 16
+        subscriber._native_event_buffer.clear()
+
+        # ... or once the batch interval has passed
+        start = Computer.currentSec()
+        publisher._handleEvent(createEvent(16))
+        publisher._handleEvent(createEvent(17, RELEASE))
+        assert len(receive(subscriber, 2)) == 2
+        # (gevent timers start from the cached event loop time)
+        assert Computer.currentSec() - start >= 0.025
+
+        rate, delay = measureDelivery(publisher, subscriber, 500)
+        assert rate > 0 and delay < 0.5
+    finally:
+        closePair(publisher, subscriber)
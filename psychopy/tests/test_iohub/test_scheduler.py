@@ -0,0 +1,129 @@
+""" Test the ioHub Server DeviceScheduler without starting the iohub process.
+"""
+import os
+import gevent
+from psychopy.tests.test_iohub.testutil import skip_under_windoz
+from psychopy.iohub.server import DeviceScheduler, DeviceMonitor
+
+
+class PollCounter(object):
+    def __init__(self, fd=None):
+        self.poll_count = 0
+        self.fd = fd
+        # like a Serial device, fd data is only read while reporting events
+        self.reporting = True
+
+    def _poll(self):
+        self.poll_count += 1
+        if self.fd is not None and self.reporting:
+            os.read(self.fd, 1024)
+
+    def _isPollFileDescriptorActive(self):
+        return self.reporting
+
+
+class EventProcessor(object):
+    def __init__(self):
+        self.call_count = 0
+
+    def processDeviceEvents(self):
+        self.call_count += 1
+
+
+def runScheduler(scheduler, duration):
+    scheduler.start()
+    gevent.sleep(duration)
+    scheduler.running = False
+    gevent.sleep(0.02)
+
+
+def test_timerDevicesShareOneGreenlet():
+    hub = EventProcessor()
+    scheduler = DeviceScheduler(hub)
+    fast = PollCounter()
+    slow = PollCounter()
+    scheduler.addMonitor(DeviceMonitor(fast, 0.005))
+    scheduler.addMonitor(DeviceMonitor(slow, 0.02))
+    runScheduler(scheduler, 0.2)
+
+    # (counts depend on how busy the machine is, so only compare them)
+    assert fast.poll_count > 2 * slow.poll_count > 0
+    assert hub.call_count >= slow.poll_count
+
+    stats = scheduler.getStatistics()
+    assert len(stats) == 2
+    for s in stats:
+        assert s['mode'] == 'timer'
+        assert s['busy_time'] >= 0.0
+        assert s['max_latency'] >= s['mean_latency'] >= 0.0
+
+
+@skip_under_windoz
+def test_fdDevicePolledOnlyWhenReadable():
+    hub = EventProcessor()
+    scheduler = DeviceScheduler(hub)
+    rfd, wfd = os.pipe()
+    try:
+        device = PollCounter(rfd)
+        scheduler.addMonitor(DeviceMonitor(device, 0.001, rfd))
+
+        def writer():
+            for i in range(5):
+                gevent.sleep(0.03)
+                os.write(wfd, 'x')
+        gevent.spawn(writer)
+        runScheduler(scheduler, 0.2)
+
+        assert device.poll_count == 5
+        stats = scheduler.getStatistics()[0]
+        assert stats['mode'] == 'fd'
+        assert stats['poll_count'] == 5
+    finally:
+        os.close(rfd)
+        os.close(wfd)
+
+
+@skip_under_windoz
+def test_fdDeviceNotReadingUsesTimer():
+    hub = EventProcessor()
+    scheduler = DeviceScheduler(hub)
+    rfd, wfd = os.pipe()
+    try:
+        device = PollCounter(rfd)
+        device.reporting = False
+        monitor = scheduler.addMonitor(DeviceMonitor(device, 0.02, rfd))
+        # bytes that the device leaves unread keep the fd readable
+        os.write(wfd, 'pending')
+        other = []
+        results = {}
+
+        def otherGreenlet():
+            for i in range(20):
+                other.append(1)
+                gevent.sleep(0.005)
+
+        def check():
+            gevent.sleep(0.2)
+            results['not_reading'] = (device.poll_count, len(other),
+                                      scheduler.getStatistics()[0]['mode'])
+            # back to fd polling once the device reads its data again
+            device.reporting = True
+            gevent.sleep(0.1)
+            results['reading'] = (device.poll_count, monitor.fd_suspended,
+                                  scheduler.getStatistics()[0]['mode'])
+        gevent.spawn(otherGreenlet)
+        gevent.spawn(check)
+        runScheduler(scheduler, 0.35)
+
+        # polled on the timer rather than spinning on the readable fd
+        poll_count, other_count, mode = results['not_reading']
+        assert 0 < poll_count <= 20
+        assert mode == 'timer'
+        assert other_count == 20
+        # the pending bytes have been read, and there is nothing more
+        poll_count, suspended, mode = results['reading']
+        assert not suspended and mode == 'fd'
+        assert device.poll_count == poll_count
+    finally:
+        os.close(rfd)
+        os.close(wfd)
@@ -0,0 +1,107 @@
+""" Test the ioHub Serial device event parsing using a pty loopback.
+"""
+import os
+import time
+from psychopy.tests.test_iohub.testutil import skip_under_windoz
+from psychopy.iohub import IO_HUB_DIRECTORY, Computer, EventConstants
+from psychopy.iohub import load, Loader
+from psychopy.iohub.devices.serial import Serial, SerialFrameParser
+
+
+def test_frameParserDelimiter():
+    parser = SerialFrameParser(delimiter='\n')
+    assert parser.feed('abc') == []
+    assert parser.feed('\nde\nfg') == [(1, 'abc'), (4, 'de')]
+    assert parser.feed('h\n\n') == [(2, 'fgh'), (3, '')]
+    assert len(parser.buffer) == 0
+
+
+def test_frameParserPrefixAndDelimiter():
+    parser = SerialFrameParser(prefix='>>', delimiter='\r\n')
+    assert parser.feed('junk>') == []
+    assert parser.feed('>one\r') == []
+    assert parser.feed('\nxx>>two\r\n>>thr') == [(1, 'one'), (10, 'two')]
+    assert parser.feed('ee\r\n') == [(4, 'three')]
+
+
+def test_frameParserFixedLength():
+    parser = SerialFrameParser(fixed_length=3)
+    assert parser.feed('abcdefg') == [(3, 'abc'), (6, 'def')]
+    assert parser.feed('hi') == [(2, 'ghi')]
+    parser.feed('xy')
+    parser.reset()
+    assert parser.feed('123') == [(3, '123')]
+
+
+def createSerialDevice(port, event_parser):
+    dconfig_path = os.path.join(IO_HUB_DIRECTORY, 'devices', 'serial',
+                                'default_serial.yaml')
+    _dclass, dconfig = load(open(dconfig_path, 'r'), Loader=Loader).popitem()
+    dconfig['port'] = port
+    dconfig['event_parser'] = event_parser
+    dconfig['auto_report_events'] = True
+    return Serial(dconfig=dconfig)
+
+
+@skip_under_windoz
+class TestSerialLoopback(object):
+    def setup_method(self, method):
+        self.master, slave = os.openpty()
+        self.slave_name = os.ttyname(slave)
+        self.slave = slave
+        self.device = None
+
+    def teardown_method(self, method):
+        if self.device:
+            self.device.closeSerial()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def pollEvents(self, data):
+        os.write(self.master, data)
+        time.sleep(0.05)
+        self.device._poll()
+        events = list(self.device._getNativeEventBuffer())
+        self.device._getNativeEventBuffer().clear()
+        return events
+
+    def test_allFramesPerPoll(self):
+        self.device = createSerialDevice(self.slave_name,
+                                         dict(delimiter=r'\n'))
+        self.device._last_poll_time = Computer.getTime()
+        events = self.pollEvents('one\ntwo\nthree\nfo')
+        assert [e[-1] for e in events] == ['one', 'two', 'three']
+        assert all(e[4] == EventConstants.SERIAL_INPUT for e in events)
+        times = [e[5] for e in events]
+        assert times == sorted(times)
+        assert times[0] < times[-1]
+
+        events = self.pollEvents('ur\n')
+        assert [e[-1] for e in events] == ['four']
+
+    def test_idleGapBeforeBurst(self):
+        self.device = createSerialDevice(self.slave_name,
+                                         dict(delimiter=r'\n'))
+        # the device was last polled long before the burst was sent
+        self.device._last_poll_time = Computer.getTime()-5.0
+        events = self.pollEvents('one\ntwo\nthree\n')
+        assert [e[-1] for e in events] == ['one', 'two', 'three']
+        # 14 bytes at 9600 baud, plus the 1 msec device_timer interval
+        max_period = 14*10/9600.0+0.001
+        # slack for rounding in the interpolated times
+        tolerance = 0.0005
+        read_time = events[-1][5]
+        for e in events:
+            assert read_time-max_period-tolerance <= e[5] <= read_time
+            assert 0 <= e[8] <= max_period+tolerance
+        assert events[0][5] < events[-1][5]
+
+    def test_byteDiffMode(self):
+        self.device = createSerialDevice(self.slave_name,
+                                         dict(byte_diff=True))
+        self.device._last_poll_time = Computer.getTime()
+        events = self.pollEvents('\x00\x00\x01\x01\x03')
+        assert [(e[-2], e[-1]) for e in events] == [(0, 1), (1, 3)]
+        assert all(e[4] == EventConstants.SERIAL_BYTE_CHANGE for e in events)
+        events = self.pollEvents('\x03\x00')
+        assert [(e[-2], e[-1]) for e in events] == [(3, 0)]
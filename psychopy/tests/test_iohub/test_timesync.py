@@ -0,0 +1,115 @@
+""" Test the ioHub TimeSyncState clock model against simulated remote peers
+with a known drift and offset.
+"""
+import socket
+import threading
+import time
+import numpy
+import msgpack
+
+from psychopy.iohub import Computer
+from psychopy.iohub.net import TimeSyncState, ioHubTimeSyncManager
+
+DRIFT = 1 + 50e-6
+OFFSET = 1234.5
+
+
+def remoteTime(local_time):
+    return DRIFT * local_time + OFFSET
+
+
+def simulatedSample(rng, t, batch_size=5):
+    """The shortest RTT sync request of a batch, with random (and
+    occasionally very long) network delays in each direction"""
+    best = None
+    for b in range(batch_size):
+        delays = (0.0002 + rng.exponential(0.0001, 2) +
+                  (rng.rand(2) < 0.1) * rng.exponential(0.005, 2))
+        send = t + b * 0.001
+        receive = send + delays.sum()
+        sample = (receive - send, (send + receive) / 2,
+                  remoteTime(send + delays[0]))
+        if best is None or sample[0] < best[0]:
+            best = sample
+    return best
+
+
+def test_simulatedPeer():
+    rng = numpy.random.RandomState(0)
+    state = TimeSyncState()
+    other = TimeSyncState()
+    assert numpy.isnan(state.getAccuracy())
+
+    t = 1000.0
+    for i in range(200):
+        t += 0.2
+        if rng.rand() < 0.05:
+            # a whole batch delayed on the way to the peer
+            state.addSample(0.021, t + 0.0105, remoteTime(t + 0.02))
+        else:
+            state.addSample(*simulatedSample(rng, t))
+        if i < 20:
+            continue
+        now = t + 0.1
+        assert abs(state.remote2LocalTime(remoteTime(now)) - now) < 100e-6
+        assert abs(state.local2RemoteTime(now) - remoteTime(now)) < 100e-6
+        assert abs(state.getDrift() - DRIFT) < 20e-6
+        assert state.getAccuracy() < 0.001
+        assert abs(state.local2RemoteTime(now) -
+                   (state.getDrift() * now + state.getOffset())) < 1e-6
+    # each state has its own samples
+    assert len(other.RTTs) == 0
+    assert len(state.drifts) == 20
+
+
+class SkewedPeer(object):
+    """Replies to ioHub sync requests on a loopback UDP socket with a
+    skewed clock, sometimes after a delay"""
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.address = self.sock.getsockname()
+        self.running = True
+        self.rng = numpy.random.RandomState(1)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        unpacker = msgpack.Unpacker(use_list=True)
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            unpacker.feed(data)
+            assert unpacker.unpack() == ['SYNC_REQ']
+            if self.rng.rand() < 0.2:
+                time.sleep(0.002)
+            self.sock.sendto(msgpack.packb(['SYNC_REPLY',
+                                            remoteTime(Computer.currentSec())]),
+                             address)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+
+def test_loopbackPeer():
+    peer = SkewedPeer()
+    state = TimeSyncState()
+    manager = ioHubTimeSyncManager(peer.address, state)
+    try:
+        manager.sync(False)
+        for i in range(40):
+            time.sleep(0.005)
+            manager.sync()
+    finally:
+        manager.close()
+        peer.close()
+    now = Computer.currentSec()
+    error = abs(state.remote2LocalTime(remoteTime(now)) - now)
+    assert error < max(state.getAccuracy(), 0.001)
+    assert abs(state.getDrift() - DRIFT) < 0.01
@@ -1,4 +1,8 @@
-from psychopy.tools.colorspacetools import hsv2rgb
+from psychopy.tools.colorspacetools import (hsv2rgb, dkl2rgb, lms2rgb,
+                                            rgb2dklCart, rgb2lms,
+                                            ColorSpaceConverter,
+                                            getColorSpaceConverter)
+from psychopy.tools import colorspacetools
 import numpy
 
 #We need more tests of these conversion routines. Feel free to jump in and help! ;-)
@@ -40,5 +44,70 @@ def test_HSV_RGB():
     RGB = hsv2rgb(HSV)
     assert numpy.allclose(RGB,expectedRGB,0.0001)
 
+def test_converterMatchesDKLLoop():
+    dkl = numpy.array([[90, 0, 1], [0, 0, 1], [0, 90, 1], [45, 30, 0.5]])
+    M = colorspacetools._defaultDKL_RGB
+    expected = []
+    for elev, azim, radius in dkl:
+        elev, azim = numpy.radians([elev, azim])
+        cart = [radius * numpy.sin(elev),
+                radius * numpy.cos(elev) * numpy.cos(azim),
+                radius * numpy.cos(elev) * numpy.sin(azim)]
+        expected.append(numpy.dot(M, cart))
+    conv = ColorSpaceConverter()
+    assert numpy.allclose(conv.dkl2rgb(dkl), expected)
+    assert numpy.allclose(dkl2rgb(dkl), expected)
+    assert numpy.allclose(dkl2rgb(dkl[1]), expected[1])
+    # NxMx3 images keep their shape
+    image = numpy.tile(dkl, (2, 1, 1))
+    assert numpy.allclose(dkl2rgb(image), [expected, expected])
+
+
+def test_converterInPlaceAndInverse():
+    rng = numpy.random.RandomState(1)
+    dkl_rgb = numpy.eye(3) + rng.rand(3, 3)
+    lms_rgb = numpy.eye(3) + rng.rand(3, 3)
+    conv = ColorSpaceConverter(dkl_rgb, lms_rgb)
+    rgb = rng.uniform(-1, 1, (50, 3))
+    lms = conv.rgb2lms(rgb)
+    assert numpy.allclose(lms, rgb2lms(rgb, lms_rgb))
+    assert numpy.allclose(conv.lms2rgb(lms), rgb)
+    dklCart = rgb2dklCart(rgb, dkl_rgb)
+    assert numpy.allclose(conv.dklCart2rgb(dklCart), rgb)
+    # composed lms<->dkl matrices agree with going through rgb
+    assert numpy.allclose(conv.lms2dklCart(lms), dklCart)
+    dkl = numpy.array([[10, 20, 1], [-30, 200, 0.5]])
+    assert numpy.allclose(conv.dkl2lms(dkl),
+                          conv.rgb2lms(conv.dkl2rgb(dkl)))
+    # in place
+    data = lms.copy()
+    result = conv.lms2rgb(data, out=data)
+    assert result is data
+    assert numpy.allclose(data, rgb)
+    out = numpy.empty_like(rgb)
+    conv.rgb2lms(rgb, out=out)
+    assert numpy.allclose(out, lms)
+
+
+def test_converterCachedAndWarnsOnce():
+    calls = []
+    oldWarning = colorspacetools.logging.warning
+    colorspacetools.logging.warning = calls.append
+    colorspacetools._converterCache.clear()
+    try:
+        for i in range(5):
+            dkl2rgb(numpy.array([0, 0, 1]))
+            lms2rgb(numpy.array([1, 0, 0]))
+        assert len(calls) == 2
+        calibrated = numpy.eye(3) * 2
+        lms2rgb(numpy.array([1, 0, 0]), calibrated)
+        assert len(calls) == 2
+    finally:
+        colorspacetools.logging.warning = oldWarning
+    assert (getColorSpaceConverter(lms_rgb=calibrated) is
+            getColorSpaceConverter(lms_rgb=calibrated.copy()))
+    assert getColorSpaceConverter() is not getColorSpaceConverter(calibrated)
+
+
 if __name__=='__main__':
     test_HSV_RGB()
@@ -13,3 +13,51 @@ def test_GammaInverse_Eq1():
 def test_GammaInverse_Eq4():
     xx= calibTools.gammaInvFun(yy, minLum, maxLum, gamma, b=0, eq=4)
     assert numpy.allclose(xx,xxTest,0.0001)
+
+def test_lineariseLumsLUT():
+    from psychopy import monitors
+    mon = monitors.Monitor('testLineariseLUT', autoLog=False)
+    grid = numpy.array([[0.5, 80, 2.2, 0, 0.2, 0], [0.5, 30, 2.0, 0, 0.3, 0],
+                        [0.5, 50, 2.4, 0, 0.1, 0], [0.5, 10, 2.1, 0, 0.25, 0]])
+    mon.setGammaGrid(grid)
+    levels = numpy.linspace(0, 255, 8)
+    mon.setLevelsPre(levels)
+    mon.setLumsPre(numpy.array([0.5 + grid[gun, 1] * (levels / 255.0)**grid[gun, 2]
+                                for gun in range(4)]))
+    rng = numpy.random.RandomState(0)
+    lums = rng.rand(5000, 3)
+    lums[:10] = [0, 0.5, 1]
+    dark = lums < 0.01
+    for method in [1, 2, 3, 4]:
+        mon.setLineariseMethod(method)
+        exact = mon.lineariseLums(lums, useLUT=False)
+        assert exact.shape == lums.shape
+        fromLUT = mon.lineariseLums(lums)
+        assert mon.getLinearizeLUT().shape == (2**16, 4)
+        # the inverse of gamma is steepest for the darkest values
+        assert numpy.abs(fromLUT - exact).max() < 0.003
+        assert numpy.abs(fromLUT - exact)[~dark].max() < 2e-5
+        nearest = mon.lineariseLums(lums, interpolateLUT=False)
+        assert numpy.abs(nearest - exact)[~dark].max() < 0.001
+        assert numpy.allclose(mon.lineariseLums(lums[:, 0]),
+                              mon.lineariseLums(lums[:, 0], useLUT=False),
+                              atol=0.003)
+        if method != 3:
+            # values outside 0:1 are converted directly
+            assert numpy.allclose(mon.lineariseLums(lums * 255),
+                                  mon.lineariseLums(lums * 255, useLUT=False))
+    # a new calibration gives a new table
+    mon.setLineariseMethod(1)
+    before = mon.lineariseLums(lums)
+    grid[1:, 2] = 1.0
+    mon.setGammaGrid(grid)
+    assert numpy.allclose(mon.lineariseLums(lums), lums)
+    assert not numpy.allclose(before, lums)
+    mon.setLineariseMethod(3)
+    before = mon.lineariseLums(lums)
+    mon.setLumsPre(numpy.array([0.5 + grid[gun, 1] * levels / 255.0
+                                for gun in range(4)]))
+    assert numpy.allclose(mon.lineariseLums(lums), lums)
+    assert not numpy.allclose(before, lums)
+    mon.linearizeLUTBits = 10
+    assert len(mon.getLinearizeLUT()) == 1024
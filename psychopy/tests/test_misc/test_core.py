@@ -17,8 +17,10 @@ Jan 2014, Jeremy Gray:
 - Coverage of .quit, .shellCall, and increased coverage of StaticPeriod()
 """
 
+import os
 import time
 import sys
+import threading
 import numpy as np
 import psychopy
 import psychopy.logging as logging
@@ -313,6 +315,44 @@ def testWait(duration=1.55):
 
     printf("-------------------------------------\n")
 
+def testWaitCPUUse():
+    # a calibrated wait only polls the clock for this machine's sleep
+    # overshoot, rather than for the final 0.2 s
+    from psychopy import clock
+    assert 0 < clock.calibrateSleep() <= 0.2
+    cpu = sum(os.times()[:2])
+    lateness = [wait(0.2) for i in range(5)]
+    assert sum(os.times()[:2]) - cpu < 0.5
+    assert all(0 <= late < 0.02 for late in lateness)
+    assert 0 <= wait(0.05, hogCPUperiod=0.05) < 0.02
+
+def testWaitCalibrationDeadline():
+    # the sleep calibration is never allowed to make a wait late
+    from psychopy import clock
+    margin = clock.sleepMargin
+    try:
+        clock.sleepMargin = None
+        assert clock.calibrateSleep(deadline=getTime()) is None
+        assert clock.sleepMargin is None
+        assert 0 <= wait(0.15) < 0.02
+        assert clock.sleepMargin is None
+        assert 0 <= wait(0.7) < 0.02
+        assert clock.sleepMargin is not None
+    finally:
+        clock.sleepMargin = margin
+
+@pytest.mark.skipif(sys.platform == 'win32',
+                    reason="waitForEvents sleeps in 1 ms slices on Windows")
+def testWaitForEvents():
+    from psychopy import clock
+    waker = threading.Timer(0.05, clock.wake)
+    waker.start()
+    t1 = getTime()
+    assert clock.waitForEvents(2) is True
+    assert 0.04 < getTime() - t1 < 0.5
+    assert clock.waitForEvents(0.05) is False
+    assert clock.waitForEvents(0) is False
+
 def testLoggingDefaultClock():
     try:
         t1=logging.defaultClock.getTime()
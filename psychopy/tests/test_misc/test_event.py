@@ -14,6 +14,7 @@ import pytest
 import copy
 import threading
 import os
+import sys
 
 """test with both pyglet and pygame:
     cd psychopy/psychopy/
@@ -149,6 +150,36 @@ class _baseTest(object):
             assert result[0][0] == k
             assert result[0][1] - delay < .01  # should be ~0 except for execution time
 
+    def test_waitKeys_blocks(self):
+        # waitKeys blocks until a key is emulated rather than spinning
+        c = core.Clock()
+        cpu = sum(os.times()[:2])
+        keyThread = DelayedFakeKey('s', delay=0.3)
+        keyThread.start()
+        result = event.waitKeys(maxWait=2, timeStamped=c)
+        returned = c.getTime()
+        keyThread.join()
+        assert result[0][0] == 's'
+        assert 0 <= returned - result[0][1] < 0.02
+        assert sum(os.times()[:2]) - cpu < 0.2
+
+        assert event.waitKeys(maxWait=0.2) is None
+        assert 0.2 <= c.getTime() - returned < 0.25
+
+    def test_waitKeys_spinsOnWindows(self, monkeypatch):
+        # sleeping would quantise the key times to the Windows timer tick
+        def waitForEvents(timeout=None, fds=()):
+            raise AssertionError("waitKeys slept")
+        monkeypatch.setattr(sys, 'platform', 'win32')
+        monkeypatch.setattr(event, '_windowEventFds', lambda: None)
+        monkeypatch.setattr(event.psychopy.clock, 'waitForEvents',
+                            waitForEvents)
+        keyThread = DelayedFakeKey('s', delay=0.05)
+        keyThread.start()
+        result = event.waitKeys(maxWait=2)
+        keyThread.join()
+        assert result == ['s']
+
     def test_misc(self):
         assert event.xydist([0,0], [1,1]) == sqrt(2)
 
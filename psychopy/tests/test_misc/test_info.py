@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import sys
 from psychopy import info, visual
 import pytest
 
@@ -15,4 +16,31 @@ class TestInfo(object):
         self.win.close()
 
     def test_info(self):
-        info.RunTimeInfo(win=self.win, userProcsDetailed=True, verbose=True)
+        runInfo = info.RunTimeInfo(win=self.win, userProcsDetailed=True,
+                                   verbose=True)
+        assert 'systemProbesCached' in runInfo
+        assert any(k.startswith('systemProbe.') for k in runInfo)
+
+
+def test_probeRunner(tmpdir):
+    cacheFile = str(tmpdir.join('probes.json'))
+    printProbe = [sys.executable, '-c', 'print "probe"']
+    probes = info._ProbeRunner(timeout=0.5, cacheFile=cacheFile)
+    probes.start('print', printProbe, cache=True)
+    probes.start('slow', [sys.executable, '-c', 'import time; time.sleep(5)'])
+    probes.start('missing', ['no_such_psychopy_probe'])
+    assert probes.result('print') == ('probe', '')
+    assert probes.result('slow') is None
+    assert probes.timedOut == ['slow'] and probes.times['slow'] < 2
+    assert probes.result('missing') is None
+    assert probes.missing == ['missing'] and 'missing' not in probes.times
+    probes.close()
+
+    # the output is re-used while the boot time and program are unchanged
+    probes = info._ProbeRunner(cacheFile=cacheFile)
+    if probes.bootTime is None:
+        pytest.skip('boot time not available')
+    assert probes.run('print', printProbe, cache=True) == ('probe', '')
+    assert probes.cached == ['print'] and probes.times['print'] == 0
+    assert probes.run('other', printProbe) == ('probe', '')
+    assert probes.cached == ['print']
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for psychopy.tools.monitorunittools
+
+"""
+import numpy as np
+import pytest
+from psychopy import monitors
+from psychopy.tools.monitorunittools import convertToPix, deg2pix, cm2pix
+
+
+class FakeWindow(object):
+    def __init__(self, monitor, size=(1024, 768)):
+        self.monitor = monitor
+        self.size = np.array(size)
+
+
+class TestConvertToPix(object):
+    def setup_method(self, method):
+        self.monitor = monitors.Monitor('testUnits', width=40.0,
+                                        distance=57.0)
+        self.monitor.setSizePix([1024, 768])
+        self.win = FakeWindow(self.monitor)
+        rs = np.random.RandomState(0)
+        self.vertices = rs.uniform(-10, 10, (20, 2))
+        self.pos = np.array([2.0, -3.0])
+
+    def test_linearUnits(self):
+        verts = self.pos + self.vertices
+        assert np.allclose(convertToPix(self.vertices, self.pos, 'cm', self.win),
+                           cm2pix(verts, self.monitor))
+        assert np.allclose(convertToPix(self.vertices, self.pos, 'deg', self.win),
+                           deg2pix(verts, self.monitor))
+
+    def test_flatUnits(self):
+        verts = self.pos + self.vertices
+        assert np.allclose(convertToPix(self.vertices, self.pos, 'degFlat', self.win),
+                           deg2pix(verts, self.monitor, correctFlat=True))
+        expected = (deg2pix(self.pos, self.monitor, correctFlat=True) +
+                    deg2pix(self.vertices, self.monitor))
+        assert np.allclose(convertToPix(self.vertices, self.pos, 'degFlatPos', self.win),
+                           expected)
+
+    def test_monitorChanges(self):
+        pix = convertToPix(self.vertices, self.pos, 'deg', self.win)
+        self.monitor.setDistance(114.0)
+        assert np.allclose(convertToPix(self.vertices, self.pos, 'deg', self.win),
+                           pix * 2)
+        self.monitor.setSizePix([2048, 1536])
+        assert np.allclose(convertToPix(self.vertices, self.pos, 'deg', self.win),
+                           pix * 4)
+
+    def test_uncalibratedMonitor(self):
+        win = FakeWindow(monitors.Monitor('testUnitsEmpty'))
+        for units in ('cm', 'deg', 'degFlat'):
+            with pytest.raises(ValueError):
+                convertToPix(self.vertices, self.pos, units, win)
@@ -10,7 +10,226 @@
 import numpy
 
 from psychopy import logging
-from psychopy.tools.coordinatetools import sph2cart
+
+# generic Sony Trinitron phosphors, used when a monitor has no calibration
+# (note that dkl has to be in cartesian coords first!)
+_defaultDKL_RGB = numpy.asarray([
+    # LUMIN    %L-M    %L+M-S
+    [1.0000, 1.0000, -0.1462],  # R
+    [1.0000, -0.3900, 0.2094],  # G
+    [1.0000, 0.0180, -1.0000]])  # B
+
+# this is the inversion of the default dkl2rgb conversion matrix
+_defaultRGB_DKL = numpy.asarray([
+    # LUMIN->    %L-M->        L+M-S
+    [0.25145542, 0.64933633, 0.09920825],
+    [0.78737943, -0.55586618, -0.23151325],
+    [0.26562825, 0.63933074, -0.90495899]])
+
+_defaultLMS_RGB = numpy.asarray([
+    # L        M        S
+    [4.97068857, -4.14354132, 0.17285275],  # R
+    [-0.90913894, 2.15671326, -0.24757432],  # G
+    [-0.03976551, -0.14253782, 1.18230333]])  # B
+
+# converters built by getColorSpaceConverter(), keyed on the matrices
+_converterCache = {}
+
+
+def _matrixKey(matrix):
+    if matrix is None:
+        return None
+    return numpy.asarray(matrix, dtype=float).tostring()
+
+
+def getColorSpaceConverter(dkl_rgb=None, lms_rgb=None):
+    """Return the :class:`ColorSpaceConverter` for a pair of monitor
+    calibration matrices (either may be None to use the defaults).
+
+    Converters are cached, so each calibration is only set up once and
+    the warning about an uncalibrated monitor is only logged once.
+    """
+    key = (_matrixKey(dkl_rgb), _matrixKey(lms_rgb))
+    converter = _converterCache.get(key)
+    if converter is None:
+        if len(_converterCache) > 64:
+            _converterCache.clear()
+        converter = ColorSpaceConverter(dkl_rgb, lms_rgb)
+        _converterCache[key] = converter
+    return converter
+
+
+class ColorSpaceConverter(object):
+    """Converts colors between RGB, DKL, LMS and HSV spaces for one
+    monitor calibration.
+
+    The conversion matrices (and their inverses) are set up once, so
+    converting colors every frame only costs the matrix product. All
+    methods accept a single color, an Nx3 array or an NxMx3 image and
+    return the same shape. Pass `out` (which may be the input array
+    itself) to write the result into an existing float array.
+
+    usage::
+
+        conv = ColorSpaceConverter(win.dkl_rgb, win.lms_rgb)
+        rgb_Nx3 = conv.dkl2rgb(dkl_Nx3)
+        conv.dkl2rgb(dkl_Nx3, out=dkl_Nx3)  # convert in place
+
+    """
+
+    def __init__(self, dkl_rgb=None, lms_rgb=None):
+        super(ColorSpaceConverter, self).__init__()
+        if dkl_rgb is None:
+            self.dkl_rgb = _defaultDKL_RGB
+            self._rgb_dkl = _defaultRGB_DKL
+        else:
+            self.dkl_rgb = numpy.array(dkl_rgb, dtype=float)
+            self._rgb_dkl = None
+        if lms_rgb is None:
+            self.lms_rgb = _defaultLMS_RGB
+        else:
+            self.lms_rgb = numpy.array(lms_rgb, dtype=float)
+        self._rgb_lms = None
+        self.dklIsDefault = dkl_rgb is None
+        self.lmsIsDefault = lms_rgb is None
+        self._warned = set()
+        self._transposed = {}
+
+    @property
+    def rgb_dkl(self):
+        """The RGB->DKL (cartesian) conversion matrix
+        """
+        if self._rgb_dkl is None:
+            self._rgb_dkl = numpy.linalg.inv(self.dkl_rgb)
+        return self._rgb_dkl
+
+    @property
+    def rgb_lms(self):
+        """The RGB->LMS conversion matrix
+        """
+        if self._rgb_lms is None:
+            self._rgb_lms = numpy.linalg.inv(self.lms_rgb)
+        return self._rgb_lms
+
+    def _warnDefault(self, space):
+        if space == 'DKL' and not self.dklIsDefault:
+            return
+        if space == 'LMS' and not self.lmsIsDefault:
+            return
+        if space not in self._warned:
+            self._warned.add(space)
+            logging.warning('This monitor has not been color-calibrated. '
+                            'Using default %s conversion matrix.' % space)
+
+    def _getMatrixT(self, name):
+        """The (contiguous) transpose of a named matrix, for right
+        multiplying Nx3 arrays. Composed matrices are built on first use.
+        """
+        matrixT = self._transposed.get(name)
+        if matrixT is None:
+            if name == 'dkl_lms':
+                matrix = numpy.dot(self.rgb_lms, self.dkl_rgb)
+            elif name == 'lms_dkl':
+                matrix = numpy.dot(self.rgb_dkl, self.lms_rgb)
+            else:
+                matrix = getattr(self, name)
+            matrixT = numpy.ascontiguousarray(numpy.transpose(matrix))
+            self._transposed[name] = matrixT
+        return matrixT
+
+    def _apply(self, name, values, shape, out):
+        """Multiply the Nx3 `values` by a named matrix, returning an array
+        of `shape` (or filling `out`).
+        """
+        matrixT = self._getMatrixT(name)
+        if out is None:
+            return numpy.dot(values, matrixT).reshape(shape)
+        if (out.dtype == numpy.float64 and out.flags.c_contiguous and
+                out.size == values.size and
+                not numpy.may_share_memory(out, values)):
+            numpy.dot(values, matrixT, out=out.reshape([-1, 3]))
+        else:
+            out[...] = numpy.dot(values, matrixT).reshape(out.shape)
+        return out
+
+    def _dklCartesian(self, dkl):
+        """Spherical DKL (elev, azim, radius) as Nx3 cartesian
+        (LUM, L-M, L+M-S)
+        """
+        elev = numpy.radians(dkl[:, 0])
+        azim = numpy.radians(dkl[:, 1])
+        radius = dkl[:, 2]
+        cart = numpy.empty(dkl.shape)
+        cart[:, 0] = radius * numpy.sin(elev)
+        radius = radius * numpy.cos(elev)
+        cart[:, 1] = radius * numpy.cos(azim)
+        cart[:, 2] = radius * numpy.sin(azim)
+        return cart
+
+    def dkl2rgb(self, dkl, out=None):
+        """Convert spherical DKL (elev, azim, radius) colors to RGB
+        """
+        dkl = numpy.asarray(dkl, dtype=float)
+        self._warnDefault('DKL')
+        cart = self._dklCartesian(dkl.reshape([-1, 3]))
+        return self._apply('dkl_rgb', cart, dkl.shape, out)
+
+    def dklCart2rgb(self, dklCart, out=None):
+        """Convert cartesian DKL (LUM, L-M, L+M-S) colors to RGB
+        """
+        dklCart = numpy.asarray(dklCart, dtype=float)
+        self._warnDefault('DKL')
+        return self._apply('dkl_rgb', dklCart.reshape([-1, 3]),
+                           dklCart.shape, out)
+
+    def rgb2dklCart(self, rgb, out=None):
+        """Convert RGB colors to cartesian DKL (LUM, L-M, L+M-S)
+        """
+        rgb = numpy.asarray(rgb, dtype=float)
+        self._warnDefault('DKL')
+        return self._apply('rgb_dkl', rgb.reshape([-1, 3]), rgb.shape, out)
+
+    def lms2rgb(self, lms, out=None):
+        """Convert cone space (L, M, S) colors to RGB
+        """
+        lms = numpy.asarray(lms, dtype=float)
+        self._warnDefault('LMS')
+        return self._apply('lms_rgb', lms.reshape([-1, 3]), lms.shape, out)
+
+    def rgb2lms(self, rgb, out=None):
+        """Convert RGB colors to cone space (L, M, S)
+        """
+        rgb = numpy.asarray(rgb, dtype=float)
+        self._warnDefault('LMS')
+        return self._apply('rgb_lms', rgb.reshape([-1, 3]), rgb.shape, out)
+
+    def dkl2lms(self, dkl, out=None):
+        """Convert spherical DKL colors straight to cone space, using a
+        single composed matrix (no intermediate RGB array)
+        """
+        dkl = numpy.asarray(dkl, dtype=float)
+        self._warnDefault('DKL')
+        self._warnDefault('LMS')
+        cart = self._dklCartesian(dkl.reshape([-1, 3]))
+        return self._apply('dkl_lms', cart, dkl.shape, out)
+
+    def lms2dklCart(self, lms, out=None):
+        """Convert cone space colors straight to cartesian DKL, using a
+        single composed matrix (no intermediate RGB array)
+        """
+        lms = numpy.asarray(lms, dtype=float)
+        self._warnDefault('DKL')
+        self._warnDefault('LMS')
+        return self._apply('lms_dkl', lms.reshape([-1, 3]), lms.shape, out)
+
+    def hsv2rgb(self, hsv, out=None):
+        """Convert HSV colors to RGB (see :func:`hsv2rgb`)
+        """
+        rgb = hsv2rgb(hsv)
+        if out is None:
+            return rgb
+        out[...] = rgb
+        return out
 
 
 def dkl2rgb(dkl, conversionMatrix=None):
@@ -27,42 +246,8 @@ def dkl2rgb(dkl, conversionMatrix=None):
         rgb(NxNx3) = dkl2rgb(dkl_NxNx3(el,az,radius), conversionMatrix)
 
     """
-    if conversionMatrix is None:
-        conversionMatrix = numpy.asarray([
-            # (note that dkl has to be in cartesian coords first!)
-            # LUMIN    %L-M    %L+M-S
-            [1.0000, 1.0000, -0.1462],  # R
-            [1.0000, -0.3900, 0.2094],  # G
-            [1.0000, 0.0180, -1.0000]])  # B
-        logging.warning('This monitor has not been color-calibrated. '
-                        'Using default DKL conversion matrix.')
-
-    if len(dkl.shape) == 3:
-        dkl_NxNx3 = dkl
-        # convert a 2D (image) of Spherical DKL colours to RGB space
-        origShape = dkl_NxNx3.shape  # remember for later
-        NxN = origShape[0] * origShape[1]  # find nPixels
-        dkl = numpy.reshape(dkl_NxNx3, [NxN, 3])  # make Nx3
-        rgb = dkl2rgb(dkl, conversionMatrix)  # convert
-        return numpy.reshape(rgb, origShape)  # reshape and return
-
-    else:
-        dkl_Nx3 = dkl
-        # its easier to use in the other orientation!
-        dkl_3xN = numpy.transpose(dkl_Nx3)
-        if numpy.size(dkl_3xN) == 3:
-            RG, BY, LUM = sph2cart(dkl_3xN[0],
-                                   dkl_3xN[1],
-                                   dkl_3xN[2])
-        else:
-            RG, BY, LUM = sph2cart(dkl_3xN[0, :],
-                                   dkl_3xN[1, :],
-                                   dkl_3xN[2, :])
-        dkl_cartesian = numpy.asarray([LUM, RG, BY])
-        rgb = numpy.dot(conversionMatrix, dkl_cartesian)
-
-        # return in the shape we received it:
-        return numpy.transpose(rgb)
+    converter = getColorSpaceConverter(dkl_rgb=conversionMatrix)
+    return converter.dkl2rgb(dkl)
 
 
 def dklCart2rgb(LUM, LM, S, conversionMatrix=None):
@@ -71,20 +256,12 @@ def dklCart2rgb(LUM, LM, S, conversionMatrix=None):
 
     NB: this may return rgb values >1 or <-1
     """
-    NxNx3 = list(LUM.shape)
-    NxNx3.append(3)
-    dkl_cartesian = numpy.asarray(
-        [LUM.reshape([-1]), LM.reshape([-1]), S.reshape([-1])])
-
-    if conversionMatrix is None:
-        conversionMatrix = numpy.asarray([
-            # (note that dkl has to be in cartesian coords first!)
-            # LUMIN    %L-M    %L+M-S
-            [1.0000, 1.0000, -0.1462],  # R
-            [1.0000, -0.3900, 0.2094],  # G
-            [1.0000, 0.0180, -1.0000]])  # B
-    rgb = numpy.dot(conversionMatrix, dkl_cartesian)
-    return numpy.reshape(numpy.transpose(rgb), NxNx3)
+    LUM = numpy.asarray(LUM)
+    dkl_cartesian = numpy.column_stack(
+        [LUM.reshape([-1]), numpy.reshape(LM, [-1]), numpy.reshape(S, [-1])])
+    converter = getColorSpaceConverter(dkl_rgb=conversionMatrix)
+    rgb = converter.dklCart2rgb(dkl_cartesian)
+    return rgb.reshape(list(LUM.shape) + [3])
 
 
 def hsv2rgb(hsv_Nx3):
@@ -152,61 +329,15 @@ def lms2rgb(lms_Nx3, conversionMatrix=None):
         rgb_Nx3 = lms2rgb(dkl_Nx3(el,az,radius), conversionMatrix)
 
     """
-
-    # its easier to use in the other orientation!
-    lms_3xN = numpy.transpose(lms_Nx3)
-
-    if conversionMatrix is None:
-        cones_to_rgb = numpy.asarray([
-            # L        M        S
-            [4.97068857, -4.14354132, 0.17285275],  # R
-            [-0.90913894, 2.15671326, -0.24757432],  # G
-            [-0.03976551, -0.14253782, 1.18230333]])  # B
-
-        logging.warning('This monitor has not been color-calibrated. '
-                        'Using default LMS conversion matrix.')
-    else:
-        cones_to_rgb = conversionMatrix
-
-    rgb = numpy.dot(cones_to_rgb, lms_3xN)
-    return numpy.transpose(rgb)  # return in the shape we received it
+    converter = getColorSpaceConverter(lms_rgb=conversionMatrix)
+    return converter.lms2rgb(lms_Nx3)
 
 
 def rgb2dklCart(picture, conversionMatrix=None):
     """Convert an RGB image into Cartesian DKL space.
     """
-    # Turn the picture into an array so we can do maths
-    picture = numpy.array(picture)
-    # Find the original dimensions of the picture
-    origShape = picture.shape
-
-    # this is the inversion of the dkl2rgb conversion matrix
-    if conversionMatrix is None:
-        conversionMatrix = numpy.asarray([
-            # LUMIN->    %L-M->        L+M-S
-            [0.25145542, 0.64933633, 0.09920825],
-            [0.78737943, -0.55586618, -0.23151325],
-            [0.26562825, 0.63933074, -0.90495899]])
-        logging.warning('This monitor has not been color-calibrated. '
-                        'Using default DKL conversion matrix.')
-    else:
-        conversionMatrix = numpy.linalg.inv(conversionMatrix)
-
-    # Reshape the picture so that it can multiplied by the conversion matrix
-    red = picture[:, :, 0]
-    green = picture[:, :, 1]
-    blue = picture[:, :, 2]
-
-    dkl = numpy.asarray([red.reshape([-1]),
-                         green.reshape([-1]),
-                         blue.reshape([-1])])
-
-    # Multiply the picture by the conversion matrix
-    dkl = numpy.dot(conversionMatrix, dkl)
-
-    # Reshape the picture so that it's back to it's original shape
-    dklPicture = numpy.reshape(numpy.transpose(dkl), origShape)
-    return dklPicture
+    converter = getColorSpaceConverter(dkl_rgb=conversionMatrix)
+    return converter.rgb2dklCart(picture)
 
 
 def rgb2lms(rgb_Nx3, conversionMatrix=None):
@@ -222,22 +353,5 @@ def rgb2lms(rgb_Nx3, conversionMatrix=None):
         lms_Nx3 = rgb2lms(rgb_Nx3(el,az,radius), conversionMatrix)
 
     """
-
-    # its easier to use in the other orientation!
-    rgb_3xN = numpy.transpose(rgb_Nx3)
-
-    if conversionMatrix is None:
-        cones_to_rgb = numpy.asarray([
-            # L        M        S
-            [4.97068857, -4.14354132, 0.17285275],  # R
-            [-0.90913894, 2.15671326, -0.24757432],  # G
-            [-0.03976551, -0.14253782, 1.18230333]])  # B
-
-        logging.warning('This monitor has not been color-calibrated. '
-                        'Using default LMS conversion matrix.')
-    else:
-        cones_to_rgb = conversionMatrix
-    rgb_to_cones = numpy.linalg.inv(cones_to_rgb)
-
-    lms = numpy.dot(rgb_to_cones, rgb_3xN)
-    return numpy.transpose(lms)  # return in the shape we received it
+    converter = getColorSpaceConverter(lms_rgb=conversionMatrix)
+    return converter.rgb2lms(rgb_Nx3)
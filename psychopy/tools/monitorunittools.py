@@ -15,6 +15,34 @@ from numpy import array, sin, cos, tan, pi, radians, degrees, hypot
 # the given unit type to PsychoPy OpenGL pix unit space.
 _unit2PixMappings = dict()
 
+# Conversion factors for the monitor based units, keyed by the monitor
+# geometry they were calculated from. Because the key holds the current
+# monitor values, changing the monitor settings never uses a stale factor.
+_monitorScaleCache = dict()
+
+
+def _getMonitorScales(monitor):
+    """Returns (pixPerDeg, pixPerCm, distance) for the monitor, calculated
+    once for each monitor width, size and distance. Any of the values that
+    can not be calculated for the monitor are None.
+    """
+    sizePix = monitor.getSizePix()
+    if sizePix is not None:
+        sizePix = tuple(sizePix)
+    key = (monitor.getWidth(), sizePix, monitor.getDistance())
+    scales = _monitorScaleCache.get(key)
+    if scales is None:
+        scrWidthCm, sizePix, dist = key
+        pixPerCm = pixPerDeg = None
+        if sizePix is not None and scrWidthCm is not None:
+            pixPerCm = sizePix[0] / float(scrWidthCm)
+            if dist is not None:
+                pixPerDeg = dist * 0.017455 * pixPerCm
+        if len(_monitorScaleCache) > 64:
+            _monitorScaleCache.clear()
+        scales = _monitorScaleCache[key] = (pixPerDeg, pixPerCm, dist)
+    return scales
+
 # the following are to be used by convertToPix
 
 
@@ -25,26 +53,40 @@ _unit2PixMappings['pixels'] = _pix2pix
 
 
 def _cm2pix(vertices, pos, win):
-    return cm2pix(pos + vertices, win.monitor)
+    pixPerCm = _getMonitorScales(win.monitor)[1]
+    if pixPerCm is None:
+        # raises the appropriate error for the monitor
+        return cm2pix(pos + vertices, win.monitor)
+    return (pos + vertices) * pixPerCm
 _unit2PixMappings['cm'] = _cm2pix
 
 
 def _deg2pix(vertices, pos, win):
-    return deg2pix(pos + vertices, win.monitor)
+    pixPerDeg = _getMonitorScales(win.monitor)[0]
+    if pixPerDeg is None:
+        return deg2pix(pos + vertices, win.monitor)
+    return (pos + vertices) * pixPerDeg
 _unit2PixMappings['deg'] = _deg2pix
 _unit2PixMappings['degs'] = _deg2pix
 
 
 def _degFlatPos2pix(vertices, pos, win):
-    posCorrected = deg2pix(pos, win.monitor, correctFlat=True)
-    vertices = deg2pix(vertices, win.monitor, correctFlat=False)
-    return posCorrected + vertices
+    pixPerDeg, pixPerCm, dist = _getMonitorScales(win.monitor)
+    if pixPerDeg is None:
+        posCorrected = deg2pix(pos, win.monitor, correctFlat=True)
+        vertices = deg2pix(vertices, win.monitor, correctFlat=False)
+        return posCorrected + vertices
+    posCorrected = _flatDeg2cm(pos, dist) * pixPerCm
+    return posCorrected + array(vertices) * pixPerDeg
 _unit2PixMappings['degFlatPos'] = _degFlatPos2pix
 
 
 def _degFlat2pix(vertices, pos, win):
-    return deg2pix(array(pos) + array(vertices), win.monitor,
-                   correctFlat=True)
+    pixPerDeg, pixPerCm, dist = _getMonitorScales(win.monitor)
+    if pixPerDeg is None:
+        return deg2pix(array(pos) + array(vertices), win.monitor,
+                       correctFlat=True)
+    return _flatDeg2cm(array(pos) + array(vertices), dist) * pixPerCm
 _unit2PixMappings['degFlat'] = _degFlat2pix
 
 
@@ -155,35 +197,42 @@ def deg2cm(degrees, monitor, correctFlat=False):
         msg = "Monitor %s has no known distance (SEE MONITOR CENTER)"
         raise ValueError(msg % monitor.name)
     if correctFlat:
-        rads = radians(degrees)
-        cmXY = np.zeros(rads.shape, 'd')  # must be a double (not float)
-        if rads.shape == (2,):
-            x, y = rads
-            cmXY[0] = hypot(dist, tan(y) * dist) * tan(x)
-            cmXY[1] = hypot(dist, tan(x) * dist) * tan(y)
-        elif len(rads.shape) > 1 and rads.shape[1] == 2:
-            cmXY[:, 0] = hypot(dist, tan(rads[:, 1]) * dist) * tan(rads[:, 0])
-            cmXY[:, 1] = hypot(dist, tan(rads[:, 0]) * dist) * tan(rads[:, 1])
-        else:
-            msg = ("If using deg2cm with correctedFlat==True then degrees "
-                   "arg must have shape [N,2], not %s")
-            raise ValueError(msg % (repr(rads.shape)))
-        # derivation:
-        #    if hypotY is line from eyeball to [x,0] given by
-        #       hypot(dist, tan(degX))
-        #    then cmY is distance from [x,0] to [x,y] given by
-        #       hypotY * tan(degY)
-        #    similar for hypotX to get cmX
-        # alternative:
-        #    we could do this by converting to polar coords, converting
-        #    deg2cm and then going back to cartesian,
-        #    but this would be slower(?)
-        return cmXY
+        return _flatDeg2cm(degrees, dist)
     else:
         # the size of 1 deg at screen centre
         return np.array(degrees) * dist * 0.017455
 
 
+def _flatDeg2cm(degrees, dist):
+    """deg2cm with correctFlat=True, for a monitor at distance dist
+    """
+    rads = radians(degrees)
+    tanXY = tan(rads)  # one call for both x and y
+    cmXY = np.zeros(rads.shape, 'd')  # must be a double (not float)
+    if rads.shape == (2,):
+        tanX, tanY = tanXY
+        cmXY[0] = hypot(dist, tanY * dist) * tanX
+        cmXY[1] = hypot(dist, tanX * dist) * tanY
+    elif len(rads.shape) > 1 and rads.shape[1] == 2:
+        cmXY[:, 0] = hypot(dist, tanXY[:, 1] * dist) * tanXY[:, 0]
+        cmXY[:, 1] = hypot(dist, tanXY[:, 0] * dist) * tanXY[:, 1]
+    else:
+        msg = ("If using deg2cm with correctedFlat==True then degrees "
+               "arg must have shape [N,2], not %s")
+        raise ValueError(msg % (repr(rads.shape)))
+    # derivation:
+    #    if hypotY is line from eyeball to [x,0] given by
+    #       hypot(dist, tan(degX))
+    #    then cmY is distance from [x,0] to [x,y] given by
+    #       hypotY * tan(degY)
+    #    similar for hypotX to get cmX
+    # alternative:
+    #    we could do this by converting to polar coords, converting
+    #    deg2cm and then going back to cartesian,
+    #    but this would be slower(?)
+    return cmXY
+
+
 def cm2pix(cm, monitor):
     """Convert size in degrees to size in pixels for a given Monitor object
     """
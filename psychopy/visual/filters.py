@@ -9,13 +9,48 @@
 from __future__ import absolute_import
 
 import numpy
-from numpy.fft import fft2, ifft2, fftshift, ifftshift
+from numpy.fft import fft2, ifft2, fftshift, ifftshift, rfft2, irfft2
+from multiprocessing.pool import ThreadPool
 from psychopy import logging
 try:
     from PIL import Image
 except ImportError:
     import Image
 
+# frequency grids and filter kernels already made, keyed on their size and
+# parameters (see _cachedKernel)
+_kernelCache = {}
+# stacks of images are filtered this many at a time, to limit the memory
+# used by their spectra
+_filterChunkSize = 32
+
+
+def _cachedKernel(key, makeKernel, copy=True):
+    """Return the array cached for key, calling makeKernel() to make it the
+    first time. A copy is returned unless `copy` is False, so the caller
+    can modify it without changing the cache.
+    """
+    kernel = _kernelCache.get(key)
+    if kernel is None:
+        if len(_kernelCache) > 32:
+            _kernelCache.clear()
+        kernel = _kernelCache[key] = makeKernel()
+    if copy:
+        return kernel.copy()
+    return kernel
+
+
+def _radialFrequencies(rows, cols):
+    """The distance of each element of a centered (rows, cols) spectrum
+    from its center, as used by the Butterworth filters. Cached, so do not
+    modify the result.
+    """
+    def makeRadius():
+        x = numpy.linspace(-0.5, 0.5, cols)
+        y = numpy.linspace(-0.5, 0.5, rows)
+        return numpy.sqrt((x**2)[numpy.newaxis] + (y**2)[:, numpy.newaxis])
+    return _cachedKernel(('radius', rows, cols), makeRadius, copy=False)
+
 
 def makeGrating(res,
                 ori=0.0,  # in degrees
@@ -236,6 +271,11 @@ def conv2d(smaller, larger):
     Actually right now the matrices must be the same size (will sort out
     padding issues another day!)
     """
+    if numpy.isrealobj(smaller) and numpy.isrealobj(larger):
+        # the spectra of real matrices are symmetric, so only half of each
+        # needs computing
+        return irfft2(rfft2(smaller) * rfft2(larger), numpy.shape(larger))
+
     smallerFFT = fft2(smaller)
     largerFFT = fft2(larger)
 
@@ -255,6 +295,73 @@ def imifft(X):
     return numpy.abs(ifft2(ifftshift(X)))
 
 
+def filterImages(images, kernel, dtype=numpy.float32, nThreads=1):
+    """Filter an image, or a stack of images, with a centered frequency
+    domain filter kernel such as those made by :func:`butter2d_lp`.
+
+    This is the equivalent of `imifft(imfft(image) * kernel)`, but only
+    half of each spectrum is computed (the images are real) and the real
+    part of the filtered image is returned, rather than its magnitude, so
+    it keeps its sign.
+
+    :Parameters:
+        images : numpy.ndarray
+            a 2D image, or a stack of them (image, row, column)
+        kernel : numpy.ndarray
+            centered filter kernel, the size of one image
+        dtype : numpy dtype, optional
+            dtype of the filtered images. The default (float32) halves the
+            memory needed for large stacks
+        nThreads : int, optional
+            the number of threads to share the stack between
+
+    :Returns:
+        numpy.ndarray
+            the filtered images, the same shape as `images`
+    """
+    images = numpy.asarray(images)
+    kernel = numpy.asarray(kernel)
+    if images.shape[-2:] != kernel.shape:
+        raise ValueError('kernel shape %s does not match the image shape %s'
+                         % (kernel.shape, images.shape[-2:]))
+    halfKernel = _rfftKernel(kernel)
+
+    out = numpy.empty(images.shape, dtype)
+    stack = images.reshape((-1,) + kernel.shape)
+    outStack = out.reshape(stack.shape)
+
+    def filterChunk(start):
+        chunk = slice(start, start + _filterChunkSize)
+        outStack[chunk] = irfft2(rfft2(stack[chunk]) * halfKernel,
+                                 kernel.shape)
+
+    starts = range(0, len(stack), _filterChunkSize)
+    if nThreads > 1 and len(starts) > 1:
+        # numpy's FFTs release the GIL, so the threads run in parallel
+        pool = ThreadPool(min(nThreads, len(starts)))
+        try:
+            pool.map(filterChunk, starts)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for start in starts:
+            filterChunk(start)
+    return out
+
+
+def _rfftKernel(kernel):
+    """Return the part of a centered kernel that applies to the real FFT
+    (rfft2) of an image. Only the real part of the filtered image is kept,
+    so the kernel is first averaged with its conjugate at minus each
+    frequency, which makes it symmetric.
+    """
+    kernel = ifftshift(kernel)
+    mirrored = numpy.roll(numpy.roll(kernel[::-1, ::-1], 1, 0), 1, 1)
+    half = kernel.shape[1] // 2 + 1
+    return (kernel[:, :half] + mirrored[:, :half].conj()) / 2
+
+
 def butter2d_lp(size, cutoff, n=3):
     """Create lowpass 2D Butterworth filter.
 
@@ -270,6 +377,8 @@ def butter2d_lp(size, cutoff, n=3):
        :Returns:
            numpy.ndarray
              filter kernel in 2D centered
+
+       Kernels are cached, so asking for the same filter again is cheap.
        """
     if not 0 < cutoff <= 1.0:
         raise ValueError, 'Cutoff frequency must be between 0 and 1.0'
@@ -279,14 +388,11 @@ def butter2d_lp(size, cutoff, n=3):
 
     rows, cols = size
 
-    x = numpy.linspace(-0.5, 0.5, cols)
-    y = numpy.linspace(-0.5, 0.5, rows)
-
-    # An array with every pixel = radius relative to center
-    radius = numpy.sqrt((x**2)[numpy.newaxis] + (y**2)[:, numpy.newaxis])
-
-    f = 1 / (1.0 + (radius / cutoff)**(2 * n))   # The filter
-    return f
+    def makeKernel():
+        # An array with every pixel = radius relative to center
+        radius = _radialFrequencies(rows, cols)
+        return 1 / (1.0 + (radius / cutoff)**(2 * n))   # The filter
+    return _cachedKernel(('lp', rows, cols, cutoff, n), makeKernel)
 
 
 def butter2d_bp(size, cutin, cutoff, n):
@@ -309,7 +415,11 @@ def butter2d_bp(size, cutin, cutoff, n):
 
     """
 
-    return butter2d_lp(size, cutoff, n) - butter2d_lp(size, cutin, n)
+    rows, cols = size
+
+    def makeKernel():
+        return butter2d_lp(size, cutoff, n) - butter2d_lp(size, cutin, n)
+    return _cachedKernel(('bp', rows, cols, cutin, cutoff, n), makeKernel)
 
 
 def butter2d_hp(size, cutoff, n=3):
@@ -329,7 +439,11 @@ def butter2d_hp(size, cutoff, n=3):
             filter kernel in 2D centered
 
     """
-    return 1.0 - butter2d_lp(size, cutoff, n)
+    rows, cols = size
+
+    def makeKernel():
+        return 1.0 - butter2d_lp(size, cutoff, n)
+    return _cachedKernel(('hp', rows, cols, cutoff, n), makeKernel)
 
 
 def butter2d_lp_elliptic(size, cutoff_x, cutoff_y, n=3,
@@ -362,13 +476,15 @@ def butter2d_lp_elliptic(size, cutoff_x, cutoff_y, n=3,
 
     rows, cols = size
 
-    # this time we start up with 2D arrays for easy broadcasting
-    x = (numpy.linspace(-0.5, 0.5, cols) - offset_x)[numpy.newaxis]
-    y = (numpy.linspace(-0.5, 0.5, rows) - offset_y)[:, numpy.newaxis]
-
-    x2 = (x * numpy.cos(alpha) - y * numpy.sin(-alpha))
-    y2 = (x * numpy.sin(-alpha) + y * numpy.cos(alpha))
+    def makeKernel():
+        # this time we start up with 2D arrays for easy broadcasting
+        x = (numpy.linspace(-0.5, 0.5, cols) - offset_x)[numpy.newaxis]
+        y = (numpy.linspace(-0.5, 0.5, rows) - offset_y)[:, numpy.newaxis]
 
-    f = 1. / (1 + ((2 * x2 / cutoff_x)**2 + (2 * y2 / cutoff_y)**2)**n)
+        x2 = (x * numpy.cos(alpha) - y * numpy.sin(-alpha))
+        y2 = (x * numpy.sin(-alpha) + y * numpy.cos(alpha))
 
-    return f
+        return 1. / (1 + ((2 * x2 / cutoff_x)**2 +
+                          (2 * y2 / cutoff_y)**2)**n)
+    return _cachedKernel(('lp_elliptic', rows, cols, cutoff_x, cutoff_y, n,
+                          alpha, offset_x, offset_y), makeKernel)
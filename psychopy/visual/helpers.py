@@ -247,8 +247,9 @@ def setColor(obj, color, colorSpace=None, operation='',
             dkl_rgb = None
         else:
             dkl_rgb = win.dkl_rgb
-        setattr(obj, rgbAttrib, colors.dkl2rgb(
-            numpy.asarray(newColor).transpose(), dkl_rgb))
+        # one color or Nx3 per-element colors (converters are cached
+        # per calibration so this is cheap to call every frame)
+        setattr(obj, rgbAttrib, colors.dkl2rgb(newColor, dkl_rgb))
     elif colorSpace == 'lms':
         if (win.lms_rgb is None or
                 numpy.all(win.lms_rgb == numpy.ones([3, 3]))):
@@ -13,12 +13,58 @@ You should have received a copy of the GNU General Public License along
 with this program. If not, see http://www.gnu.org/licenses/
 """
 
+import os
 import numpy as np
 from psychopy import logging
 from OpenGL.arrays import ArrayDatatype as ADT
 import pyglet
 GL = pyglet.gl
 
+# parsed warpfiles, keyed by path; each entry is ((mtime, size), data)
+_warpfileCache = {}
+
+
+def readWarpfile(warpfile):
+    """Read a Paul Bourke format warpfile, returning
+    (filetype, cols, rows, warpdata), where warpdata is a float64 array
+    with one row per mesh node.
+
+    Parsed files are cached, and only read again if the modification time
+    or size of the file has changed.
+    """
+    path = os.path.abspath(warpfile)
+    stat = os.stat(path)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _warpfileCache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path) as fh:
+        filetype = int(fh.readline())
+        rc = map(int, fh.readline().split())
+        cols, rows = rc[0], rc[1]
+        text = fh.read()
+    # np.fromstring is much faster than np.loadtxt, but does not handle
+    # comments or bad values, so fall back to loadtxt if it fails
+    warpdata = np.fromstring(text, sep=' ')
+    if warpdata.size != cols * rows * 5 or np.isnan(warpdata).any():
+        warpdata = np.loadtxt(path, skiprows=2)
+    else:
+        warpdata = warpdata.reshape(-1, 5)
+    data = (filetype, cols, rows, warpdata)
+    _warpfileCache[path] = (key, data)
+    return data
+
+
+def _quadCorners(grid):
+    """Given a (rows, cols, ...) array of mesh node values, return an array
+    with the values at the 4 corners of each quad of the mesh, in drawing
+    order: (y, x), (y, x+1), (y+1, x+1), (y+1, x) for each y then x.
+    """
+    corners = np.stack((grid[:-1, :-1], grid[:-1, 1:],
+                        grid[1:, 1:], grid[1:, :-1]), axis=2)
+    return corners.reshape((-1,) + grid.shape[2:])
+
 
 class Warper(object):
     """Class to perform warps.
@@ -287,31 +333,11 @@ class Warper(object):
         u_coords = tx / self.mon_width_cm + 0.5
         v_coords = ty / self.mon_height_cm + 0.5
 
-        # loop to create quads
-        vdex = 0
-        for y in xrange(0, self.ygrid - 1):
-            for x in xrange(0, self.xgrid - 1):
-                index = y * (self.xgrid) + x
-
-                vertices[vdex + 0, 0] = x_coords[y, x]
-                vertices[vdex + 0, 1] = y_coords[y, x]
-                vertices[vdex + 1, 0] = x_coords[y, x + 1]
-                vertices[vdex + 1, 1] = y_coords[y, x + 1]
-                vertices[vdex + 2, 0] = x_coords[y + 1, x + 1]
-                vertices[vdex + 2, 1] = y_coords[y + 1, x + 1]
-                vertices[vdex + 3, 0] = x_coords[y + 1, x]
-                vertices[vdex + 3, 1] = y_coords[y + 1, x]
-
-                tcoords[vdex + 0, 0] = u_coords[y, x]
-                tcoords[vdex + 0, 1] = v_coords[y, x]
-                tcoords[vdex + 1, 0] = u_coords[y, x + 1]
-                tcoords[vdex + 1, 1] = v_coords[y, x + 1]
-                tcoords[vdex + 2, 0] = u_coords[y + 1, x + 1]
-                tcoords[vdex + 2, 1] = v_coords[y + 1, x + 1]
-                tcoords[vdex + 3, 0] = u_coords[y + 1, x]
-                tcoords[vdex + 3, 1] = v_coords[y + 1, x]
-
-                vdex += 4
+        # create quads
+        vertices[:, 0] = _quadCorners(x_coords)
+        vertices[:, 1] = _quadCorners(y_coords)
+        tcoords[:, 0] = _quadCorners(u_coords)
+        tcoords[:, 1] = _quadCorners(v_coords)
         self.createVertexAndTextureBuffers(vertices, tcoords)
 
     def projectionWarpfile(self):
@@ -319,13 +345,7 @@ class Warper(object):
             See: http://paulbourke.net/dome/warpingfisheye/
         """
         try:
-            fh = open(self.warpfile)
-            lines = fh.readlines()
-            fh.close()
-            filetype = int(lines[0])
-            rc = map(int, lines[1].split())
-            cols, rows = rc[0], rc[1]
-            warpdata = np.loadtxt(self.warpfile, skiprows=2)
+            filetype, cols, rows, warpdata = readWarpfile(self.warpfile)
         except Exception:
             error = 'Unable to read warpfile: ' + self.warpfile
             logging.warning(error)
@@ -354,50 +374,11 @@ class Warper(object):
         opacity = np.ones(
             ((self.xgrid - 1) * (self.ygrid - 1) * 4, 4), dtype='float32')
 
-        # loop to create quads
-        vdex = 0
-        for y in xrange(0, self.ygrid - 1):
-            for x in xrange(0, self.xgrid - 1):
-                index = y * (self.xgrid) + x
-
-                vertices[vdex + 0, 0] = warpdata[index, 0]  # x_coords[y,x]
-                vertices[vdex + 0, 1] = warpdata[index, 1]  # y_coords[y,x]
-                # x_coords[y,x+1]
-                vertices[vdex + 1, 0] = warpdata[index + 1, 0]
-                # y_coords[y,x+1]
-                vertices[vdex + 1, 1] = warpdata[index + 1, 1]
-                # x_coords[y+1,x+1]
-                vertices[vdex + 2, 0] = warpdata[index + cols + 1, 0]
-                # y_coords[y+1,x+1]
-                vertices[vdex + 2, 1] = warpdata[index + cols + 1, 1]
-                # x_coords[y+1,x]
-                vertices[vdex + 3, 0] = warpdata[index + cols, 0]
-                # y_coords[y+1,x]
-                vertices[vdex + 3, 1] = warpdata[index + cols, 1]
-
-                # u_coords[y,x]
-                tcoords[vdex + 0, 0] = warpdata[index, 2]
-                # v_coords[y,x]
-                tcoords[vdex + 0, 1] = warpdata[index, 3]
-                # u_coords[y,x+1]:
-                tcoords[vdex + 1, 0] = warpdata[index + 1, 2]
-                # v_coords[y,x+1]:
-                tcoords[vdex + 1, 1] = warpdata[index + 1, 3]
-                # u_coords[y+1,x+1]:
-                tcoords[vdex + 2, 0] = warpdata[index + cols + 1, 2]
-                # v_coords[y+1,x+1]:
-                tcoords[vdex + 2, 1] = warpdata[index + cols + 1, 3]
-                # u_coords[y+1,x]
-                tcoords[vdex + 3, 0] = warpdata[index + cols, 2]
-                # v_coords[y+1,x]:
-                tcoords[vdex + 3, 1] = warpdata[index + cols, 3]
-
-                opacity[vdex, 3] = warpdata[index, 4]
-                opacity[vdex + 1, 3] = warpdata[index + 1, 4]
-                opacity[vdex + 2, 3] = warpdata[index + cols + 1, 4]
-                opacity[vdex + 3, 3] = warpdata[index + cols, 4]
-
-                vdex += 4
+        # create quads; warpdata has a row per mesh node, y major
+        corners = _quadCorners(warpdata.reshape(rows, cols, 5))
+        vertices[:] = corners[:, 0:2]
+        tcoords[:] = corners[:, 2:4]
+        opacity[:, 3] = corners[:, 4]
         self.createVertexAndTextureBuffers(vertices, tcoords, opacity)
 
     def createVertexAndTextureBuffers(self, vertices, tcoords, opacity=None):